@@ -0,0 +1,99 @@
+import threading
+import time
+
+# Sized for the concurrent uploader and parallel provisioning, well above botocore's default of 10
+DEFAULT_MAX_POOL_CONNECTIONS = 32
+
+# Adaptive mode adds client-side rate limiting on top of exponential backoff, so throttled calls slow down
+# instead of failing in bursts
+DEFAULT_RETRIES = {'max_attempts': 10, 'mode': 'adaptive'}
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+def get_session():
+    """ Returns the process wide boto3 session, creating it on first use
+
+    :return: boto3.session.Session
+    """
+
+    global _session
+    with _lock:
+        if _session is None:
+            # boto3 is imported on first use, so importing this module stays cheap for code that never
+            # creates a client, eg a Lambda invocation that exits early
+            import boto3.session
+            _session = boto3.session.Session()
+        return _session
+
+def get_client(service_name, region_name=None, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS):
+    """ Returns a cached client for the service and region. Clients are thread safe and are shared
+    across the whole process, so credentials, endpoints and pooled connections are resolved once
+
+    :param service_name: AWS service, eg 's3' or 'glue'
+    :param region_name: region of the client. If not specified the session's default region is used
+    :param max_pool_connections: size of the client's HTTP connection pool
+    :return: botocore client
+    """
+
+    key = (service_name, region_name, max_pool_connections)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    session = get_session()
+    with _lock:
+        # session.client is not thread safe, so creation is serialised and re-checked under the lock
+        client = _clients.get(key)
+        if client is None:
+            from botocore.config import Config
+            config = Config(max_pool_connections=max_pool_connections, retries=DEFAULT_RETRIES)
+            client = session.client(service_name, region_name=region_name, config=config)
+            _clients[key] = client
+        return client
+
+class TTLCache:
+    """ Thread safe cache for metadata lookups that rarely change, eg bucket existence or ARNs.
+    A loader returning None is treated as a failed lookup and is not cached
+
+    :param ttl: seconds an entry stays valid
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+
+        value = loader()
+        if value is not None:
+            with self._lock:
+                self._entries[key] = (value, now + self.ttl)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+metadata_cache = TTLCache(300)
+
+def cached_lookup(kind, name, loader):
+    """ Looks up a piece of metadata through the shared TTL cache
+
+    :param kind: namespace of the lookup, eg 'bucket' or 'kinesis-arn'
+    :param name: resource name
+    :param loader: zero argument callable doing the real AWS call. Returns None on failure
+    :return: the cached or freshly loaded value
+    """
+
+    return metadata_cache.get_or_load((kind, name), loader)
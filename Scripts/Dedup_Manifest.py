@@ -0,0 +1,80 @@
+import hashlib
+import sqlite3
+import time
+
+MANIFEST_NAME = ".file_watcher.manifest"
+
+CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """ Computes the SHA-256 of a file by reading it into one reused buffer, so memory stays at chunk_size
+    whatever the file size. hashlib releases the GIL on large updates, so several files hash in parallel on threads
+
+    :param path: file to hash
+    :param chunk_size: bytes read per call
+    :return: hex digest
+    """
+
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            length = f.readinto(buffer)
+            if not length:
+                break
+            digest.update(view[:length])
+    return digest.hexdigest()
+
+class DedupManifest:
+    """ Local manifest of content hashes already uploaded to the raw bucket.
+    Backed by SQLite with the hash as a clustered primary key, so a lookup stays a single index probe with
+    millions of entries and the file is safe to reopen after a crash
+
+    :param path: location of the manifest database
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS content ("
+            "hash TEXT PRIMARY KEY, size INTEGER NOT NULL, name TEXT NOT NULL, uploaded REAL NOT NULL"
+            ") WITHOUT ROWID")
+        self._connection.commit()
+
+    def contains(self, digest):
+        """ Tests to see if content with this hash was uploaded before
+
+        :param digest: hex digest from hash_file
+        :return: name the content was first uploaded under, else None
+        """
+
+        row = self._connection.execute("SELECT name FROM content WHERE hash = ?", (digest,)).fetchone()
+        return row[0] if row is not None else None
+
+    def add(self, digest, size, name):
+        """ Records uploaded content. The first name a hash was uploaded under is kept
+
+        :param digest: hex digest from hash_file
+        :param size: file size in bytes
+        :param name: object name the content was uploaded as
+        """
+
+        self._connection.execute("INSERT OR IGNORE INTO content (hash, size, name, uploaded) VALUES (?, ?, ?, ?)",
+                                 (digest, size, name, time.time()))
+        self._connection.commit()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM content").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,111 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+
+# Event bits from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# A file counts as arrived once its writer closes it or it is renamed into the directory,
+# so half-written files are never handed to the ingester
+ARRIVAL_MASK = IN_CLOSE_WRITE | IN_MOVED_TO
+REMOVAL_MASK = IN_DELETE | IN_MOVED_FROM
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+class InotifyUnavailable(Exception):
+    """Raised when the platform or filesystem cannot provide inotify watches"""
+
+def _load_libc():
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        raise InotifyUnavailable("libc could not be located")
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise InotifyUnavailable("libc does not export inotify")
+    return libc
+
+class DirectoryNotifier:
+    """ Watches a single directory through inotify and reports file arrivals and removals by name.
+
+    :param path: directory to watch
+    :raises InotifyUnavailable: if inotify cannot be initialised for the path
+    """
+
+    def __init__(self, path):
+        libc = _load_libc()
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise InotifyUnavailable("inotify_init1 failed: " + os.strerror(err))
+
+        wd = libc.inotify_add_watch(fd, os.fsencode(path), ARRIVAL_MASK | REMOVAL_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise InotifyUnavailable("inotify_add_watch failed on " + path + ": " + os.strerror(err))
+
+        self.path = path
+        self._fd = fd
+
+    def fileno(self):
+        return self._fd
+
+    def read_events(self, timeout=None):
+        """ Blocks until events are available or the timeout expires.
+
+        :param timeout: seconds to wait, None to wait indefinitely
+        :return: list of (mask, name) tuples. An IN_Q_OVERFLOW event has name None and means events were lost
+        """
+
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append((mask, None))
+            elif mask & IN_ISDIR or mask & IN_IGNORED or not name:
+                continue
+            else:
+                events.append((mask, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,11 +1,21 @@
 import logging
-import boto3
 from botocore.exceptions import ClientError
 import sys
 import os
+import time
+import AWS_Clients
+import Dedup_Manifest
+import File_Scanner
+import Ingest_Format
+import Multipart_Upload
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from boto3.s3.transfer import TransferConfig
 
 from urllib3 import Retry
 
+UploadResult = namedtuple("UploadResult", ["name", "size", "success", "error", "skipped"], defaults=(False,))
+
 def abs_path_check(path):
     """ Tests to see if the path inputted is absolute. If it is relative, gives the user one try to re-enter the path. 
     Terminates if second path inputted is also relative 
@@ -64,14 +74,18 @@ def file_extension_check(name):
         print(extension,"file is not accepted. Program Terminating")
         sys.exit(1)
 
-def file_empty_check(path):
+def file_empty_check(path, size=None):
     """ Tests to see if the file is empty. 
     If the file is empty, prompts user on wether to proceed with upload. Terminates current execution if user does not want to proceed with upload
 
     :param path: path of the file being tested  
+    :param size: size already known from a directory scan. If not specified the file is stat'ed
     """
 
-    if os.path.getsize(path) == 0:
+    if size is None:
+        size = os.path.getsize(path)
+
+    if size == 0:
         option = input("File is empty. Proceed with upload? [Y/N]")
         if option.upper() == 'Y':
             return 
@@ -91,62 +105,293 @@ def bucket_exist_check(bucket_name):
     :param bucket_name: name of the bucket user wants to upload the dataset to 
     """
 
-    existing_buckets = boto3.resource("s3").buckets.all()
-    
-    buckets = []
-
-    for bucket in existing_buckets:
-        buckets.append(bucket.name)
-
-    if bucket_name in buckets:
+    if AWS_Clients.cached_lookup("bucket", bucket_name, lambda: bucket_exists(bucket_name)):
         print("Bucket is present")
         return 
     else:        
         print("Bucket with inputted name was not found. Current Buckets are")
-        for current_bucket in buckets:
-            print(current_bucket)
+        for current_bucket in AWS_Clients.get_client('s3').list_buckets()['Buckets']:
+            print(current_bucket['Name'])
         print("Program Terminating")
         sys.exit(1)
 
-def upload_file(file_name, bucket, object_name=None):
-    """Upload a file to an S3 bucket
+def bucket_exists(bucket_name, s3_client=None):
+    """ Checks a single bucket with HeadBucket instead of listing every bucket in the account
+
+    :param bucket_name: name of the bucket
+    :param s3_client: client to use. If not specified the shared client is used
+    :return: True if the bucket exists and is reachable, else None so the miss is not cached
+    """
+
+    s3_client = s3_client if s3_client is not None else AWS_Clients.get_client('s3')
+    try:
+        s3_client.head_bucket(Bucket=bucket_name)
+    except ClientError as e:
+        logging.error(e)
+        return None
+    return True
+
+def put_file(file_name, bucket, object_name, s3_client=None, transfer_config=None, part_size=Multipart_Upload.DEFAULT_PART_SIZE,
+             part_concurrency=Multipart_Upload.DEFAULT_PART_CONCURRENCY, progress_callback=Multipart_Upload.print_progress,
+             state_path=None):
+    """ Sends one file without any checks or termination. Files of Multipart_Upload.LARGE_FILE_THRESHOLD or more use
+    the resumable multipart uploader, smaller ones a managed transfer
+
+    :param file_name: File to upload
+    :param bucket: Bucket to upload to
+    :param object_name: S3 object name
+    :param s3_client: client to use. If not specified the shared client is used
+    :param transfer_config: TransferConfig for the managed transfer. If not specified one is built from the part settings
+    :param part_size: bytes per multipart part
+    :param part_concurrency: number of parts uploaded in parallel
+    :param progress_callback: called as (bytes_done, total_bytes, elapsed) for large files
+    :param state_path: resume state of a large upload, see Multipart_Upload.upload_large_file
+    :return: True if file was uploaded, False if a large upload was interrupted. It is left open so the next call resumes it
+    :raises ClientError: if the managed transfer fails
+    """
+
+    if os.path.getsize(file_name) >= Multipart_Upload.LARGE_FILE_THRESHOLD:
+        return Multipart_Upload.upload_large_file(file_name, bucket, object_name, part_size, part_concurrency, progress_callback,
+                                                  s3_client, state_path)
+
+    s3_client = s3_client if s3_client is not None else AWS_Clients.get_client('s3')
+    if transfer_config is None:
+        transfer_config = TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size, max_concurrency=part_concurrency)
+    s3_client.upload_file(file_name, bucket, object_name, Config=transfer_config)
+    return True
+
+def upload_file(file_name, bucket, object_name=None, part_size=Multipart_Upload.DEFAULT_PART_SIZE,
+                part_concurrency=Multipart_Upload.DEFAULT_PART_CONCURRENCY, progress_callback=Multipart_Upload.print_progress,
+                state_path=None):
+    """Upload a file to an S3 bucket through put_file, terminating if the upload fails
 
     :param file_name: File to upload
     :param bucket: Bucket to upload to
     :param object_name: S3 object name. If not specified then file_name is used
-    :return: True if file was uploaded, else False
+    :param part_size: bytes per multipart part
+    :param part_concurrency: number of parts uploaded in parallel
+    :param progress_callback: called as (bytes_done, total_bytes, elapsed) for large files
+    :param state_path: resume state of a large upload, see Multipart_Upload.upload_large_file
+    :return: True if file was uploaded, else terminates
     """
-    s3_client = boto3.client('s3')
     try:
-        response = s3_client.upload_file(file_name, bucket, object_name)
-        print("File Successfully uploaded to S3 Bucket")
+        if put_file(file_name, bucket, object_name, part_size=part_size, part_concurrency=part_concurrency,
+                    progress_callback=progress_callback, state_path=state_path):
+            print("File Successfully uploaded to S3 Bucket")
+            return True
 
     except ClientError as e:
         logging.error(e)
-        print("File not uploaded to S3 bucket")
         print(e)
-        sys.exit(1)
+    print("File not uploaded to S3 bucket")
+    sys.exit(1)
 
-def DataIngester(files):
+def DataIngester(files, checkpoint=None, manifest=None, ingest_format=None):
+    """ Runs the upload checks on each file and uploads it to the raw bucket
+
+    :param files: file names relative to the current directory, or File_Scanner.FileRecord entries.
+        Records were already validated against the filename grammar and carry their size, so those checks are not repeated
+    :param checkpoint: Watcher_Checkpoint.WatcherCheckpoint updated after each successful upload of a record
+    :param manifest: Dedup_Manifest.DedupManifest. Files whose content is already in it are skipped before any upload
+    :param ingest_format: Ingest_Format.RAW, CSV_GZIP or PARQUET to upload under Hive style partitioned keys,
+        converting the file first. If not specified the raw file is uploaded under its bare name
+    """
 
     index = 0
+    if ingest_format is not None:
+        ingest_format = Ingest_Format.resolve_format(ingest_format)
 
     for index in range(0,len(files)):
-        curFile = os.getcwd()+"/"+files[index]
+        record = files[index] if isinstance(files[index], File_Scanner.FileRecord) else None
+
+        if record is not None:
+            curFile = os.path.abspath(record.path)
+        else:
+            curFile = os.getcwd()+"/"+files[index]
         
         file_path = abs_path_check(curFile) #test to see if absolute path is inputted to avoid path issues due to relativity 
     
         file_at_path_check(curFile) #test to see if the file exists at the given path 
 
         file_name = os.path.basename(curFile)
-        file_extension_check(curFile) #test to ensure that file has only one, valid extension 
+        if record is None:
+            file_extension_check(curFile) #test to ensure that file has only one, valid extension 
+
+        file_empty_check(curFile, record.size if record is not None else None) #test to see if file is empty 
 
-        file_empty_check(curFile) #test to see if file is empty 
+        if manifest is not None:
+            digest = Dedup_Manifest.hash_file(curFile) #test to see if the same content was uploaded before 
+            original = manifest.contains(digest)
+            if original is not None:
+                print(file_name, "is a duplicate of", original, "and was not uploaded")
+                if checkpoint is not None and record is not None:
+                    checkpoint.mark_ingested(record)
+                continue
 
         bucket_name = "raw-lambda-poc"
 
         bucket_exist_check(bucket_name) #test to see if bucket is present 
 
-        upload_file(file_path,bucket_name,file_name) #upload file to bucket if all of the above criteria is met""" 
+        if ingest_format is None:
+            upload_file(file_path,bucket_name,file_name) #upload file to bucket if all of the above criteria is met""" 
+        else:
+            upload_path, object_name, tmp_path = Ingest_Format.prepare_upload(file_path, ingest_format)
+            state_path = Multipart_Upload.state_path_for(file_path, object_name)
+            try:
+                upload_file(upload_path,bucket_name,object_name,state_path=state_path)
+            finally:
+                if tmp_path is not None:
+                    os.remove(tmp_path)
+                    # the next run converts the file again, so an upload of this conversion can never resume
+                    Multipart_Upload.abort_upload(state_path)
+
+        if manifest is not None:
+            manifest.add(digest, os.path.getsize(curFile), file_name)
+        if checkpoint is not None and record is not None:
+            checkpoint.mark_ingested(record)
+
+    return
+
+def batch_file_check(path, record=None):
+    """ Runs the local upload checks without prompting or terminating, for use in batch uploads
+
+    :param path: absolute path of the file
+    :param record: File_Scanner.FileRecord if the file came from a directory scan
+    :return: (size, None) if the file can be uploaded, else (size, reason)
+    """
+
+    if not os.path.isfile(path):
+        return 0, "File does not exist at given path or is a directory"
+
+    if record is None:
+        name, extension = os.path.splitext(path)
+        if os.path.splitext(name)[1] != "" or extension not in [".csv",".tsv",".xlsx",".txt"]:
+            return 0, "File extension is not accepted"
+
+    size = record.size if record is not None else os.path.getsize(path)
+    if size == 0:
+        return 0, "File is empty"
+    return size, None
+
+def ConcurrentDataIngester(files, concurrency=8, checkpoint=None, bucket_name="raw-lambda-poc", manifest=None, ingest_format=None,
+                           s3_client=None):
+    """ Uploads files to the raw bucket through a bounded thread pool sharing one S3 client.
+    Unlike DataIngester, a failing file is recorded and the remaining files are still uploaded
+
+    :param files: file names relative to the current directory, or File_Scanner.FileRecord entries
+    :param concurrency: number of hashes and uploads in flight at once
+    :param checkpoint: Watcher_Checkpoint.WatcherCheckpoint updated after each successful upload of a record
+    :param bucket_name: bucket to upload to
+    :param manifest: Dedup_Manifest.DedupManifest. Files whose content is already in it are skipped before any upload
+    :param ingest_format: Ingest_Format.RAW, CSV_GZIP or PARQUET to upload under Hive style partitioned keys,
+        converting the file on the worker first. If not specified the raw file is uploaded under its bare name
+    :param s3_client: client to use. If not specified the shared client is used
+    :return: list of UploadResult, one per file
+    """
+
+    # boto3 clients are thread safe, so all workers share one and its connection pool is sized to match.
+    # Files below Multipart_Upload.LARGE_FILE_THRESHOLD are sent by the worker thread without a nested transfer pool,
+    # larger ones through the resumable multipart uploader like upload_file
+    if s3_client is None:
+        s3_client = AWS_Clients.get_client('s3', max_pool_connections=max(concurrency, AWS_Clients.DEFAULT_MAX_POOL_CONNECTIONS))
+    transfer_config = TransferConfig(use_threads=False)
+
+    #test to see if bucket is present, once for the whole batch. A missing bucket fails every file rather than
+    #terminating, so the caller still gets one result per file
+    if not AWS_Clients.cached_lookup("bucket", bucket_name, lambda: bucket_exists(bucket_name, s3_client)):
+        print("Bucket", bucket_name, "was not found, no files uploaded")
+        return [UploadResult(os.path.basename(curFile.path if isinstance(curFile, File_Scanner.FileRecord) else curFile), 0,
+                             False, "Bucket " + bucket_name + " was not found") for curFile in files]
+
+    if ingest_format is not None:
+        ingest_format = Ingest_Format.resolve_format(ingest_format)
+
+    def send(path, key, state_path=None):
+        if not put_file(path, bucket_name, key, s3_client, transfer_config, progress_callback=None, state_path=state_path):
+            raise Exception("Multipart upload of " + key + " was interrupted")
+
+    def upload(path, key):
+        if ingest_format is None:
+            send(path, key)
+            return
+        upload_path, object_name, tmp_path = Ingest_Format.prepare_upload(path, ingest_format)
+        state_path = Multipart_Upload.state_path_for(path, object_name)
+        try:
+            send(upload_path, object_name, state_path)
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
+                # the next run converts the file again, so an upload of this conversion can never resume
+                Multipart_Upload.abort_upload(state_path, s3_client)
+
+    results = []
+    start = time.perf_counter()
+
+    # checkpoint and manifest are only touched on this thread, so neither needs locking
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        candidates = []
+        for curFile in files:
+            record = curFile if isinstance(curFile, File_Scanner.FileRecord) else None
+            path = os.path.abspath(record.path) if record is not None else os.getcwd()+"/"+curFile
+            name = os.path.basename(path)
+
+            size, reason = batch_file_check(path, record)
+            if reason is not None:
+                results.append(UploadResult(name, size, False, reason))
+                continue
+            candidates.append((UploadResult(name, size, True, None), path, record))
+
+        uploads = {}
+        if manifest is None:
+            for result, path, record in candidates:
+                uploads[executor.submit(upload, path, result.name)] = (result, record, None)
+        else:
+            # hashing runs on the pool too, and each file is uploaded as soon as its hash clears the manifest
+            hashes = {executor.submit(Dedup_Manifest.hash_file, path): (result, path, record) for result, path, record in candidates}
+            batch_hashes = set()
+            for future in as_completed(hashes):
+                result, path, record = hashes[future]
+                try:
+                    digest = future.result()
+                except OSError as e:
+                    results.append(result._replace(success=False, error=str(e)))
+                    continue
+
+                original = manifest.contains(digest)
+                if original is not None or digest in batch_hashes:
+                    results.append(result._replace(skipped=True, error="Duplicate of " + (original or "a file in this batch")))
+                    # a duplicate within the batch is not checkpointed, so it is retried if its twin's upload fails
+                    if original is not None and checkpoint is not None and record is not None:
+                        checkpoint.mark_ingested(record)
+                    continue
+                batch_hashes.add(digest)
+                uploads[executor.submit(upload, path, result.name)] = (result, record, digest)
+
+        for future in as_completed(uploads):
+            result, record, digest = uploads[future]
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(e)
+                result = result._replace(success=False, error=str(e))
+            else:
+                if manifest is not None:
+                    manifest.add(digest, result.size, result.name)
+                if checkpoint is not None and record is not None:
+                    checkpoint.mark_ingested(record)
+            results.append(result)
+
+    elapsed = time.perf_counter() - start
+    uploaded = [result for result in results if result.success and not result.skipped]
+    megabytes = sum(result.size for result in uploaded) / (1024 * 1024)
+
+    print("Uploaded", len(uploaded), "of", len(results), "files in", round(elapsed, 2), "seconds:",
+          round(len(uploaded) / elapsed, 1) if elapsed else 0, "files/s,",
+          round(megabytes / elapsed, 2) if elapsed else 0, "MB/s")
+    for result in results:
+        if result.skipped:
+            print("Skipped", result.name + ":", result.error)
+        elif not result.success:
+            print("Upload failed for", result.name + ":", result.error)
 
-    return
\ No newline at end of file
+    return results
\ No newline at end of file
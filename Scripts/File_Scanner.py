@@ -0,0 +1,98 @@
+import calendar
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+#Filenames follow <name>_<source>_<locationcode>_<date>_<time>.<csv|txt>
+# name: alphabet sequence of no fixed length
+# source: alphabet sequence of 3 characters indicating source of data
+# locationCode: 3 character long country code
+# date: in YYYYMMDD format
+# time: in HHMMSS 24-hour format
+FILE_GRAMMAR = re.compile(
+    r"(?P<name>[a-zA-Z]+)_(?P<source>[a-zA-Z]{3})_(?P<location>[a-zA-Z]{3})_"
+    r"(?P<date>20\d{6})_(?P<time>\d{6})\.(?P<extension>csv|txt)\Z")
+
+FileRecord = namedtuple("FileRecord", ["name", "path", "source", "location", "date", "time", "size", "mtime"])
+
+@lru_cache(maxsize=4096)
+def valid_date(date):
+    """ Tests a YYYYMMDD string against the calendar, leap years included.
+    Cached since a landing directory holds many files per day
+
+    :param date: date string captured by FILE_GRAMMAR
+    :return: True if the date exists, else False
+    """
+
+    year, month, day = int(date[:4]), int(date[4:6]), int(date[6:])
+    if month < 1 or month > 12:
+        return False
+    return 1 <= day <= calendar.monthrange(year, month)[1]
+
+def valid_time(time):
+    """ Tests a HHMMSS string for a valid 24-hour time
+
+    :param time: time string captured by FILE_GRAMMAR
+    :return: True if the time is valid, else False
+    """
+
+    return int(time[:2]) < 24 and int(time[2:4]) < 60 and int(time[4:]) < 60
+
+def parse_file_name(file_name):
+    """ Matches a filename against the ingest grammar
+
+    :param file_name: bare file name, without directory
+    :return: the regex match if the name is accepted, else None
+    """
+
+    res = FILE_GRAMMAR.match(file_name)
+    if res is None or not valid_date(res.group("date")) or not valid_time(res.group("time")):
+        return None
+    return res
+
+def build_record(path, res, stat):
+    return FileRecord(os.path.basename(path), path, res.group("source"), res.group("location"),
+                      res.group("date"), res.group("time"), stat.st_size, stat.st_mtime)
+
+def scan_file(my_dir, file_name):
+    """ Builds the record for a single file, used when a watcher is told about one arrival
+
+    :param my_dir: directory holding the file
+    :param file_name: bare file name
+    :return: FileRecord, or None if the name is not accepted or the file is gone
+    """
+
+    res = parse_file_name(file_name)
+    if res is None:
+        return None
+
+    path = os.path.join(my_dir, file_name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return build_record(path, res, stat)
+
+def scan_directory(my_dir):
+    """ Classifies a directory in one pass over os.scandir. Only files whose names pass the grammar are stat'ed
+
+    :param my_dir: directory to scan
+    :return: list of FileRecord for accepted files
+    """
+
+    records = []
+    with os.scandir(my_dir) as entries:
+        for entry in entries:
+            res = parse_file_name(entry.name)
+            if res is None:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError: #removed between listing and stat
+                continue
+            records.append(build_record(entry.path, res, stat))
+
+    return records
@@ -1,51 +1,44 @@
-from os import listdir
-from os.path import isfile, join
+import functools
 import os
 import time
-import re
 import File_Ingester
+import File_Scanner
+import Directory_Notifier
+import Watcher_Checkpoint
+import Dedup_Manifest
 import Run_Crawler
 import Run_Glue_Job
 
 #function to return files in a directory
 #Scans for files in the format <name>_<source>_<locationcode>_<date>_<time>.<csv|txt> 
-# name: alphabet sequence of no fixed length 
-# source: alphabet sequence of 3 characters indicating source of data
-# locationCode: 3 character long country code 
-# date: in YYYYMMDD format 
-# time: in HHMMSS 24-hour format  
+#see File_Scanner.FILE_GRAMMAR for the accepted grammar
 
 def fileInDirectory(my_dir: str):
-    onlyfiles = [f for f in listdir(my_dir) if isfile(join(my_dir, f))]
-    index = 0
-    accepted_formats = [".csv",".txt"]
-
-    while index < len(onlyfiles):
-        name,extension = os.path.splitext(onlyfiles[index])
-        index+=1
-        if extension not in accepted_formats:
-            onlyfiles.remove(onlyfiles[index-1])
-            index = 0
-    
-    finalFiles = []
-    for curFile in onlyfiles:
-        res = re.match("[a-zA-z]+_[a-zA-Z]{3}_[a-zA-Z]{3}_(?<!\d)(?:(?:20\d{2})(?:(?:(?:0[13578]|1[02])31)|(?:(?:0[1,3-9]|1[0-2])(?:29|30)))|(?:(?:20(?:0[48]|[2468][048]|[13579][26]))0229)|(?:20\d{2})(?:(?:0?[1-9])|(?:1[0-2]))(?:0?[1-9]|1\d|2[0-8]))(?!\d)_(?:(?:([01]?\d|2[0-3]))?([0-5]?\d))?([0-5]?\d)[.](txt)|[a-zA-z]+_[a-zA-Z]{3}_[a-zA-Z]{3}_(?<!\d)(?:(?:20\d{2})(?:(?:(?:0[13578]|1[02])31)|(?:(?:0[1,3-9]|1[0-2])(?:29|30)))|(?:(?:20(?:0[48]|[2468][048]|[13579][26]))0229)|(?:20\d{2})(?:(?:0?[1-9])|(?:1[0-2]))(?:0?[1-9]|1\d|2[0-8]))(?!\d)_(?:(?:([01]?\d|2[0-3]))?([0-5]?\d))?([0-5]?\d)[.](csv)",curFile)
-        if res is not None:
-            finalFiles.append(curFile)
- 
-    return(finalFiles)
-
-def listComparison(OriginalList: list, NewList: list):
-    differencesList = [x for x in NewList if x not in OriginalList] #Note if files get deleted, this will not highlight them
+    return({record.name: record for record in File_Scanner.scan_directory(my_dir)})
+
+#Reports new files and files rewritten under a name already seen, which scan to a different size or mtime
+def listComparison(OriginalList, NewList):
+    differencesList = [NewList[x] for x in NewList if OriginalList.get(x) != NewList[x]] #Note if files get deleted, this will not highlight them
     return(differencesList)
 
-def fileWatcher(my_dir: str, pollTime: int):
+#Uploads only the records the checkpoint has not seen in this exact version. With uploadConcurrency above 1
+#the files go through the thread pool and a failed upload is reported instead of stopping the watcher
+def ingestPending(records, checkpoint, uploadConcurrency: int = 1, manifest=None, ingestFormat: str = None):
+    pending = checkpoint.pending(records)
+    if len(pending) == 0:
+        return
+    if uploadConcurrency > 1:
+        File_Ingester.ConcurrentDataIngester(pending, uploadConcurrency, checkpoint, manifest=manifest, ingest_format=ingestFormat)
+    else:
+        File_Ingester.DataIngester(pending, checkpoint, manifest, ingestFormat)
+
+def pollingWatcher(my_dir: str, pollTime: int, ingest):
     while True:
         if 'watching' not in locals(): #Check if this is the first time the function has run
             previousFileList = fileInDirectory(my_dir)
             watching = 1
             print('First Time')
-            File_Ingester.DataIngester(previousFileList)
+            ingest(previousFileList.values())
             
         
         time.sleep(pollTime)
@@ -56,7 +49,73 @@ def fileWatcher(my_dir: str, pollTime: int):
         
         previousFileList = newFileList
         if len(fileDiff) == 0: continue
-        File_Ingester.DataIngester(fileDiff)
+        ingest(fileDiff)
+
+#Reacts to inotify events instead of rescanning. The notifier is created before the initial scan so
+#no file landing in between is missed. Events arriving within settleTime of each other are handed to
+#the ingester as one batch. A file rewritten under a name already seen arrives again with its new size
+#and mtime, and the checkpoint decides whether that version still needs uploading
+def eventWatcher(my_dir: str, notifier, ingest, settleTime: float = 0.2):
+    seenFiles = fileInDirectory(my_dir)
+    print('First Time')
+    ingest(seenFiles.values())
+
+    while True:
+        events = notifier.read_events()
+        arrived = {}
+        while events:
+            for mask, name in events:
+                if name is None: #kernel queue overflowed, events were lost so reconcile with a full scan
+                    print('Event queue overflowed, rescanning', my_dir)
+                    currentFiles = fileInDirectory(my_dir)
+                    for record in listComparison(seenFiles, currentFiles):
+                        arrived[record.name] = record
+                    seenFiles = currentFiles
+                elif mask & Directory_Notifier.REMOVAL_MASK:
+                    seenFiles.pop(name, None)
+                    arrived.pop(name, None)
+                else:
+                    record = File_Scanner.scan_file(my_dir, name)
+                    if record is not None and seenFiles.get(name) != record:
+                        seenFiles[name] = record
+                        arrived[name] = record
+            events = notifier.read_events(settleTime)
+
+        if len(arrived) != 0:
+            ingest(list(arrived.values()))
+
+#The checkpoint and the content manifest live in the watched directory by default.
+#Their names do not match the filename grammar so they are never ingested
+def fileWatcher(my_dir: str, pollTime: int, useInotify: bool = True, checkpointPath: str = None, uploadConcurrency: int = 1,
+                manifestPath: str = None, useManifest: bool = True, ingestFormat: str = None):
+    if checkpointPath is None:
+        checkpointPath = os.path.join(my_dir, Watcher_Checkpoint.CHECKPOINT_NAME)
+    if manifestPath is None:
+        manifestPath = os.path.join(my_dir, Dedup_Manifest.MANIFEST_NAME)
+
+    with Watcher_Checkpoint.WatcherCheckpoint(checkpointPath) as checkpoint:
+        print('Checkpoint holds', len(checkpoint.entries), 'previously ingested files')
+        manifest = Dedup_Manifest.DedupManifest(manifestPath) if useManifest else None
+        try:
+            ingest = functools.partial(ingestPending, checkpoint=checkpoint, uploadConcurrency=uploadConcurrency, manifest=manifest,
+                                       ingestFormat=ingestFormat)
+            watchDirectory(my_dir, pollTime, useInotify, ingest)
+        finally:
+            if manifest is not None:
+                manifest.close()
+
+def watchDirectory(my_dir: str, pollTime: int, useInotify: bool, ingest):
+    if useInotify:
+        try:
+            notifier = Directory_Notifier.DirectoryNotifier(my_dir)
+        except Directory_Notifier.InotifyUnavailable as e:
+            print('inotify unavailable, falling back to polling every', pollTime, 'seconds:', e)
+        else:
+            with notifier:
+                eventWatcher(my_dir, notifier, ingest)
+            return
+
+    pollingWatcher(my_dir, pollTime, ingest)
 
 if __name__=="__main__":
     path = os.getcwd()
@@ -0,0 +1,138 @@
+import logging
+import sys
+from botocore.exceptions import ClientError
+import AWS_Clients
+
+TABLE_NAME = "lambda-fingerprints"
+
+def fingerprint(bucket, etag, size):
+    # S3 events carry the ETag without quotes while HeadObject and listings quote it
+    return bucket + "#" + etag.strip('"') + "#" + str(size)
+
+class FingerprintIndex:
+    """ Content fingerprints of the objects in the pipeline buckets, kept in DynamoDB so the check Lambdas find
+    a duplicate with one conditional write instead of fetching every object in the bucket.
+    A fingerprint is the bucket, ETag and size, the same comparison the Lambdas made before
+
+    :param table_name: DynamoDB table keyed on the string attribute fingerprint
+    :param dynamodb_client: client to use. If not specified the shared client is used
+    :param s3_client: client used to check an indexed original still exists. If not specified the shared client is used
+    """
+
+    def __init__(self, table_name=TABLE_NAME, dynamodb_client=None, s3_client=None):
+        self.table_name = table_name
+        self.dynamodb_client = dynamodb_client if dynamodb_client is not None else AWS_Clients.get_client('dynamodb')
+        self.s3_client = s3_client if s3_client is not None else AWS_Clients.get_client('s3')
+
+    def _put(self, bucket, key, etag, size, condition, values):
+        self.dynamodb_client.put_item(
+            TableName=self.table_name,
+            Item={
+                'fingerprint': {'S': fingerprint(bucket, etag, size)},
+                'bucket': {'S': bucket},
+                'object_key': {'S': key},
+                'size': {'N': str(size)},
+            },
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values)
+
+    def _owner(self, bucket, etag, size):
+        result = self.dynamodb_client.get_item(TableName=self.table_name, Key={'fingerprint': {'S': fingerprint(bucket, etag, size)}},
+                                               ConsistentRead=True)
+        item = result.get('Item')
+        return item['object_key']['S'] if item else None
+
+    def _object_exists(self, bucket, key):
+        try:
+            self.s3_client.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+
+    def claim(self, bucket, key, etag, size):
+        """ Records an object as the owner of its content unless another object already owns it.
+        The write is conditional, so two uploads of the same content racing each other cannot both win.
+        Redelivered events for the owner are not duplicates, and an owner that has since been deleted is replaced
+
+        :param bucket: bucket of the object
+        :param key: object key
+        :param etag: object ETag, quoted or not
+        :param size: object size in bytes
+        :return: key of the object already holding the content, else None if this object now owns it
+        """
+
+        try:
+            self._put(bucket, key, etag, size, "attribute_not_exists(fingerprint) OR object_key = :key", {':key': {'S': key}})
+            return None
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+        owner = self._owner(bucket, etag, size)
+        if owner is None or owner == key:
+            return self.claim(bucket, key, etag, size)
+        if self._object_exists(bucket, owner):
+            return owner
+
+        # the original is gone, take the fingerprint over unless another object got there first
+        try:
+            self._put(bucket, key, etag, size, "object_key = :owner", {':owner': {'S': owner}})
+            return None
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+        return self.claim(bucket, key, etag, size)
+
+def create_table(table_name=TABLE_NAME, dynamodb_client=None):
+    """ Creates the on-demand fingerprint table
+
+    :param table_name: table to create
+    :param dynamodb_client: client to use. If not specified the shared client is used
+    :return: True if creation was started, else False
+    """
+
+    dynamodb_client = dynamodb_client if dynamodb_client is not None else AWS_Clients.get_client('dynamodb')
+    try:
+        dynamodb_client.create_table(
+            TableName=table_name,
+            AttributeDefinitions=[{'AttributeName': 'fingerprint', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'fingerprint', 'KeyType': 'HASH'}],
+            BillingMode='PAY_PER_REQUEST')
+    except ClientError as e:
+        logging.error(e)
+        return False
+    return True
+
+def backfill(bucket, index, delete_duplicates=False):
+    """ Indexes the objects already in a bucket, so the index holds everything uploaded before it existed.
+    Listings carry the ETag and size of every object, so no object is fetched. Safe to re-run
+
+    :param bucket: bucket to index
+    :param index: FingerprintIndex
+    :param delete_duplicates: delete objects whose content is already held by another object
+    :return: (objects indexed, duplicates found)
+    """
+
+    indexed = 0
+    duplicates = 0
+    paginator = index.s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket):
+        for obj in page.get('Contents', []):
+            owner = index.claim(bucket, obj['Key'], obj['ETag'], obj['Size'])
+            if owner is None:
+                indexed += 1
+                continue
+            duplicates += 1
+            print(obj['Key'], "is a Duplicate of", owner)
+            if delete_duplicates:
+                index.s3_client.delete_object(Bucket=bucket, Key=obj['Key'])
+    return indexed, duplicates
+
+if __name__ == "__main__":
+    # python Fingerprint_Index.py <bucket>... [--delete-duplicates]
+    index = FingerprintIndex()
+    for bucket in [arg for arg in sys.argv[1:] if not arg.startswith("--")]:
+        indexed, duplicates = backfill(bucket, index, "--delete-duplicates" in sys.argv)
+        print(bucket + ":", indexed, "objects indexed,", duplicates, "duplicates")
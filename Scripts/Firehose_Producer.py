@@ -0,0 +1,108 @@
+import json
+import logging
+import sys
+import AWS_Clients
+import Flight_Rows
+import Kinesis_Producer
+import Kinesis_Stream_Source
+
+# PutRecordBatch limits
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+MAX_RECORD_BYTES = 1000 * 1024
+
+RETRYABLE_ERRORS = ('ServiceUnavailableException', 'InternalFailure', 'ServiceUnavailable', 'ThrottlingException')
+# Firehose reports a delivery stream over its throughput as ServiceUnavailableException
+THROTTLED_ERRORS = ('ServiceUnavailableException', 'ThrottlingException')
+
+def row_to_json(row, columns=Flight_Rows.FLIGHT_COLUMNS):
+    """ Turns a CSV line into a newline terminated JSON object, the input Firehose needs for record format
+    conversion and for partitioning on record fields. Empty values are left out so they convert to null
+
+    :param row: line as bytes
+    :param columns: column names in file order
+    :return: JSON line as bytes, else None if the line is not a data row
+    """
+
+    fields = Flight_Rows.parse_row(row, columns)
+    if fields is None:
+        return None
+    return json.dumps({column: value for column, value in fields.items() if value != ""},
+                      separators=(",", ":")).encode("utf-8") + b"\n"
+
+class FirehoseProducer(Kinesis_Producer.BatchProducer):
+    """ Sends records straight to a DirectPut delivery stream with PutRecordBatch, for sources that do not need
+    a Kinesis data stream in front of S3. Batches respect the 500 record and 4 MB limits and only the entries a
+    call reports as failed are retried, with jittered exponential backoff.
+    Firehose concatenates records as they are, so every record is sent newline terminated.
+    An instance is meant to be used from one thread
+
+    :param delivery_stream: Firehose delivery stream name
+    :param firehose_client: client to use. If not specified the shared client is used
+    :param as_json: convert CSV lines, bytes or str, to JSON objects with row_to_json. Needed when the delivery
+        stream converts to Parquet or partitions on record fields
+    :param max_attempts: attempts per record before it is counted as failed
+    :param base_delay: first backoff delay in seconds
+    :param max_delay: cap on the backoff delay in seconds
+    """
+
+    max_batch_records = MAX_BATCH_RECORDS
+    max_batch_bytes = MAX_BATCH_BYTES
+    retryable_errors = RETRYABLE_ERRORS
+    throttled_errors = THROTTLED_ERRORS
+
+    def __init__(self, delivery_stream, firehose_client=None, as_json=False, max_attempts=8, base_delay=0.1, max_delay=5.0):
+        super().__init__(max_attempts, base_delay, max_delay)
+        self.delivery_stream = delivery_stream
+        self.firehose_client = firehose_client if firehose_client is not None else AWS_Clients.get_client('firehose')
+        self.as_json = as_json
+        self.skipped_rows = 0
+
+    def put(self, data):
+        """ Adds a record to the buffer, sending the buffer first if the record would not fit in the batch
+
+        :param data: record payload, bytes, str or a dict sent as a JSON object
+        :return: number of records that could not be delivered by the batch this call sent to make room, else 0
+        """
+
+        if isinstance(data, dict):
+            data = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        else:
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            if self.as_json:
+                data = row_to_json(data)
+                if data is None:
+                    self.skipped_rows += 1
+                    return 0
+        if not data.endswith(b"\n"):
+            data += b"\n"
+
+        if len(data) > MAX_RECORD_BYTES:
+            raise ValueError("Record of " + str(len(data)) + " bytes exceeds the Firehose record limit")
+        return self._buffer_record({'Data': data}, len(data), 1)
+
+    def _put_batch(self, records):
+        return self.firehose_client.put_record_batch(DeliveryStreamName=self.delivery_stream,
+                                                     Records=records)['RequestResponses']
+
+    def stats(self):
+        """ Throughput counters since the producer was created
+
+        :return: dict of Kinesis_Producer.BatchProducer.stats counters plus skipped_rows
+        """
+
+        stats = super().stats()
+        stats['skipped_rows'] = self.skipped_rows
+        return stats
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(asctime)s: %(message)s')
+
+    # python Firehose_Producer.py <delivery stream> <file or directory> [--json]
+    producer = FirehoseProducer(sys.argv[1], as_json="--json" in sys.argv[3:])
+    if Kinesis_Stream_Source.stream_to_kinesis(sys.argv[2], producer):
+        exit(1)
+    stats = producer.stats()
+    logging.info(f"Sent {stats['records_sent']} records in {stats['requests_sent']} requests, "
+                 f"{stats['records_per_second']:.1f} records/s, {stats['bytes_per_second']:.0f} bytes/s")
@@ -0,0 +1,24 @@
+import csv
+
+# Column order of the flight extracts. Streamed rows carry no header, so they are mapped by position
+FLIGHT_COLUMNS = ["fl_date", "op_carrier", "op_carrier_fl_num", "origin", "dest", "crs_dep_time", "dep_time",
+                  "dep_delay", "taxi_out", "wheels_off", "wheels_on", "taxi_in", "crs_arr_time", "arr_time",
+                  "arr_delay", "cancelled", "cancellation_code", "diverted", "crs_elapsed_time",
+                  "actual_elapsed_time", "air_time", "distance", "carrier_delay", "weather_delay", "nas_delay",
+                  "security_delay", "late_aircraft_delay", "unnamed: 27"]
+
+def parse_row(row, columns=FLIGHT_COLUMNS):
+    """ Maps one CSV line onto column names
+
+    :param row: line as bytes
+    :param columns: column names in file order
+    :return: dict of column to string value, else None if the line is not a data row
+    """
+
+    try:
+        values = next(csv.reader([row.decode("utf-8")]))
+    except (UnicodeDecodeError, StopIteration, csv.Error):
+        return None
+    if len(values) < 2 or values[0] == columns[0] or values[0].upper() == columns[0].upper():
+        return None
+    return dict(zip(columns, values))
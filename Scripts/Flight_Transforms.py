@@ -0,0 +1,280 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+# One transform step, defined once and run by either engine:
+# op: DROP_COLUMNS, DROP_NULLS or DEDUPLICATE
+# columns: columns the step applies to. For DEDUPLICATE an empty tuple compares whole rows
+# DEDUPLICATE removes duplicates within the rows of one run only. A run reads the new files of its bookmark or its
+# --input_paths, so a row that repeats one written by an earlier run is kept
+Step = namedtuple("Step", ["op", "columns"], defaults=((),))
+
+DROP_COLUMNS = "drop_columns"
+DROP_NULLS = "drop_nulls"
+DEDUPLICATE = "deduplicate"
+
+#dropping the column since it has no data and was from a source without cleaned data
+#cancellation_code has about 99% empty values and may not contribute effectively to a use case
+RAW_TO_TRUSTED = (Step(DROP_COLUMNS, ("unnamed: 27", "cancellation_code")),)
+TRUSTED_TO_REFINED = (Step(DROP_NULLS, ("air_time",)), Step(DEDUPLICATE))
+RAW_TO_REFINED = RAW_TO_TRUSTED + TRUSTED_TO_REFINED
+
+DEFAULT_PARTITION_KEYS = ("fl_date", "op_carrier")
+
+# Inputs below this size are transformed inside the Lambda that saw them arrive, larger ones go to Glue.
+# A compressed CSV of this size expands to a few hundred MB in memory, which fits a 2 GB Lambda once
+SMALL_INPUT_THRESHOLD = 32 * 1024 * 1024
+
+# Lambda_Events.process_event handles up to 8 objects at once, but only this many are transformed at a time,
+# so peak memory stays that of one input whatever the size of the event
+LOCAL_CONCURRENCY = 1
+_local_slots = threading.BoundedSemaphore(LOCAL_CONCURRENCY)
+
+# folder name of rows whose partition column is null
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+LOCAL = "local"
+GLUE = "glue"
+
+def row_local(steps):
+    """ Tells whether steps can run on one file at a time with the result they have on a whole job run.
+    DEDUPLICATE compares rows across every file of a run, so it cannot
+
+    :param steps: sequence of Step
+    :return: True if no step looks beyond the row it is applied to
+    """
+
+    return all(step.op != DEDUPLICATE for step in steps)
+
+def choose_engine(size, steps, threshold=SMALL_INPUT_THRESHOLD):
+    """ Picks where an input is transformed. Starting a Glue job costs about a minute before the first row is read,
+    longer than pyarrow takes for a small file, but only row local steps can be run per file
+
+    :param size: input size in bytes
+    :param steps: sequence of Step the input goes through
+    :param threshold: size in bytes from which Glue is used
+    :return: LOCAL or GLUE
+    """
+
+    return LOCAL if size is not None and size < threshold and row_local(steps) else GLUE
+
+def normalize_column(name):
+    # the crawler lowercases header names, so both engines use the catalog's names
+    return name.strip().lower()
+
+def partition_values(key):
+    """ Reads the key=value folders of an S3 key, which the catalog exposes as string columns
+
+    :param key: eg "source=flt/location=ind/date=20220707/aanchal_flt_ind_20220707_180156.csv"
+    :return: list of (column, value), value None for the folder Spark and pyarrow write null values to
+    """
+
+    values = []
+    for folder in key.split("/")[:-1]:
+        name, sep, value = folder.partition("=")
+        if sep and name:
+            values.append((normalize_column(name), None if value == NULL_PARTITION else value))
+    return values
+
+def apply_spark(dataframe, steps):
+    """ Runs steps on a Spark DataFrame
+
+    :param dataframe: pyspark DataFrame
+    :param steps: sequence of Step
+    :return: transformed DataFrame
+    """
+
+    for step in steps:
+        if step.op == DROP_COLUMNS:
+            dataframe = dataframe.drop(*step.columns)
+        elif step.op == DROP_NULLS:
+            # drops NaN as well as null
+            dataframe = dataframe.na.drop(subset=list(step.columns))
+        elif step.op == DEDUPLICATE:
+            dataframe = dataframe.dropDuplicates(list(step.columns) or None)
+        else:
+            raise ValueError("Unknown transform step " + str(step.op))
+    return dataframe
+
+def apply_arrow(table, steps):
+    """ Runs steps on a pyarrow Table with the semantics of apply_spark: dropping a missing column does nothing,
+    DROP_NULLS also drops NaN, and DEDUPLICATE treats nulls as equal and keeps the first row of each group
+
+    :param table: pyarrow Table
+    :param steps: sequence of Step
+    :return: transformed Table
+    """
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for step in steps:
+        if step.op == DROP_COLUMNS:
+            table = table.drop_columns([column for column in step.columns if column in table.column_names])
+        elif step.op == DROP_NULLS:
+            keep = None
+            for column in step.columns:
+                values = table.column(column)
+                valid = pc.is_valid(values)
+                if pa.types.is_floating(values.type):
+                    valid = pc.and_(valid, pc.invert(pc.is_nan(values)))
+                keep = valid if keep is None else pc.and_(keep, valid)
+            if keep is not None:
+                table = table.filter(keep)
+        elif step.op == DEDUPLICATE:
+            table = _deduplicate(table, list(step.columns) or table.column_names)
+        else:
+            raise ValueError("Unknown transform step " + str(step.op))
+    return table
+
+def _deduplicate(table, keys):
+    import pyarrow.compute as pc
+
+    others = [name for name in table.column_names if name not in keys]
+    # single threaded, group_by keeps groups in order of first appearance, and "first" with nulls counted takes
+    # the rest of each group's first row
+    first = pc.ScalarAggregateOptions(skip_nulls=False)
+    groups = table.group_by(keys, use_threads=False).aggregate([(name, "first", first) for name in others])
+    renames = {name + "_first": name for name in others}
+    groups = groups.rename_columns([renames.get(name, name) for name in groups.column_names])
+    return groups.select(table.column_names)
+
+def _arrow_string_columns(table):
+    # the catalog reads dates and empty columns as strings, so pyarrow's date and null inference is undone
+    import pyarrow as pa
+
+    for position, field in enumerate(table.schema):
+        if pa.types.is_date(field.type) or pa.types.is_null(field.type):
+            table = table.set_column(position, field.name, table.column(position).cast(pa.string()))
+        elif pa.types.is_integer(field.type) and field.type != pa.int64():
+            table = table.set_column(position, field.name, table.column(position).cast(pa.int64()))
+    return table
+
+def read_arrow(path, key=None):
+    """ Reads a raw or trusted input the way the catalog sees it: lowercase column names, empty CSV fields as
+    null, and the key=value folders of its key as string columns
+
+    :param path: local file, .csv, .csv.gz or .parquet
+    :param key: S3 key the file was downloaded from. If not specified path is used
+    :return: pyarrow Table
+    """
+
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    name = os.path.basename(key or path).lower()
+    if ".parquet" in name:
+        table = pq.read_table(path)
+    else:
+        # compression is detected from the .gz extension. Only empty fields are null, as in Spark, so eg "NaN"
+        # stays a number instead of pyarrow's default of reading it as null
+        table = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(null_values=[""], strings_can_be_null=True))
+    table = table.rename_columns([normalize_column(column) for column in table.column_names])
+    table = _arrow_string_columns(table)
+
+    for column, value in partition_values(key or path):
+        if column not in table.column_names:
+            table = table.append_column(column, pa.array([value] * table.num_rows, pa.string()))
+    return table
+
+def write_arrow(table, directory, partition_keys=DEFAULT_PARTITION_KEYS, basename="part"):
+    """ Writes a Table as Snappy compressed Parquet in key=value folders, the layout the Glue jobs write
+
+    :param table: pyarrow Table
+    :param directory: local output directory
+    :param partition_keys: columns to partition on, the ones missing from table are skipped
+    :param basename: file name prefix. Reusing it for the same input overwrites rather than duplicates output
+    :return: list of written file paths
+    """
+
+    import pyarrow.dataset as ds
+
+    written = []
+    ds.write_dataset(table, directory, format="parquet",
+                     partitioning=[key for key in partition_keys if key in table.column_names] or None,
+                     partitioning_flavor="hive",
+                     basename_template=basename + "-{i}.snappy.parquet",
+                     file_options=ds.ParquetFileFormat().make_write_options(compression="snappy"),
+                     existing_data_behavior="overwrite_or_ignore",
+                     file_visitor=lambda written_file: written.append(written_file.path))
+    return written
+
+def transform_object(s3_client, bucket, key, steps, dest_bucket, partition_keys=DEFAULT_PARTITION_KEYS, etag=None):
+    """ Transforms one small object in process and uploads the result next to what the Glue job would write.
+    Calls from several threads wait for each other, see LOCAL_CONCURRENCY
+
+    :param s3_client: client to use
+    :param bucket: bucket of the input
+    :param key: key of the input
+    :param steps: sequence of row local Step, eg RAW_TO_TRUSTED, see row_local
+    :param dest_bucket: bucket the Glue job writes to, eg "shift-to-trusted"
+    :param partition_keys: columns to partition the output on
+    :param etag: ETag of the input, so a new version of a key gets its own output files
+    :return: dict with rows read, rows written and the keys uploaded
+    """
+
+    if not row_local(steps):
+        raise ValueError("Deduplication spans every file of a job run and cannot run on one object")
+
+    identity = "\n".join(str(part) for part in (bucket, key, etag))
+    basename = "local-" + hashlib.sha1(identity.encode("utf-8")).hexdigest()[:12]
+
+    with _local_slots, tempfile.TemporaryDirectory() as work:
+        # the input keeps its file name so its format and compression can be told from the extension
+        source = os.path.join(work, os.path.basename(key))
+        s3_client.download_file(bucket, key, source)
+        table = read_arrow(source, key)
+        result = apply_arrow(table, steps)
+
+        output = os.path.join(work, "output")
+        uploaded = []
+        for path in write_arrow(result, output, partition_keys, basename):
+            dest_key = os.path.relpath(path, output).replace(os.sep, "/")
+            s3_client.upload_file(path, dest_bucket, dest_key)
+            uploaded.append(dest_key)
+
+    return {'rows_in': table.num_rows, 'rows_out': result.num_rows, 'keys': sorted(uploaded)}
+
+def _base_path(path):
+    # the folder above the first key=value folder, which Spark needs to turn the partition folders into columns
+    folders = path.split("/")
+    for position, folder in enumerate(folders[:-1]):
+        if "=" in folder:
+            return "/".join(folders[:position]) + "/"
+    return path.rsplit("/", 1)[0] + "/"
+
+def read_spark(spark, paths):
+    """ Reads the given S3 files the way read_arrow does, for Glue runs limited to the files the Lambdas routed
+    to Glue. Partition folders become string columns, as in the catalog
+
+    :param spark: SparkSession
+    :param paths: list of paths under one root, eg s3://raw-lambdaarch/..., csv, csv.gz or parquet
+    :return: pyspark DataFrame
+    """
+
+    spark.conf.set("spark.sql.sources.partitionColumnTypeInference.enabled", "false")
+    reader = spark.read.option("basePath", _base_path(paths[0]))
+
+    parquet = [path for path in paths if ".parquet" in path.rsplit("/", 1)[-1].lower()]
+    csv = [path for path in paths if path not in parquet]
+    frames = []
+    if parquet:
+        frames.append(reader.parquet(*parquet))
+    if csv:
+        frames.append(reader.csv(csv, header=True, inferSchema=True))
+
+    dataframe = frames[0]
+    for frame in frames[1:]:
+        dataframe = dataframe.unionByName(frame, allowMissingColumns=True)
+    dataframe = dataframe.toDF(*[normalize_column(column) for column in dataframe.columns])
+
+    for field in dataframe.schema.fields:
+        type_name = field.dataType.typeName()
+        if type_name in ("date", "void"):
+            dataframe = dataframe.withColumn(field.name, dataframe[field.name].cast("string"))
+        elif type_name in ("integer", "short", "byte"):
+            dataframe = dataframe.withColumn(field.name, dataframe[field.name].cast("long"))
+    return dataframe
@@ -5,10 +5,27 @@ from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
 from awsglue.dynamicframe import DynamicFrame
+# shipped with the job through --extra-py-files, the same steps the Lambdas run on small files
+import Flight_Transforms
 
-## @params: [JOB_NAME]
+## @params: [JOB_NAME], optional [input_paths, partition_keys, push_down_predicate, columns]
 args = getResolvedOptions(sys.argv, ['JOB_NAME'])
 
+def optional_option(name, default):
+    # getResolvedOptions fails on arguments that were not passed, so optional ones are looked up first
+    if '--' + name in sys.argv:
+        return getResolvedOptions(sys.argv, [name])[name]
+    return default
+
+# output is partitioned into key=value/ folders, so readers filtering on these columns skip whole folders
+partition_keys = [key for key in optional_option('partition_keys', 'fl_date,op_carrier').split(',') if key]
+# catalog partition filter, eg "fl_date >= '2018-01-01'", applied before any file is opened
+push_down_predicate = optional_option('push_down_predicate', '')
+# columns to read, all when empty
+columns = [column for column in optional_option('columns', '').split(',') if column]
+# comma separated s3:// paths of the files the Lambdas left to Glue. Empty to read the catalog table
+input_paths = [path for path in optional_option('input_paths', '').split(',') if path]
+
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
@@ -22,16 +39,38 @@ s3_write_bucket = "s3://shift-to-refined/"
 #Extract 
 # creating datasource using the catalog table
 # crawler has added metadata to glue catalog from the datasets in the raw bucket 
-datasource = glueContext.create_dynamic_frame.from_catalog(
-    database=db_name, table_name=tbl_name)
+# the transformation_ctx keys the job bookmark, so with bookmarks enabled only files added since the last
+# committed run are read
+if input_paths:
+    # only the large files of the batch, the small ones were already transformed by the Lambdas
+    dataframe = Flight_Transforms.read_spark(spark, input_paths)
+    if columns:
+        dataframe = dataframe.select(*(columns + [key for key in partition_keys if key not in columns]))
+else:
+    # catalog runs come from Stage_Orchestrator. The bookmark does not know about files the Lambdas transformed
+    # or passed by path, so this mode must not be mixed with the Lambda driven one, see event_driven_batches
+    datasource = glueContext.create_dynamic_frame.from_catalog(
+        database=db_name, table_name=tbl_name, push_down_predicate=push_down_predicate, transformation_ctx="datasource")
+    if columns:
+        datasource = datasource.select_fields(columns + [key for key in partition_keys if key not in columns])
+
+    # converting from Glue DynamicFrame to Spark Dataframe
+    dataframe = datasource.toDF()
 
-# converting from Glue DynamicFrame to Spark Dataframe
-dataframe = datasource.toDF()
+# nothing new since the last run, commit so the bookmark stays current and write nothing.
+# A bookmarked read that finds no new files has no columns, so this checks the schema and runs no Spark job,
+# while a frame with columns but no rows goes through and the glueparquet sink writes nothing for it
+if not dataframe.columns:
+    print("No new files since the last committed run")
+    job.commit()
+    sys.exit(0)
 
 #Transform 
-#dropping the column since it has no data and was from a source without cleaned data 
-datasource_df = dataframe.na.drop(subset=["air_time"]) 
-datasource_df = dataframe.dropDuplicates() #Has about 99% empty values and may not contribute effectively to a use case 
+#dropping rows without air_time, then duplicate rows, see Flight_Transforms.TRUSTED_TO_REFINED
+# duplicates are only removed within this run's input, the new files of the bookmark or the --input_paths.
+# Rows repeating ones an earlier run wrote to the refined zone stay, unlike the old full-table read. The output is
+# appended, so deduplicating the whole table means emptying the refined zone and running once with job-bookmark-disable
+datasource_df = Flight_Transforms.apply_spark(dataframe, Flight_Transforms.TRUSTED_TO_REFINED)
 print(datasource_df.head())
 
 transform1 = DynamicFrame.fromDF(
@@ -40,8 +79,11 @@ transform1 = DynamicFrame.fromDF(
 #Load 
 # Uploading data back to the trusted s3 bucket after dropping columns irrelevant to analysis 
 # further refinement of data will occur when data is being sent to the refined bucket 
+# Snappy compressed Parquet, so later reads only decode the columns they use
 datasink1 = glueContext.write_dynamic_frame.from_options(frame=transform1, connection_type="s3", connection_options={
-                                                         "path": s3_write_bucket}, format="csv", transformation_ctx="datasink1")
+                                                         "path": s3_write_bucket, "partitionKeys": partition_keys},
+                                                         format="glueparquet", format_options={"compression": "snappy"},
+                                                         transformation_ctx="datasink1")
                                                          
 
 job.commit()
\ No newline at end of file
@@ -0,0 +1,114 @@
+import gzip
+import os
+import shutil
+import tempfile
+import File_Scanner
+
+# pyarrow is optional. Without it the parquet format falls back to gzip compressed CSV
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pa_csv = None
+    pq = None
+
+RAW = "raw"
+CSV_GZIP = "csv.gz"
+PARQUET = "parquet"
+
+CHUNK_SIZE = 1024 * 1024
+
+# rows are parsed and written in blocks of this many bytes of CSV, which bounds memory whatever the file size
+PARQUET_BLOCK_SIZE = 16 * 1024 * 1024
+
+def resolve_format(ingest_format):
+    """ Checks the requested format is available
+
+    :param ingest_format: RAW, CSV_GZIP or PARQUET
+    :return: the format to use, CSV_GZIP if PARQUET was asked for without pyarrow installed
+    """
+
+    if ingest_format not in (RAW, CSV_GZIP, PARQUET):
+        raise ValueError("Unknown ingest format " + str(ingest_format))
+    if ingest_format == PARQUET and pq is None:
+        print("pyarrow is not installed, uploading gzip compressed CSV instead of parquet")
+        return CSV_GZIP
+    return ingest_format
+
+def partition_key(file_name, extension=None):
+    """ Builds a Hive style key from the fields encoded in the filename, eg
+    source=flt/location=ind/date=20220707/aanchal_flt_ind_20220707_180156.parquet
+
+    :param file_name: bare file name in the <name>_<source>_<loc>_<date>_<time> grammar
+    :param extension: replaces the file's extension, eg '.parquet'. If not specified it is kept
+    :return: object key. Names outside the grammar keep a flat key
+    """
+
+    stem, original_extension = os.path.splitext(file_name)
+    name = stem + (extension if extension is not None else original_extension)
+
+    res = File_Scanner.parse_file_name(file_name)
+    if res is None:
+        return name
+    return "source={}/location={}/date={}/{}".format(
+        res.group("source").lower(), res.group("location").lower(), res.group("date"), name)
+
+def gzip_csv(path, out_path):
+    with open(path, "rb") as source, gzip.open(out_path, "wb", compresslevel=6) as target:
+        shutil.copyfileobj(source, target, CHUNK_SIZE)
+
+def _column_types(path, read_options):
+    # the streaming reader infers types from the first block only. A column empty throughout it, eg the ~99% empty
+    # cancellation_code, is inferred as null and its first value in a later block fails the whole file, so such
+    # columns are read as strings
+    reader = pa_csv.open_csv(path, read_options=read_options)
+    try:
+        return {field.name: pa.string() for field in reader.schema if pa.types.is_null(field.type)}
+    finally:
+        reader.close()
+
+def csv_to_parquet(path, out_path):
+    # the streaming reader parses one block at a time and each block becomes a row group
+    read_options = pa_csv.ReadOptions(block_size=PARQUET_BLOCK_SIZE)
+    convert_options = pa_csv.ConvertOptions(column_types=_column_types(path, read_options))
+    reader = pa_csv.open_csv(path, read_options=read_options, convert_options=convert_options)
+    writer = None
+    try:
+        for batch in reader:
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, batch.schema, compression="snappy")
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+        reader.close()
+
+    if writer is None: # header only, no rows
+        pq.write_table(reader.schema.empty_table(), out_path, compression="snappy")
+
+def prepare_upload(path, ingest_format):
+    """ Converts a raw file into the upload format in a temporary file
+
+    :param path: raw .csv or .txt file
+    :param ingest_format: RAW, CSV_GZIP or PARQUET, as returned by resolve_format
+    :return: (path to upload, object key, temporary path to delete afterwards or None)
+    """
+
+    file_name = os.path.basename(path)
+    if ingest_format == RAW:
+        return path, partition_key(file_name), None
+
+    extension = ".parquet" if ingest_format == PARQUET else os.path.splitext(file_name)[1] + ".gz"
+    fd, out_path = tempfile.mkstemp(suffix=extension)
+    os.close(fd)
+    try:
+        if ingest_format == PARQUET:
+            csv_to_parquet(path, out_path)
+        else:
+            gzip_csv(path, out_path)
+    except Exception:
+        os.remove(out_path)
+        raise
+    return out_path, partition_key(file_name, extension), out_path
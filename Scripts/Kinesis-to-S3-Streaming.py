@@ -1,7 +1,11 @@
 import json
 import logging
+import sys
 import time
-import boto3
+import AWS_Clients
+import Kinesis_Producer
+import Kinesis_Stream_Source
+import Shard_Autoscaler
 from botocore.exceptions import ClientError
 
 def get_kinesis_arn(stream_name):
@@ -13,13 +17,15 @@ def get_kinesis_arn(stream_name):
     """
 
     # Retrieve stream info
-    kinesis_client = boto3.client('kinesis')
-    try:
-        result = kinesis_client.describe_stream_summary(StreamName=stream_name)
-    except ClientError as e:
-        logging.error(e)
-        return None
-    return result['StreamDescriptionSummary']['StreamARN']
+    def lookup():
+        try:
+            result = AWS_Clients.get_client('kinesis').describe_stream_summary(StreamName=stream_name)
+        except ClientError as e:
+            logging.error(e)
+            return None
+        return result['StreamDescriptionSummary']['StreamARN']
+
+    return AWS_Clients.cached_lookup('kinesis-arn', stream_name, lookup)
 
 
 def wait_for_active_kinesis_stream(stream_name):
@@ -30,7 +36,7 @@ def wait_for_active_kinesis_stream(stream_name):
     """
 
     # Wait until the stream is active
-    kinesis_client = boto3.client('kinesis')
+    kinesis_client = AWS_Clients.get_client('kinesis')
     while True:
         try:
             # Get the stream's current status
@@ -54,13 +60,15 @@ def get_firehose_arn(firehose_name):
     """
 
     # Try to get the description of the Firehose
-    firehose_client = boto3.client('firehose')
-    try:
-        result = firehose_client.describe_delivery_stream(DeliveryStreamName=firehose_name)
-    except ClientError as e:
-        logging.error(e)
-        return None
-    return result['DeliveryStreamDescription']['DeliveryStreamARN']
+    def lookup():
+        try:
+            result = AWS_Clients.get_client('firehose').describe_delivery_stream(DeliveryStreamName=firehose_name)
+        except ClientError as e:
+            logging.error(e)
+            return None
+        return result['DeliveryStreamDescription']['DeliveryStreamARN']
+
+    return AWS_Clients.cached_lookup('firehose-arn', firehose_name, lookup)
 
 def wait_for_active_firehose(firehose_name):
     """Wait until the Firehose delivery stream is active
@@ -70,7 +78,7 @@ def wait_for_active_firehose(firehose_name):
     """
 
     # Wait until the stream is active
-    firehose_client = boto3.client('firehose')
+    firehose_client = AWS_Clients.get_client('firehose')
     while True:
         try:
             # Get the stream's current status
@@ -120,63 +128,24 @@ def main():
         exit(1)
     logging.info('Firehose stream is active')
 
-    test_data_file = 'aanchal_flt_ind_20220707_180156.csv'
-    kinesis_client = boto3.client('kinesis')
-    with open(test_data_file, 'rb') as f:
-        logging.info('Putting 1000 records into the Kinesis stream one at a time')
-        for i in range(1000):
-            # Read a record of test data
-            line = next(f)
+    # Replay a file or a whole directory of extracts, streamed with constant memory
+    test_data_path = sys.argv[1] if len(sys.argv) > 1 else 'aanchal_flt_ind_20220707_180156.csv'
+    # Rows are aggregated into KPL records. Firehose de-aggregates them before writing to S3
+    producer = Kinesis_Producer.KinesisProducer(kinesis_name, aggregate=True)
+    logging.info(f'Streaming {test_data_path} into the Kinesis stream')
 
-            # Extract the "sector" value to use as the partition key
-            sector = "flt"
-
-            # Put the record into the stream
-            try:
-                result = kinesis_client.put_record(StreamName=kinesis_name,
-                                          Data=line,
-                                          PartitionKey=sector)
-            except ClientError as e:
-                logging.error(e)
-                exit(1)
-
-        time.sleep(100)
-        logging.info('Putting next 1000 records')
-
-        batch = [{'Data': next(f)} for x in range(1000)]
-
-        try:
-            result = kinesis_client.put_records(StreamName=kinesis_name,
-                                                Records=batch)
-        except ClientError as e:
-            logging.error(e)
+    # Log shard count recommendations from the measured ingress. Pass apply=True to reshard automatically
+    autoscaler = Shard_Autoscaler.ShardAutoscaler(kinesis_name, min_shards=number_of_shards)
+    stop_autoscaler = autoscaler.run_in_background(producer, interval=60)
+    try:
+        if Kinesis_Stream_Source.stream_to_kinesis(test_data_path, producer):
             exit(1)
+    finally:
+        stop_autoscaler.set()
 
-
-        num_failures = result['FailedRecordCount']
-        '''
-        # Test: Simulate a failed record
-        num_failures = 1
-        failed_rec_index = 3
-        result['Records'][failed_rec_index]['ErrorCode'] = 404
-        '''
-        if num_failures:
-            # Resend failed records
-            logging.info(f'Resending {num_failures} failed records')
-            rec_index = 0
-            for record in result['Records']:
-                if 'ErrorCode' in record:
-                    # Resend the record
-                    kinesis_client.put_record(StreamName=kinesis_name,
-                                              Data=batch[rec_index]['Data'],
-                                              PartitionKey=batch[rec_index]['PartitionKey'])
-
-                    # Stop if all failed records have been resent
-                    num_failures -= 1
-                    if not num_failures:
-                        break
-                rec_index += 1
-
+    stats = producer.stats()
+    logging.info(f"Sent {stats['rows_sent']} rows as {stats['records_sent']} records in {stats['requests_sent']} requests, "
+                 f"{stats['rows_per_second']:.1f} rows/s, {stats['bytes_per_second']:.0f} bytes/s")
     logging.info('Test data sent to Kinesis stream')
 
 
@@ -0,0 +1,208 @@
+import hashlib
+
+# Records use the KPL aggregated record format, so KCL consumers and Firehose, which de-aggregates KPL records
+# read from a stream source, handle them as well as deaggregate below:
+#   magic | protobuf AggregatedRecord | md5(protobuf)
+# AggregatedRecord { repeated string partition_key_table = 1; repeated string explicit_hash_key_table = 2;
+#                    repeated Record records = 3; }
+# Record { required uint64 partition_key_index = 1; optional uint64 explicit_hash_key_index = 2;
+#          required bytes data = 3; repeated Tag tags = 4; }
+MAGIC = b"\xf3\x89\x9a\xc2"
+DIGEST_SIZE = 16
+
+# Kinesis bills PUT payload units of 25 KB, so the default fills two of them, the same target the KPL uses
+DEFAULT_TARGET_SIZE = 51200
+MAX_TARGET_SIZE = 1024 * 1024 - 256
+
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+def _varint_size(value):
+    size = 1
+    while value >= 0x80:
+        value >>= 7
+        size += 1
+    return size
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+def _fields(data):
+    offset = 0
+    while offset < len(data):
+        key, offset = _read_varint(data, offset)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == _VARINT:
+            value, offset = _read_varint(data, offset)
+        elif wire_type == _LENGTH_DELIMITED:
+            length, offset = _read_varint(data, offset)
+            if offset + length > len(data):
+                raise ValueError("truncated field")
+            value = data[offset:offset + length]
+            offset += length
+        elif wire_type == _FIXED64:
+            value = data[offset:offset + 8]
+            offset += 8
+        elif wire_type == _FIXED32:
+            value = data[offset:offset + 4]
+            offset += 4
+        else:
+            raise ValueError("unsupported wire type " + str(wire_type))
+        yield number, wire_type, value
+
+def _length_delimited(number, payload):
+    return _varint(number << 3 | _LENGTH_DELIMITED) + _varint(len(payload)) + payload
+
+def _record_size(key_index, data_length):
+    return 1 + _varint_size(key_index) + 1 + _varint_size(data_length) + data_length
+
+class RecordAggregator:
+    """ Packs many small rows into KPL aggregated Kinesis records of up to target_size bytes
+
+    :param target_size: maximum size in bytes of one aggregated record, including magic and checksum
+    """
+
+    def __init__(self, target_size=DEFAULT_TARGET_SIZE):
+        if target_size > MAX_TARGET_SIZE:
+            raise ValueError("target_size must leave room for the partition key within the 1 MB record limit")
+        self.target_size = target_size
+        self._reset()
+
+    def _reset(self):
+        self._keys = {}
+        self._records = []
+        self._size = len(MAGIC) + DIGEST_SIZE
+
+    def __len__(self):
+        return len(self._records)
+
+    def _cost(self, data, partition_key):
+        cost = 0
+        key_index = self._keys.get(partition_key)
+        if key_index is None:
+            key_index = len(self._keys)
+            encoded = partition_key.encode("utf-8")
+            cost += 1 + _varint_size(len(encoded)) + len(encoded)
+        record_size = _record_size(key_index, len(data))
+        return cost + 1 + _varint_size(record_size) + record_size
+
+    def fits(self, data, partition_key):
+        """ Tests to see if a row can join the current aggregate. An empty aggregate accepts any row
+
+        :param data: row payload as bytes
+        :param partition_key: row partition key
+        :return: True if the aggregate stays within the target size
+        """
+
+        return not self._records or self._size + self._cost(data, partition_key) <= self.target_size
+
+    def add(self, data, partition_key):
+        """ Adds a row, closing the current aggregate first if the row would push it past the target size
+
+        :param data: row payload as bytes
+        :param partition_key: row partition key
+        :return: (aggregated bytes, partition key, row count) of the closed aggregate, else None
+        """
+
+        completed = None
+        if not self.fits(data, partition_key):
+            completed = self.flush()
+
+        self._size += self._cost(data, partition_key)
+        key_index = self._keys.setdefault(partition_key, len(self._keys))
+        self._records.append((key_index, data))
+        return completed
+
+    def flush(self):
+        """ Closes the current aggregate
+
+        :return: (aggregated bytes, partition key, row count), else None if no rows are pending
+        """
+
+        if not self._records:
+            return None
+
+        keys = list(self._keys)
+        body = bytearray()
+        for key in keys:
+            body += _length_delimited(1, key.encode("utf-8"))
+        for key_index, data in self._records:
+            record = _varint(1 << 3 | _VARINT) + _varint(key_index) + _length_delimited(3, data)
+            body += _length_delimited(3, record)
+
+        body = bytes(body)
+        completed = (MAGIC + body + hashlib.md5(body).digest(), keys[0], len(self._records))
+        self._reset()
+        return completed
+
+def is_aggregated(data):
+    return len(data) > len(MAGIC) + DIGEST_SIZE and data[:len(MAGIC)] == MAGIC
+
+def deaggregate(data, partition_key=None):
+    """ Expands one Kinesis record into its rows. Records that are not aggregated, or whose checksum does not
+    match, are returned unchanged as a single row, the same way the KCL treats them
+
+    :param data: record payload as bytes
+    :param partition_key: partition key of the Kinesis record, used for non aggregated records
+    :return: list of (partition key, row bytes)
+    """
+
+    if not is_aggregated(data):
+        return [(partition_key, data)]
+
+    body = data[len(MAGIC):-DIGEST_SIZE]
+    if hashlib.md5(body).digest() != data[-DIGEST_SIZE:]:
+        return [(partition_key, data)]
+
+    keys = []
+    rows = []
+    try:
+        for number, wire_type, value in _fields(body):
+            if number == 1 and wire_type == _LENGTH_DELIMITED:
+                keys.append(value.decode("utf-8"))
+            elif number == 3 and wire_type == _LENGTH_DELIMITED:
+                key_index = 0
+                row = b""
+                for inner_number, inner_type, inner_value in _fields(value):
+                    if inner_number == 1 and inner_type == _VARINT:
+                        key_index = inner_value
+                    elif inner_number == 3 and inner_type == _LENGTH_DELIMITED:
+                        row = inner_value
+                rows.append((key_index, row))
+        return [(keys[key_index], row) for key_index, row in rows]
+    except (ValueError, IndexError):
+        return [(partition_key, data)]
+
+def iter_rows(records):
+    """ De-aggregates a sequence of Kinesis records, eg from GetRecords or a Lambda Kinesis event
+
+    :param records: iterable of (data, partition key) pairs
+    :return: generator of row bytes
+    """
+
+    for data, partition_key in records:
+        for _, row in deaggregate(data, partition_key):
+            yield row
@@ -0,0 +1,238 @@
+import abc
+import logging
+import random
+import time
+from botocore.exceptions import ClientError
+import AWS_Clients
+import Kinesis_Aggregation
+
+# PutRecords limits
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 5 * 1024 * 1024
+MAX_RECORD_BYTES = 1024 * 1024
+
+RETRYABLE_ERRORS = ('ProvisionedThroughputExceededException', 'InternalFailure', 'ServiceUnavailable',
+                    'ThrottlingException', 'KMSThrottlingException')
+THROTTLED_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException')
+
+class BatchProducer(abc.ABC):
+    """ Buffers records and sends them in batches that respect a put API's record count and byte limits.
+    Only the entries a call reports as failed are retried, with jittered exponential backoff.
+    Subclasses build the records, set the limits and error codes, and send a batch in _put_batch.
+    An instance is meant to be used from one thread
+
+    :param max_attempts: attempts per record before it is counted as failed
+    :param base_delay: first backoff delay in seconds
+    :param max_delay: cap on the backoff delay in seconds
+    """
+
+    max_batch_records = MAX_BATCH_RECORDS
+    max_batch_bytes = MAX_BATCH_BYTES
+    retryable_errors = RETRYABLE_ERRORS
+    # the retryable errors that mean the stream is over its throughput, the rest are counted only as retries
+    throttled_errors = THROTTLED_ERRORS
+
+    def __init__(self, max_attempts=8, base_delay=0.1, max_delay=5.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._buffer = []
+        self._buffer_rows = []
+        self._buffer_bytes = 0
+
+        self.records_sent = 0
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.requests_sent = 0
+        self.throttled_records = 0
+        self.failed_rows = 0
+        self.started = time.monotonic()
+
+    @abc.abstractmethod
+    def _put_batch(self, records):
+        """ Sends one batch
+
+        :param records: records as the put API takes them
+        :return: one result entry per record, with an ErrorCode key for the entries that failed
+        """
+
+    def _buffer_record(self, record, size, rows):
+        failed = 0
+        if len(self._buffer) == self.max_batch_records or self._buffer_bytes + size > self.max_batch_bytes:
+            failed = self._send()
+
+        self._buffer.append(record)
+        self._buffer_rows.append(rows)
+        self._buffer_bytes += size
+        return failed
+
+    def flush(self):
+        """ Sends every buffered record, retrying failed entries until they succeed or run out of attempts
+
+        :return: number of rows that could not be delivered
+        """
+
+        return self._send()
+
+    def _send(self):
+        batch = list(zip(self._buffer, self._buffer_rows))
+        self._buffer = []
+        self._buffer_rows = []
+        self._buffer_bytes = 0
+
+        attempt = 0
+        failed = 0
+        while batch:
+            attempt += 1
+            try:
+                result = self._put_batch([record for record, _ in batch])
+            except ClientError as e:
+                if e.response['Error']['Code'] not in self.retryable_errors or attempt >= self.max_attempts:
+                    logging.error(e)
+                    failed = sum(rows for _, rows in batch)
+                    break
+                if e.response['Error']['Code'] in self.throttled_errors:
+                    self.throttled_records += len(batch)
+                self._backoff(attempt)
+                continue
+
+            self.requests_sent += 1
+            retry = []
+            for entry, (record, rows) in zip(result, batch):
+                if 'ErrorCode' not in entry:
+                    self.records_sent += 1
+                    self.rows_sent += rows
+                    self.bytes_sent += len(record['Data'])
+                    continue
+                if entry['ErrorCode'] in self.throttled_errors:
+                    self.throttled_records += 1
+                retry.append((record, rows))
+
+            batch = retry
+            if batch:
+                if attempt >= self.max_attempts:
+                    logging.error(f'{len(batch)} records failed after {attempt} attempts')
+                    failed = sum(rows for _, rows in batch)
+                    break
+                logging.info(f'Resending {len(batch)} failed records')
+                self._backoff(attempt)
+
+        self.failed_rows += failed
+        return failed
+
+    def _backoff(self, attempt):
+        # full jitter: spreads retries from many producers instead of having them hit the stream together
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+
+    def stats(self):
+        """ Throughput counters since the producer was created
+
+        :return: dict of counters plus records_per_second, rows_per_second and bytes_per_second.
+            Records are the records sent, rows are the lines put into the producer
+        """
+
+        elapsed = time.monotonic() - self.started
+        return {
+            'records_sent': self.records_sent,
+            'bytes_sent': self.bytes_sent,
+            'requests_sent': self.requests_sent,
+            'throttled_records': self.throttled_records,
+            'rows_sent': self.rows_sent,
+            'failed_rows': self.failed_rows,
+            'elapsed': elapsed,
+            'records_per_second': self.records_sent / elapsed if elapsed else 0,
+            'rows_per_second': self.rows_sent / elapsed if elapsed else 0,
+            'bytes_per_second': self.bytes_sent / elapsed if elapsed else 0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+class KinesisProducer(BatchProducer):
+    """ Buffers records and sends them with PutRecords in batches that respect the 500 record and 5 MB limits.
+    Only the entries a call reports as failed are retried, with jittered exponential backoff.
+    An instance is meant to be used from one thread
+
+    :param stream_name: Kinesis data stream name
+    :param kinesis_client: client to use. If not specified the shared client is used
+    :param partition_key_count: distinct generated partition keys. Records without an explicit key rotate through
+        them, which spreads the load over every shard of the stream
+    :param max_attempts: attempts per record before it is counted as failed
+    :param base_delay: first backoff delay in seconds
+    :param max_delay: cap on the backoff delay in seconds
+    :param aggregate: pack rows into KPL aggregated records, see Kinesis_Aggregation. Raises rows per shard well
+        past the 1000 records/s limit when rows are small
+    :param aggregation_target_size: maximum bytes per aggregated record
+    """
+
+    def __init__(self, stream_name, kinesis_client=None, partition_key_count=1024, max_attempts=8,
+                 base_delay=0.1, max_delay=5.0, aggregate=False,
+                 aggregation_target_size=Kinesis_Aggregation.DEFAULT_TARGET_SIZE):
+        super().__init__(max_attempts, base_delay, max_delay)
+        self.stream_name = stream_name
+        self.kinesis_client = kinesis_client if kinesis_client is not None else AWS_Clients.get_client('kinesis')
+        self.partition_key_count = partition_key_count
+
+        self.aggregator = Kinesis_Aggregation.RecordAggregator(aggregation_target_size) if aggregate else None
+        self._next_key = 0
+
+    def put(self, data, partition_key=None):
+        """ Adds a record to the buffer, sending the buffer first if the record would not fit in the batch.
+        When aggregating, the row joins the current aggregate and only completed aggregates are buffered
+
+        :param data: record payload, bytes or str
+        :param partition_key: explicit partition key. If not specified a rotating generated key is used
+        :return: number of rows that could not be delivered by the batch this call sent to make room, else 0
+        """
+
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        generated = partition_key is None
+        if generated:
+            partition_key = str(self._next_key)
+
+        if self.aggregator is None:
+            if generated:
+                self._rotate_key()
+            return self._enqueue(data, partition_key, 1)
+
+        # with generated keys every row of an aggregate shares one key, which keeps the key table to a single
+        # entry, and the key rotates per aggregate instead of per row
+        failed = 0
+        if not self.aggregator.fits(data, partition_key):
+            failed = self._enqueue(*self.aggregator.flush())
+            if generated:
+                self._rotate_key()
+                partition_key = str(self._next_key)
+        self.aggregator.add(data, partition_key)
+        return failed
+
+    def _rotate_key(self):
+        self._next_key = (self._next_key + 1) % self.partition_key_count
+
+    def _enqueue(self, data, partition_key, rows):
+        size = len(data) + len(partition_key.encode("utf-8"))
+        if size > MAX_RECORD_BYTES:
+            raise ValueError("Record of " + str(size) + " bytes exceeds the Kinesis record limit")
+        return self._buffer_record({'Data': data, 'PartitionKey': partition_key}, size, rows)
+
+    def flush(self):
+        """ Sends every buffered record, including a partly filled aggregate, retrying failed entries until
+        they succeed or run out of attempts
+
+        :return: number of rows that could not be delivered
+        """
+
+        failed = 0
+        if self.aggregator is not None:
+            completed = self.aggregator.flush()
+            if completed is not None:
+                failed = self._enqueue(*completed)
+        return failed + super().flush()
+
+    def _put_batch(self, records):
+        return self.kinesis_client.put_records(StreamName=self.stream_name, Records=records)['Records']
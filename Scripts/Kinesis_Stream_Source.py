@@ -0,0 +1,118 @@
+import os
+import queue
+import threading
+import File_Scanner
+
+READ_BUFFER = 1024 * 1024
+
+# Lines are handed from the reader thread to the producer in chunks, and at most QUEUE_CHUNKS chunks wait in
+# between, so memory is bounded by chunk_lines * queue_chunks lines whatever the input size
+CHUNK_LINES = 500
+QUEUE_CHUNKS = 8
+
+_END = object()
+
+def iter_paths(path):
+    """ Lists the files to stream
+
+    :param path: a single file, or a directory whose files in the ingest grammar are taken in date and time order
+    :return: generator of file paths
+    """
+
+    if os.path.isdir(path):
+        records = File_Scanner.scan_directory(path)
+        for record in sorted(records, key=lambda record: (record.date, record.time, record.name)):
+            yield record.path
+    else:
+        yield path
+
+def iter_lines(paths, skip_header=True):
+    """ Streams the lines of each file without loading any file into memory
+
+    :param paths: iterable of file paths
+    :param skip_header: drop the first line of every file
+    :return: generator of lines as bytes, line endings kept
+    """
+
+    for path in paths:
+        with open(path, "rb", buffering=READ_BUFFER) as f:
+            if skip_header:
+                next(f, None)
+            for line in f:
+                if line.strip():
+                    yield line
+
+def iter_chunks(lines, chunk_lines=CHUNK_LINES):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_lines:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def prefetch(iterable, max_items=QUEUE_CHUNKS):
+    """ Runs an iterable on a background thread through a bounded queue, so reading the next items overlaps
+    with whatever the consumer does with the current one. Errors raised by the iterable are re-raised here
+
+    :param iterable: source iterable, consumed on the background thread
+    :param max_items: items allowed to wait in the queue
+    :return: generator over the same items
+    """
+
+    items = queue.Queue(maxsize=max_items)
+    stop = threading.Event()
+
+    def put(item):
+        # gives up once the consumer stopped, instead of blocking on a full queue that is never read again
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fill():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(e)
+
+    reader = threading.Thread(target=fill, name="stream-prefetch", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # the consumer stopped early, let the reader thread exit instead of blocking on a full queue
+        stop.set()
+
+def stream_to_kinesis(path, producer, skip_header=True, chunk_lines=CHUNK_LINES, queue_chunks=QUEUE_CHUNKS):
+    """ Streams a file or a directory of files into a Kinesis_Producer.KinesisProducer, or a
+    Firehose_Producer.FirehoseProducer, one record per line.
+    Disk reads run on a background thread while the producer sends, so neither waits on the other
+
+    :param path: file or directory to replay
+    :param producer: producer the lines are put into
+    :param skip_header: drop the header line of every file
+    :param chunk_lines: lines per chunk handed from the reader thread
+    :param queue_chunks: chunks allowed to wait between reader and producer
+    :return: number of lines that could not be delivered
+    """
+
+    failed_before = producer.failed_rows
+    for chunk in prefetch(iter_chunks(iter_lines(iter_paths(path), skip_header), chunk_lines), queue_chunks):
+        for line in chunk:
+            producer.put(line)
+    producer.flush()
+    return producer.failed_rows - failed_before
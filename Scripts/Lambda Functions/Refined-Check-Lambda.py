@@ -1,34 +1,27 @@
-import json
-import urllib.parse
-import boto3
+import Lambda_Runtime
+import Fingerprint_Index
+import Lambda_Events
 
 print('Loading function')
 
-s3 = boto3.client('s3')
-s3_resource = boto3.resource('s3')
+# clients are created on first use, see Lambda_Runtime
+s3 = Lambda_Runtime.client('s3')
+index = Lambda_Runtime.Lazy(Fingerprint_Index.FingerprintIndex)
 
-def lambda_handler(event, context):
-    #print("Received event: " + json.dumps(event, indent=2))
+def check_object(obj):
+    # Get the object metadata and drop the object if its content is already in the bucket
+    response = s3().head_object(Bucket=obj.bucket, Key=obj.key)
+
+    # one conditional write against the fingerprint index instead of fetching every object in the bucket
+    original = index().claim(obj.bucket, obj.key, response['ETag'], response['ContentLength'])
+    if original is not None:
+        print(obj.key,"is a Duplicate of", original)
+        s3().delete_object(Bucket=obj.bucket, Key=obj.key)
+        return None
 
-    # Get the object from the event and show its content type
-    bucket = event['Records'][0]['s3']['bucket']['name']
-    key = urllib.parse.unquote_plus(event['Records'][0]['s3']['object']['key'], encoding='utf-8')
-    try:
-        response = s3.get_object(Bucket=bucket, Key=key)
-       
-        resp = s3.list_objects_v2(Bucket='refined-lambda-poc')
-        keys=[]
-        for obj in resp['Contents']:
-            if obj['Key'] != key:
-                existingObj = s3.get_object(Bucket=bucket,Key=obj['Key'])
-                print(obj['Key'])
-                if response['ETag'] == existingObj['ETag'] and response['ContentLength'] == existingObj['ContentLength']:
-                    print(key,"is a Duplicate")
-                    s3_resource.Object('refined-lambda-poc', key).delete()
-        
-        print("CONTENT TYPE: " + response['ContentType'])
-        return response['ContentType']
-    except Exception as e:
-        print(e)
-        print('Error getting object {} from bucket {}. Make sure they exist and your bucket is in the same region as this function.'.format(key, bucket))
-        raise e
+    print("CONTENT TYPE: " + response['ContentType'])
+    return response['ContentType']
+
+@Lambda_Runtime.handler
+def lambda_handler(event, context):
+    return Lambda_Events.process_event(event, check_object)
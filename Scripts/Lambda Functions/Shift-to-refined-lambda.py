@@ -1,37 +1,22 @@
-import json
-import urllib.parse
-import boto3
-from datetime import date, datetime
+import Lambda_Runtime
+import Lambda_Events
+import Object_Promotion
 
 print('Loading function')
 
-s3 = boto3.client('s3')
+# clients are created on first use, see Lambda_Runtime
+s3 = Lambda_Runtime.client('s3')
 
 
-def lambda_handler(event, context):
-    #print("Received event: " + json.dumps(event, indent=2))
+def shift_object(obj):
+    # Move the object into the refined zone server side, under a name derived from its event
+    newName = Object_Promotion.promoted_key(Object_Promotion.REFINED_PREFIX, obj)
 
-    # Get the object from the event and show its content type
-    bucket = event['Records'][0]['s3']['bucket']['name']
-    key = urllib.parse.unquote_plus(event['Records'][0]['s3']['object']['key'], encoding='utf-8')
-    try:
-        response = s3.get_object(Bucket=bucket, Key=key)
-        copy_source = {'Bucket': bucket, 'Key': key}
-        
-        today = date.today()
-        now = datetime.now()
+    contentType = Object_Promotion.promote_object(obj.bucket, obj.key, Object_Promotion.REFINED_BUCKET, newName, s3_client = s3())
+    if contentType is not None:
+        print("CONTENT TYPE: " + contentType)
+    return contentType
 
-        curDate = today.strftime("%Y%m%d")
-        curTime = now.strftime("%H%M%S")
-        
-        newName = "aanchal_flt_ind_refined"+ curDate +"_"+ curTime + ".csv"
-        
-        s3.copy_object(CopySource = copy_source, Bucket = "refined-lambda-poc", Key = newName)
-        
-        s3.delete_object(Bucket = bucket, Key = key)
-        print("CONTENT TYPE: " + response['ContentType'])
-        return response['ContentType']
-    except Exception as e:
-        print(e)
-        print('Error getting object {} from bucket {}. Make sure they exist and your bucket is in the same region as this function.'.format(key, bucket))
-        raise e
+@Lambda_Runtime.handler
+def lambda_handler(event, context):
+    return Lambda_Events.process_event(event, shift_object)
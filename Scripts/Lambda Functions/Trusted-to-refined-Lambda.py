@@ -1,40 +1,43 @@
-import json
-import urllib.parse
-import boto3
-from datetime import date, datetime
-import Run_Crawler
-import Run_Glue_Job
+import Lambda_Runtime
+import Fingerprint_Index
+import Lambda_Events
+import Trigger_Coalescer
 
 print('Loading function')
 
-s3 = boto3.client('s3')
-s3_resource = boto3.resource('s3')
+# clients are created on first use, see Lambda_Runtime
+s3 = Lambda_Runtime.client('s3')
+index = Lambda_Runtime.Lazy(Fingerprint_Index.FingerprintIndex)
+# one crawler and job run per batch of arrivals rather than per file
+coalescer = Lambda_Runtime.Lazy(lambda: Trigger_Coalescer.TriggerCoalescer('trusted-to-refined', 'Trusted-to-Refined', 'Trusted-to-Refined-transform'))
 
+def check_object(obj):
+    # Get the object metadata and drop the object if its content is already in the bucket
+    response = s3().head_object(Bucket=obj.bucket, Key=obj.key)
+
+    # one conditional write against the fingerprint index instead of fetching every object in the bucket
+    original = index().claim(obj.bucket, obj.key, response['ETag'], response['ContentLength'])
+    if original is not None:
+        print(obj.key,"is a Duplicate of", original)
+        s3().delete_object(Bucket=obj.bucket, Key=obj.key)
+        return None
+
+    # refining deduplicates across every file of a job run, so unlike Raw-To-Trusted every file goes to Glue
+    return "s3://" + obj.bucket + "/" + obj.key, response['ContentLength']
+
+@Lambda_Runtime.handler
 def lambda_handler(event, context):
-    #print("Received event: " + json.dumps(event, indent=2))
-
-    # Get the object from the event and show its content type
-    bucket = event['Records'][0]['s3']['bucket']['name']
-    key = urllib.parse.unquote_plus(event['Records'][0]['s3']['object']['key'], encoding='utf-8')
-    try:
-        response = s3.get_object(Bucket=bucket, Key=key)
-       
-        resp = s3.list_objects_v2(Bucket='trusted-lambda-poc')
-        keys=[]
-        for obj in resp['Contents']:
-            if obj['Key'] != key:
-                existingObj = s3.get_object(Bucket=bucket,Key=obj['Key'])
-                print(obj['Key'])
-                if response['ETag'] == existingObj['ETag'] and response['ContentLength'] == existingObj['ContentLength']:
-                    print(key,"is a Duplicate")
-                    s3_resource.Object('trusted-lambda-poc', key).delete()
-        
-        Run_Crawler.start_a_crawler('Trusted-to-Refined')
-        resp = Run_Glue_Job.run_glue_job('Trusted-to-Refined-transform')
+    # Scheduled invocations only fire a batch whose window has passed
+    if Lambda_Events.is_scheduled(event):
+        return coalescer().poll()
+
+    # Check every object of the event, then record the new ones as a single arrival in the pending batch.
+    # The batch names them, so the job reads only these files
+    response = Lambda_Events.process_event(event, check_object)
+
+    new = [result for result in response['results'] if result is not None]
+    if new:
+        resp = coalescer().add(len(new), sum(size for path, size in new), keys=[path for path, size in new])
         print(resp)
-        
-        return response['ContentType']
-    except Exception as e:
-        print(e)
-        print('Error getting object {} from bucket {}. Make sure they exist and your bucket is in the same region as this function.'.format(key, bucket))
-        raise e
+    
+    return response
@@ -0,0 +1,82 @@
+import json
+import logging
+import urllib.parse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# item_id identifies the record in a partial batch response, the SQS message id for queued events.
+# sequencer orders the events of one key and, with the key, identifies the object version an event is about
+S3Object = namedtuple("S3Object", ["item_id", "bucket", "key", "size", "etag", "event_time", "sequencer"],
+                      defaults=(None, None))
+
+DEFAULT_WORKERS = 8
+
+def _s3_objects(records, item_id=None):
+    for index, record in enumerate(records):
+        if 's3' not in record:
+            continue
+        s3 = record['s3']
+        yield S3Object(item_id if item_id is not None else str(index),
+                       s3['bucket']['name'],
+                       urllib.parse.unquote_plus(s3['object']['key'], encoding='utf-8'),
+                       s3['object'].get('size'),
+                       s3['object'].get('eTag'),
+                       record.get('eventTime'),
+                       s3['object'].get('sequencer'))
+
+def parse_event(event):
+    """ Flattens an S3 notification, or an SQS batch of S3 notifications, into the objects it reports.
+    S3 test events and records for other services are left out
+
+    :param event: Lambda event
+    :return: (list of S3Object, True if the event came from SQS)
+    """
+
+    records = event.get('Records', [])
+    if records and records[0].get('eventSource') == 'aws:sqs':
+        objects = []
+        for message in records:
+            body = json.loads(message['body'])
+            objects.extend(_s3_objects(body.get('Records', []), message['messageId']))
+        return objects, True
+    return list(_s3_objects(records)), False
+
+def is_scheduled(event):
+    # EventBridge schedules invoke with a source of aws.events and no Records
+    return event.get('source') == 'aws.events'
+
+def process_event(event, process_object, max_workers=DEFAULT_WORKERS):
+    """ Runs process_object for every object of an event on a thread pool, so a burst of uploads delivered in one
+    event is handled in one invocation. A failing object does not stop the others.
+    For SQS events the failed messages are returned as a partial batch response, so only they are redelivered.
+    S3 invokes asynchronously and has no partial responses, so there the failure is raised once every object
+    has been handled, and S3 retries the event. process_object therefore has to be safe to repeat.
+    Results are only returned for objects that will not be redelivered, so an object sharing a message with a
+    failed one is reported once, by the redelivery, and is not counted twice downstream
+
+    :param event: Lambda event
+    :param process_object: callable taking an S3Object. Shares the module's clients, which are thread safe
+    :param max_workers: objects processed at once
+    :return: dict with batchItemFailures and the results of the objects that succeeded and are not redelivered
+    """
+
+    objects, from_sqs = parse_event(event)
+    succeeded = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(objects)))) as executor:
+        futures = [(obj, executor.submit(process_object, obj)) for obj in objects]
+        for obj, future in futures:
+            try:
+                succeeded.append((obj, future.result()))
+            except Exception as e:
+                logging.error(e)
+                print('Error getting object {} from bucket {}. Make sure they exist and your bucket is in the same region as this function.'.format(obj.key, obj.bucket))
+                failed.append(obj)
+
+    if failed and not from_sqs:
+        raise Exception(str(len(failed)) + " of " + str(len(objects)) + " objects failed: " +
+                        ", ".join(obj.key for obj in failed))
+
+    item_ids = sorted({obj.item_id for obj in failed})
+    results = [result for obj, result in succeeded if obj.item_id not in item_ids]
+    return {'batchItemFailures': [{'itemIdentifier': item_id} for item_id in item_ids], 'results': results}
@@ -0,0 +1,72 @@
+import functools
+import resource
+import threading
+import time
+
+# Import this module first in a handler, so the init time below covers the handler's own imports
+INIT_STARTED = time.perf_counter()
+
+class Lazy:
+    """ Builds a value on first use and keeps it for the life of the execution environment. Handlers wrap their
+    clients and helpers in it, so an invocation pays only for what it actually touches, eg a scheduled poll
+    never creates an S3 client. Safe to call from the threads of Lambda_Events.process_event
+
+    :param factory: zero argument callable building the value
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self.factory()
+                    self._built = True
+        return self._value
+
+def client(service_name, region_name=None):
+    """ Lazy shared client for a service, see AWS_Clients.get_client
+
+    :param service_name: AWS service, eg 's3'
+    :param region_name: region of the client. If not specified the default region is used
+    :return: Lazy returning the client
+    """
+
+    def build():
+        import AWS_Clients
+        return AWS_Clients.get_client(service_name, region_name=region_name)
+    return Lazy(build)
+
+_invocations = 0
+
+def _max_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def handler(function):
+    """ Wraps a lambda_handler to log init and handler time plus peak memory, once per invocation:
+        RUNTIME cold_start=True init_ms=212 handler_ms=85 max_rss_mb=61.3
+    init_ms is only logged for the first invocation of an execution environment and covers the imports and
+    module level work since this module was imported
+
+    :param function: lambda_handler(event, context)
+    :return: wrapped handler
+    """
+
+    @functools.wraps(function)
+    def wrapper(event, context):
+        global _invocations
+        started = time.perf_counter()
+        cold_start = _invocations == 0
+        _invocations += 1
+        try:
+            return function(event, context)
+        finally:
+            handler_ms = (time.perf_counter() - started) * 1000
+            init = " init_ms=%d" % ((started - INIT_STARTED) * 1000) if cold_start else ""
+            print("RUNTIME cold_start=%s%s handler_ms=%d max_rss_mb=%.1f" % (cold_start, init, handler_ms, _max_rss_mb()))
+    return wrapper
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import BotoCoreError, ClientError
+import AWS_Clients
+
+MB = 1024 * 1024
+
+# S3 multipart limits
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+
+DEFAULT_PART_SIZE = 64 * MB
+DEFAULT_PART_CONCURRENCY = 8
+
+# Files at or above this size go through the resumable uploader in File_Ingester.upload_file
+LARGE_FILE_THRESHOLD = 256 * MB
+
+STATE_SUFFIX = ".upload-state"
+
+def print_progress(bytes_done, total_bytes, elapsed):
+    """ Default progress callback, prints percentage and throughput
+
+    :param bytes_done: bytes confirmed by S3 so far, including parts resumed from an earlier attempt
+    :param total_bytes: size of the file
+    :param elapsed: seconds since this attempt started
+    """
+
+    percent = 100 * bytes_done / total_bytes if total_bytes else 100
+    print("Uploaded", round(bytes_done / MB, 1), "of", round(total_bytes / MB, 1), "MB",
+          "(" + str(round(percent, 1)) + "%),", round(bytes_done / MB / elapsed, 2) if elapsed else 0, "MB/s")
+
+def choose_part_size(size, part_size):
+    """ Raises the requested part size if needed to stay within the S3 part count limit
+
+    :param size: file size in bytes
+    :param part_size: requested part size in bytes
+    :return: part size to use
+    """
+
+    return max(part_size, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+
+def state_path_for(source_path, object_name):
+    """ State file of an upload of a source file to an object key. It sits next to the source, so an upload from a
+    temporary conversion of the source leaves nothing behind in the temporary directory
+
+    :param source_path: file the upload was made from, before any conversion
+    :param object_name: S3 object name
+    :return: path of the state file
+    """
+
+    return source_path + "." + hashlib.sha1(object_name.encode("utf-8")).hexdigest()[:12] + STATE_SUFFIX
+
+def abort_upload(state_path, s3_client=None):
+    """ Aborts the multipart upload a state file records, so S3 frees its parts, and removes the state file
+
+    :param state_path: state file written by upload_large_file
+    :param s3_client: client to use. If not specified the shared client is used
+    :return: True if there was an upload to abort, else False
+    """
+
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        os.remove(state_path)
+        return False
+
+    s3_client = s3_client if s3_client is not None else AWS_Clients.get_client('s3')
+    try:
+        s3_client.abort_multipart_upload(Bucket=state["bucket"], Key=state["key"], UploadId=state["upload_id"])
+    except ClientError as e:
+        # already completed or aborted
+        logging.error(e)
+    os.remove(state_path)
+    return True
+
+def _read_state(state_path, bucket, key, size, mtime, part_size):
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    # the upload can only be resumed if it was for the same object and the same version of the file
+    if state.get("bucket") != bucket or state.get("key") != key or state.get("size") != size \
+            or state.get("mtime") != mtime or state.get("part_size") != part_size:
+        return None
+    return state
+
+def _write_state(state_path, state):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def _uploaded_parts(s3_client, bucket, key, upload_id):
+    parts = {}
+    marker = 0
+    while True:
+        response = s3_client.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+        for part in response.get('Parts', []):
+            parts[part['PartNumber']] = part
+        if not response.get('IsTruncated'):
+            return parts
+        marker = response['NextPartNumberMarker']
+
+def upload_large_file(file_name, bucket, object_name=None, part_size=DEFAULT_PART_SIZE,
+                      part_concurrency=DEFAULT_PART_CONCURRENCY, progress_callback=print_progress, s3_client=None,
+                      state_path=None):
+    """ Uploads a file as a multipart upload with parts sent in parallel.
+    The upload id is kept in a state file next to the source file, so a failed run leaves the upload open and
+    the next call with the same file and part size re-uses every part S3 already holds
+
+    :param file_name: File to upload
+    :param bucket: Bucket to upload to
+    :param object_name: S3 object name. If not specified then the base name of file_name is used
+    :param part_size: bytes per part, raised automatically to respect S3 limits
+    :param part_concurrency: number of parts in flight at once. Memory use is about part_size * part_concurrency
+    :param progress_callback: called as (bytes_done, total_bytes, elapsed) after each part, None to disable
+    :param s3_client: client to use. If not specified the shared client is used
+    :param state_path: where the upload id is kept. If not specified it is file_name plus STATE_SUFFIX.
+        See state_path_for for uploads of a temporary file
+    :return: True if file was uploaded, else False
+    """
+
+    if object_name is None:
+        object_name = os.path.basename(file_name)
+    if s3_client is None:
+        s3_client = AWS_Clients.get_client('s3', max_pool_connections=max(part_concurrency, AWS_Clients.DEFAULT_MAX_POOL_CONNECTIONS))
+
+    stat = os.stat(file_name)
+    size = stat.st_size
+    part_size = choose_part_size(size, part_size)
+    part_count = max(1, math.ceil(size / part_size))
+    if state_path is None:
+        state_path = file_name + STATE_SUFFIX
+
+    try:
+        state = _read_state(state_path, bucket, object_name, size, stat.st_mtime, part_size)
+        done = {}
+        if state is not None:
+            try:
+                done = _uploaded_parts(s3_client, bucket, object_name, state["upload_id"])
+                print("Resuming upload of", object_name, "with", len(done), "of", part_count, "parts already uploaded")
+            except ClientError as e:
+                # the upload was completed or aborted since the state was written
+                logging.error(e)
+                state = None
+
+        if state is None:
+            response = s3_client.create_multipart_upload(Bucket=bucket, Key=object_name)
+            state = {"bucket": bucket, "key": object_name, "size": size, "mtime": stat.st_mtime,
+                     "part_size": part_size, "upload_id": response['UploadId']}
+            _write_state(state_path, state)
+            done = {}
+
+        upload_id = state["upload_id"]
+        etags = {}
+        bytes_done = 0
+        for number in range(1, part_count + 1):
+            expected = min(part_size, size - (number - 1) * part_size)
+            if number in done and done[number]['Size'] == expected:
+                etags[number] = done[number]['ETag']
+                bytes_done += expected
+
+        fd = os.open(file_name, os.O_RDONLY)
+        try:
+            def upload_part(number):
+                offset = (number - 1) * part_size
+                body = os.pread(fd, min(part_size, size - offset), offset)
+                response = s3_client.upload_part(Bucket=bucket, Key=object_name, UploadId=upload_id,
+                                                 PartNumber=number, Body=body)
+                return number, len(body), response['ETag']
+
+            start = time.perf_counter()
+            pending = [number for number in range(1, part_count + 1) if number not in etags]
+            with ThreadPoolExecutor(max_workers=part_concurrency) as executor:
+                futures = [executor.submit(upload_part, number) for number in pending]
+                for future in as_completed(futures):
+                    number, length, etag = future.result()
+                    etags[number] = etag
+                    bytes_done += length
+                    if progress_callback is not None:
+                        progress_callback(bytes_done, size, time.perf_counter() - start)
+        finally:
+            os.close(fd)
+
+        s3_client.complete_multipart_upload(
+            Bucket=bucket, Key=object_name, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': etags[number]} for number in sorted(etags)]})
+
+    except (BotoCoreError, ClientError, OSError) as e:
+        logging.error(e)
+        print("Upload of", object_name, "interrupted, re-run to resume from the uploaded parts")
+        return False
+
+    os.remove(state_path)
+    return True
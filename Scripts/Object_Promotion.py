@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from botocore.exceptions import ClientError
+import AWS_Clients
+from Multipart_Upload import MB, MIN_PART_SIZE, choose_part_size
+
+# CopyObject handles up to 5 GB, but above a few hundred MB parallel UploadPartCopy finishes sooner
+MULTIPART_COPY_THRESHOLD = 512 * MB
+DEFAULT_COPY_PART_SIZE = 256 * MB
+DEFAULT_COPY_CONCURRENCY = 8
+
+# Zones the Glue job output is promoted into, and the name prefix of the promoted objects. The Shift-to-* Lambdas
+# and Stage_Orchestrator.promote_all both use them, so event driven and manual promotion fill the same buckets
+SHIFT_TO_TRUSTED_BUCKET = "shift-to-trusted"
+TRUSTED_BUCKET = "trusted-lambda-poc"
+TRUSTED_PREFIX = "aanchal_flt_ind_"
+SHIFT_TO_REFINED_BUCKET = "shift-to-refined"
+REFINED_BUCKET = "refined-lambda-poc"
+REFINED_PREFIX = "aanchal_flt_ind_refined"
+
+def promoted_key(prefix, obj, extension=None):
+    """ Names the promoted copy of an object from its S3 event rather than the clock, so two objects promoted in
+    the same second get different keys, and a redelivered event produces the same key again.
+    The folders of the source key are kept, so key=value partitions written by the Glue jobs survive the move
+
+    :param prefix: name prefix, eg "aanchal_flt_ind_"
+    :param obj: Lambda_Events.S3Object of the source object
+    :param extension: extension of the new key. If not specified the source's is kept, eg ".snappy.parquet"
+    :return: source folders + prefix + YYYYMMDD_HHMMSS of the event + "_" + 12 hex digits identifying the source
+        object version + extension
+    """
+
+    try:
+        when = datetime.strptime(obj.event_time, "%Y-%m-%dT%H:%M:%S.%fZ")
+    except (TypeError, ValueError):
+        when = datetime.utcnow()
+    identity = "\n".join(str(part) for part in (obj.bucket, obj.key, obj.sequencer or obj.etag))
+    suffix = hashlib.sha1(identity.encode("utf-8")).hexdigest()[:12]
+
+    folder, _, name = obj.key.rpartition("/")
+    if extension is None:
+        extension = "." + name.split(".", 1)[1] if "." in name else ".csv"
+    return (folder + "/" if folder else "") + prefix + when.strftime("%Y%m%d") + "_" + when.strftime("%H%M%S") + "_" + suffix + extension
+
+def _multipart_copy(s3_client, source, dest_bucket, dest_key, head, part_size, concurrency):
+    size = head['ContentLength']
+    part_size = choose_part_size(size, part_size)
+    part_count = max(1, math.ceil(size / part_size))
+    upload = s3_client.create_multipart_upload(Bucket=dest_bucket, Key=dest_key,
+                                               ContentType=head.get('ContentType', 'binary/octet-stream'),
+                                               Metadata=head.get('Metadata', {}))
+    upload_id = upload['UploadId']
+
+    def copy_part(number):
+        start = (number - 1) * part_size
+        end = min(start + part_size, size) - 1
+        response = s3_client.upload_part_copy(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id, PartNumber=number,
+                                              CopySource=source, CopySourceRange="bytes=%d-%d" % (start, end),
+                                              CopySourceIfMatch=head['ETag'])
+        return {'PartNumber': number, 'ETag': response['CopyPartResult']['ETag']}
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            parts = list(executor.map(copy_part, range(1, part_count + 1)))
+        s3_client.complete_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id,
+                                            MultipartUpload={'Parts': parts})
+    except Exception:
+        # parts of an abandoned upload are billed until it is aborted
+        s3_client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+        raise
+
+def promote_object(source_bucket, source_key, dest_bucket, dest_key, s3_client=None,
+                   multipart_threshold=MULTIPART_COPY_THRESHOLD, part_size=DEFAULT_COPY_PART_SIZE,
+                   concurrency=DEFAULT_COPY_CONCURRENCY):
+    """ Moves an object between zones without downloading it. S3 copies the data server side, with parallel
+    UploadPartCopy above multipart_threshold, which also lifts the 5 GB CopyObject limit.
+    The copy only reads the version of the source that was inspected, and the source is deleted once the copy
+    exists, so a repeated call after a completed move finds no source and does nothing
+
+    :param source_bucket: bucket of the object
+    :param source_key: key of the object
+    :param dest_bucket: bucket to move the object to
+    :param dest_key: key in dest_bucket, see promoted_key
+    :param s3_client: client to use. If not specified the shared client is used
+    :param multipart_threshold: size in bytes from which parts are copied in parallel
+    :param part_size: bytes per copied part, raised automatically to respect S3 limits
+    :param concurrency: parts copied at once
+    :return: ContentType of the moved object, else None if the source no longer exists
+    """
+
+    s3_client = s3_client if s3_client is not None else AWS_Clients.get_client('s3')
+    try:
+        head = s3_client.head_object(Bucket=source_bucket, Key=source_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            logging.info(f'{source_bucket}/{source_key} was already moved')
+            return None
+        raise
+
+    source = {'Bucket': source_bucket, 'Key': source_key}
+    if head['ContentLength'] >= multipart_threshold:
+        _multipart_copy(s3_client, source, dest_bucket, dest_key, head, max(part_size, MIN_PART_SIZE), concurrency)
+    else:
+        s3_client.copy_object(CopySource=source, Bucket=dest_bucket, Key=dest_key, CopySourceIfMatch=head['ETag'])
+
+    s3_client.delete_object(Bucket=source_bucket, Key=source_key)
+    return head.get('ContentType')
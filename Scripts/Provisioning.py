@@ -0,0 +1,129 @@
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# exists: callable returning True if the resource is already present, in which case create is skipped
+# create: callable creating the resource, raising on failure
+# wait: optional callable returning True once the resource is usable, eg a stream reaching ACTIVE.
+#       It also runs for resources that were already present
+# depends_on: names of resources that must be ready first
+Resource = namedtuple("Resource", ["name", "exists", "create", "wait", "depends_on"], defaults=(None, ()))
+
+ResourceResult = namedtuple("ResourceResult", ["name", "status", "seconds", "error"])
+
+CREATED = "created"
+PRESENT = "present"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+def wait_until(check, timeout=600, initial_delay=1, max_delay=15):
+    """ Polls a condition with exponential backoff
+
+    :param check: callable returning True when the condition holds
+    :param timeout: seconds before giving up
+    :param initial_delay: first delay in seconds
+    :param max_delay: cap on the delay in seconds
+    :return: True if the condition held within the timeout, else False
+    """
+
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if check():
+            return True
+        if time.monotonic() + delay > deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+def _provision(resource):
+    start = time.perf_counter()
+    try:
+        if resource.exists():
+            status = PRESENT
+        else:
+            resource.create()
+            status = CREATED
+        if resource.wait is not None and not resource.wait():
+            raise Exception("timed out waiting for " + resource.name + " to become ready")
+    except Exception as e:
+        logging.error(e)
+        return ResourceResult(resource.name, FAILED, time.perf_counter() - start, str(e))
+    return ResourceResult(resource.name, status, time.perf_counter() - start, None)
+
+def _check_plan(resources):
+    names = {resource.name for resource in resources}
+    if len(names) != len(resources):
+        raise ValueError("resource names must be unique")
+    for resource in resources:
+        for dependency in resource.depends_on:
+            if dependency not in names:
+                raise ValueError(resource.name + " depends on unknown resource " + dependency)
+
+    # Kahn's algorithm, anything left over is part of a cycle
+    remaining = {resource.name: len(resource.depends_on) for resource in resources}
+    dependents = {resource.name: [] for resource in resources}
+    for resource in resources:
+        for dependency in resource.depends_on:
+            dependents[dependency].append(resource.name)
+    ready = [name for name, count in remaining.items() if count == 0]
+    while ready:
+        name = ready.pop()
+        for dependent in dependents[name]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    cycle = [name for name, count in remaining.items() if count > 0]
+    if cycle:
+        raise ValueError("dependency cycle between " + ", ".join(sorted(cycle)))
+    return dependents
+
+def run_plan(resources, max_workers=8):
+    """ Provisions resources concurrently, starting each as soon as everything it depends on is ready.
+    Resources already present are left as they are, so the plan can be re-run. When a resource fails, everything
+    depending on it is skipped and the rest of the plan carries on
+
+    :param resources: list of Resource
+    :param max_workers: resources provisioned at once
+    :return: dict of name to ResourceResult
+    """
+
+    dependents = _check_plan(resources)
+    by_name = {resource.name: resource for resource in resources}
+    remaining = {resource.name: len(resource.depends_on) for resource in resources}
+    results = {}
+
+    def skip(name, cause):
+        if name in results:
+            return
+        results[name] = ResourceResult(name, SKIPPED, 0.0, cause + " was not provisioned")
+        for dependent in dependents[name]:
+            skip(dependent, cause)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_provision, by_name[name]): name for name, count in remaining.items() if count == 0}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                result = future.result()
+                results[name] = result
+                print(name, result.status, "in", round(result.seconds, 1), "seconds")
+
+                for dependent in dependents[name]:
+                    if result.status in (FAILED, SKIPPED):
+                        skip(dependent, name)
+                        continue
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0 and dependent not in results:
+                        futures[executor.submit(_provision, by_name[dependent])] = dependent
+
+    elapsed = time.perf_counter() - start
+    print("Provisioned", len(resources), "resources in", round(elapsed, 1), "seconds, serial time would be about",
+          round(sum(result.seconds for result in results.values()), 1), "seconds")
+    for result in results.values():
+        if result.status in (FAILED, SKIPPED):
+            print(result.name, result.status + ":", result.error)
+    return results
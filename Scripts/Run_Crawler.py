@@ -1,10 +1,9 @@
-import boto3
+import AWS_Clients
 from botocore.exceptions import ClientError
 
 # Given the cralwer's name as an argument, issues a command to trigger the crawler 
 def start_a_crawler(crawler_name):
-    session = boto3.session.Session()
-    glue_client = session.client('glue')
+    glue_client = AWS_Clients.get_client('glue')
     try:
         response = glue_client.start_crawler(Name=crawler_name)
         return response
@@ -1,11 +1,11 @@
-import boto3
+import AWS_Clients
 from botocore.exceptions import ClientError
 
 # Takes the glue job's name as an argument and triggers execution
 def run_glue_job(job_name, arguments = {}):
-    glue_client = boto3.client('glue',region_name ="ap-south-1")
+    glue_client = AWS_Clients.get_client('glue',region_name ="ap-south-1")
     try:
-        job_run_id = glue_client.start_job_run(JobName="S3-to-S3-transform ")
+        job_run_id = glue_client.start_job_run(JobName=job_name, Arguments=arguments)
         return job_run_id
 
     except ClientError as e:
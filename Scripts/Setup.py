@@ -1,4 +1,5 @@
-import boto3
+import AWS_Clients
+import hashlib
 import json 
 import os 
 from os import listdir
@@ -6,16 +7,27 @@ from os.path import isfile, join
 import re
 from botocore.exceptions import ClientError
 import logging
+import Provisioning
+import Fingerprint_Index
+import Trigger_Coalescer
+
+# managed policies the lambda architecture role needs for S3, Glue, Lambda and Kinesis
+ROLE_POLICIES = ('arn:aws:iam::aws:policy/AmazonS3FullAccess',
+                 'arn:aws:iam::aws:policy/service-role/AWSGlueServiceRole',
+                 'arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole',
+                 'arn:aws:iam::aws:policy/AmazonKinesisFullAccess',
+                 'arn:aws:iam::aws:policy/AmazonKinesisFirehoseFullAccess',
+                 'arn:aws:iam::aws:policy/AmazonKinesisAnalyticsFullAccess')
 
 def create_iam_role(roleName):
     """
-    Creates a new role and attachs policies related to S3, Glue, Kinesis and Lada
+    Creates a new role. Its policies are attached by attach_role_policies
     
     :param roleName: name of the new role being created for lambda architecture components 
     :returns: http response from role creation which can be further used to verify successful creation of the IAM role 
     """ 
 
-    client = boto3.client('iam')
+    client = AWS_Clients.get_client('iam')
 
     assume_role_policy = {
         "Version": "2012-10-17",
@@ -32,6 +44,7 @@ def create_iam_role(roleName):
         ]   
     }
 
+    response = None
     try:
         response = client.create_role(
             RoleName= roleName,
@@ -42,17 +55,35 @@ def create_iam_role(roleName):
     except Exception as e:
         print(roleName, "create failed with error", e)
 
-    resource = boto3.resource('iam')
-    role = resource.Role(roleName)
+    return response
 
-    role.attach_policy(PolicyArn = 'arn:aws:iam::aws:policy/AmazonS3FullAccess')
-    role.attach_policy(PolicyArn = 'arn:aws:iam::aws:policy/service-role/AWSGlueServiceRole')
-    role.attach_policy(PolicyArn = 'arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole')
-    role.attach_policy(PolicyArn = 'arn:aws:iam::aws:policy/AmazonKinesisFullAccess')
-    role.attach_policy(PolicyArn = 'arn:aws:iam::aws:policy/AmazonKinesisFirehoseFullAccess')
-    role.attach_policy(PolicyArn = 'arn:aws:iam::aws:policy/AmazonKinesisAnalyticsFullAccess')
+def missing_role_policies(roleName, iam_client=None):
+    """
+    Lists the ROLE_POLICIES not yet attached to a role
 
-    return response
+    :param roleName: name of the role
+    :param iam_client: client to use. If not specified the shared client is used
+    :returns: list of policy ARNs still to attach
+    """
+
+    client = iam_client if iam_client is not None else AWS_Clients.get_client('iam')
+    attached = set()
+    for page in client.get_paginator('list_attached_role_policies').paginate(RoleName=roleName):
+        attached.update(policy['PolicyArn'] for policy in page['AttachedPolicies'])
+    return [policyArn for policyArn in ROLE_POLICIES if policyArn not in attached]
+
+def attach_role_policies(roleName, iam_client=None):
+    """
+    Attaches the ROLE_POLICIES a role is missing, so it also completes a role whose earlier setup stopped part way
+
+    :param roleName: name of the role
+    :param iam_client: client to use. If not specified the shared client is used
+    """
+
+    client = iam_client if iam_client is not None else AWS_Clients.get_client('iam')
+    for policyArn in missing_role_policies(roleName, client):
+        client.attach_role_policy(RoleName = roleName, PolicyArn = policyArn)
+        print(policyArn, "attached to", roleName)
 
 def create_bucket(bucketName):
     """ 
@@ -62,10 +93,11 @@ def create_bucket(bucketName):
     :return: http response of bucket creation
     """
 
-    client = boto3.client("s3", region_name = "ap-south-1")
+    client = AWS_Clients.get_client("s3", region_name = "ap-south-1")
 
     location = {'LocationConstraint': "ap-south-1"}
     
+    response = None
     try:
         response = client.create_bucket(Bucket=bucketName, CreateBucketConfiguration=location)
         print(bucketName,"created successfully")
@@ -82,8 +114,9 @@ def create_glue_database(dbName):
     :returns: http response of database creation   
     """
 
-    client = boto3.client('glue')
+    client = AWS_Clients.get_client('glue')
 
+    response = None
     try:
         response = client.create_database(DatabaseInput={
             'Name': dbName,
@@ -107,7 +140,7 @@ def create_crawler(crawlerName, iamRole, dbName, bucketName):
     :returns: http response of crawler creation
     """
 
-    client = boto3.client('glue')
+    client = AWS_Clients.get_client('glue')
 
     response = client.create_crawler(
         Name= crawlerName,
@@ -128,8 +161,9 @@ def create_crawler(crawlerName, iamRole, dbName, bucketName):
 
 def ingest_glue_script(bucketName):
     """
-    Scans the current working directory for .py files starting with glue to indicate scripts for glue jobs 
-    Compares with current contents of s3 bucket to avoid duplication of script before uploading to a bucket 
+    Scans the current working directory for .py files starting with glue to indicate scripts for glue jobs, plus
+    Flight_Transforms.py which the scripts import
+    Compares the MD5 of each script with the ETag of its object, so only new or edited scripts are uploaded 
     
     :param bucketName: String consisting of bucket name to store glue scripts
     :returns: None
@@ -149,22 +183,25 @@ def ingest_glue_script(bucketName):
     
     finalFiles = []
     for curFile in onlyfiles:
-        res = re.match(r'glue.*\.py$',curFile)
+        res = re.match(r'(glue.*|Flight_Transforms)\.py$',curFile)
         if res is not None:
             finalFiles.append(curFile)
 
     currentWorkingDir = os.getcwd()
     
-    s3 = boto3.client('s3')
+    s3 = AWS_Clients.get_client('s3')
     response = s3.list_objects(Bucket=bucketName)
-    response=response['Contents']
+    response=response.get('Contents', [])
     
-    filesInBucket = []
+    # a single part upload's ETag is the MD5 of its content
+    etagsInBucket = {}
     for flag in range(0,len(response)):
-        filesInBucket.append(response[flag]['Key'])
+        etagsInBucket[response[flag]['Key']] = response[flag]['ETag'].strip('"')
 
     for index in range(0,len(finalFiles)):
-        if finalFiles[index] in filesInBucket:
+        with open(join(currentWorkingDir, finalFiles[index]), "rb") as f:
+            digest = hashlib.md5(f.read()).hexdigest()
+        if etagsInBucket.get(finalFiles[index]) == digest:
             print(finalFiles[index],"already present in Bucket")
             continue
         else:
@@ -175,7 +212,24 @@ def ingest_glue_script(bucketName):
 
     return 
 
-def create_glue_job(jobName, iamRole, scriptPath, pythonVer):
+def glue_job_arguments(bookmarks=True, extraPyFiles=None):
+    """
+    Builds the default arguments every glue job of the pipeline is created with
+
+    :param bookmarks: enable job bookmarks, so each run only processes files added since the last committed run
+    :param extraPyFiles: comma separated s3 paths of modules the script imports, eg Flight_Transforms.py
+    :returns: dict of argument name to value
+    """
+
+    defaultArguments = {
+        '--TempDir': 's3://glue-source-hoc/temp_dir',
+        '--job-bookmark-option': 'job-bookmark-enable' if bookmarks else 'job-bookmark-disable'
+    }
+    if extraPyFiles:
+        defaultArguments['--extra-py-files'] = extraPyFiles
+    return defaultArguments
+
+def create_glue_job(jobName, iamRole, scriptPath, pythonVer, bookmarks=True, extraPyFiles=None):
     """
     Uses the given parameters to create a new glue job 
      
@@ -183,10 +237,12 @@ def create_glue_job(jobName, iamRole, scriptPath, pythonVer):
     :param iamRole: predefined IAM role with glueService policy attached 
     :param scriptPath: location in s3 bucket where script is present 
     :param pythonVer: to specify the python version 
+    :param bookmarks: enable job bookmarks, so each run only processes files added since the last committed run
+    :param extraPyFiles: comma separated s3 paths of modules the script imports, eg Flight_Transforms.py
     :returns: http response from glue job creation
     """
 
-    client = boto3.client('glue')
+    client = AWS_Clients.get_client('glue')
 
     response = client.create_job(
         Name= jobName,
@@ -196,10 +252,7 @@ def create_glue_job(jobName, iamRole, scriptPath, pythonVer):
             'ScriptLocation': scriptPath,
             'PythonVersion': pythonVer
         },
-        DefaultArguments={
-        '--TempDir': 's3://glue-source-hoc/temp_dir',
-        '--job-bookmark-option': 'job-bookmark-disable'
-        },
+        DefaultArguments=glue_job_arguments(bookmarks, extraPyFiles),
         MaxRetries=1,
         GlueVersion='3.0',
         NumberOfWorkers=2,
@@ -208,6 +261,51 @@ def create_glue_job(jobName, iamRole, scriptPath, pythonVer):
 
     return response
 
+# fields of a GetJob result that UpdateJob accepts. UpdateJob replaces the whole definition, so they are all sent back
+JOB_UPDATE_FIELDS = ('Description', 'LogUri', 'Role', 'ExecutionProperty', 'Command', 'DefaultArguments',
+                     'NonOverridableArguments', 'Connections', 'MaxRetries', 'Timeout', 'SecurityConfiguration',
+                     'NotificationProperty', 'GlueVersion', 'NumberOfWorkers', 'WorkerType', 'ExecutionClass')
+
+def glue_job_argument_changes(jobName, defaultArguments, glue_client=None):
+    """
+    Compares the default arguments of an existing glue job with the ones it should have
+
+    :param jobName: name of the glue job
+    :param defaultArguments: arguments the job should have, eg from glue_job_arguments
+    :param glue_client: client to use. If not specified the shared client is used
+    :returns: None if the job does not exist, else dict of the arguments that are missing or differ
+    """
+
+    client = glue_client if glue_client is not None else AWS_Clients.get_client('glue')
+    try:
+        current = client.get_job(JobName=jobName)['Job'].get('DefaultArguments', {})
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'EntityNotFoundException':
+            return None
+        raise
+    return {name: value for name, value in defaultArguments.items() if current.get(name) != value}
+
+def update_glue_job_arguments(jobName, defaultArguments, glue_client=None):
+    """
+    Sets default arguments on an existing glue job, keeping the rest of its definition and its other arguments
+
+    :param jobName: name of the glue job
+    :param defaultArguments: arguments to set
+    :param glue_client: client to use. If not specified the shared client is used
+    :returns: http response from the job update
+    """
+
+    client = glue_client if glue_client is not None else AWS_Clients.get_client('glue')
+    job = client.get_job(JobName=jobName)['Job']
+    jobUpdate = {field: job[field] for field in JOB_UPDATE_FIELDS if field in job}
+    jobUpdate['DefaultArguments'] = dict(job.get('DefaultArguments', {}), **defaultArguments)
+    if 'WorkerType' not in job and 'MaxCapacity' in job:
+        jobUpdate['MaxCapacity'] = job['MaxCapacity']
+
+    response = client.update_job(JobName=jobName, JobUpdate=jobUpdate)
+    print(jobName, "updated with", ", ".join(sorted(defaultArguments)))
+    return response
+
 def create_kinesis_stream(stream_name, num_shards=1):
     """Create a Kinesis data stream
 
@@ -215,7 +313,7 @@ def create_kinesis_stream(stream_name, num_shards=1):
     :param num_shards: Number of stream shards
     :return: True if creation of stream was started. Otherwise, False.
     """
-    kinesis_client = boto3.client('kinesis')
+    kinesis_client = AWS_Clients.get_client('kinesis')
 
     try:
         response = kinesis_client.create_stream(StreamName=stream_name,
@@ -235,13 +333,15 @@ def get_kinesis_arn(stream_name):
     """
 
     # Retrieve stream info
-    kinesis_client = boto3.client('kinesis')
-    try:
-        result = kinesis_client.describe_stream_summary(StreamName=stream_name)
-    except ClientError as e:
-        logging.error(e)
-        return None
-    return result['StreamDescriptionSummary']['StreamARN']
+    def lookup():
+        try:
+            result = AWS_Clients.get_client('kinesis').describe_stream_summary(StreamName=stream_name)
+        except ClientError as e:
+            logging.error(e)
+            return None
+        return result['StreamDescriptionSummary']['StreamARN']
+
+    return AWS_Clients.cached_lookup('kinesis-arn', stream_name, lookup)
 
 def get_iam_role_arn(iam_role_name):
     """Retrieve the ARN of the specified IAM role
@@ -251,21 +351,98 @@ def get_iam_role_arn(iam_role_name):
     """
 
     # Try to retrieve information about the role
-    iam_client = boto3.client('iam')
-    try:
-        result = iam_client.get_role(RoleName=iam_role_name)
-    except ClientError as e:
-        logging.error(e)
-        return None
-    return result['Role']['Arn']
+    def lookup():
+        try:
+            result = AWS_Clients.get_client('iam').get_role(RoleName=iam_role_name)
+        except ClientError as e:
+            logging.error(e)
+            return None
+        return result['Role']['Arn']
+
+    return AWS_Clients.cached_lookup('iam-role-arn', iam_role_name, lookup)
+
+COMPRESSION_FORMATS = ('UNCOMPRESSED', 'GZIP', 'ZIP', 'Snappy', 'HADOOP_SNAPPY')
+
+def firehose_s3_config(s3_bucket_arn, iam_role, buffer_size_mb=128, buffer_interval=300, compression='GZIP',
+                       glue_database=None, glue_table=None, partition_fields=(), split_json_records=False):
+    """Build the ExtendedS3DestinationConfiguration of a delivery stream
+
+    Larger buffers mean fewer, larger objects in S3, which every later crawl and Glue scan reads faster.
+    Parquet conversion and dynamic partitioning both need JSON records, see Firehose_Producer.row_to_json.
+
+    :param s3_bucket_arn: ARN of S3 bucket
+    :param iam_role: ARN of the Firehose role
+    :param buffer_size_mb: MB buffered before an object is written, 1 to 128. At least 64 when converting or partitioning
+    :param buffer_interval: seconds buffered before an object is written, 0 to 900
+    :param compression: one of COMPRESSION_FORMATS. Ignored when converting to Parquet, which is Snappy compressed
+    :param glue_database: Glue catalog database holding the table that describes the records
+    :param glue_table: Glue catalog table. If given, records are converted to Parquet using its schema
+    :param partition_fields: record fields, eg ('fl_date', 'op_carrier'), used as field=value/ key prefixes
+    :param split_json_records: split records holding several JSON objects, concatenated or newline delimited, into one record
+        per object before partitioning. This does not read KPL aggregates: Firehose de-aggregates those itself when
+        it reads from a Kinesis data stream
+    :return: destination configuration dictionary
+    """
+
+    converting = glue_table is not None
+    if compression not in COMPRESSION_FORMATS:
+        raise ValueError("compression must be one of " + ", ".join(COMPRESSION_FORMATS))
+    if (converting or partition_fields) and buffer_size_mb < 64:
+        raise ValueError("Firehose needs a buffer of at least 64 MB for format conversion or dynamic partitioning")
+
+    s3_config = {
+        'BucketARN': s3_bucket_arn,
+        'RoleARN': iam_role,
+        'BufferingHints': {
+            'SizeInMBs': buffer_size_mb,
+            'IntervalInSeconds': buffer_interval,
+        },
+        # Parquet files are compressed internally, compressing them again would leave them unreadable
+        'CompressionFormat': 'UNCOMPRESSED' if converting else compression,
+    }
+
+    if converting:
+        s3_config['DataFormatConversionConfiguration'] = {
+            'Enabled': True,
+            'SchemaConfiguration': {
+                'RoleARN': iam_role,
+                'DatabaseName': glue_database,
+                'TableName': glue_table,
+                'VersionId': 'LATEST',
+            },
+            'InputFormatConfiguration': {'Deserializer': {'OpenXJsonSerDe': {}}},
+            'OutputFormatConfiguration': {'Serializer': {'ParquetSerDe': {'Compression': 'SNAPPY'}}},
+        }
+
+    if partition_fields:
+        processors = []
+        if split_json_records:
+            processors.append({
+                'Type': 'RecordDeAggregation',
+                'Parameters': [{'ParameterName': 'SubRecordType', 'ParameterValue': 'JSON'}],
+            })
+        query = '{' + ', '.join(field + ': .' + field for field in partition_fields) + '}'
+        processors.append({
+            'Type': 'MetadataExtraction',
+            'Parameters': [
+                {'ParameterName': 'MetadataExtractionQuery', 'ParameterValue': query},
+                {'ParameterName': 'JsonParsingEngine', 'ParameterValue': 'JQ-1.6'},
+            ],
+        })
+        s3_config['ProcessingConfiguration'] = {'Enabled': True, 'Processors': processors}
+        s3_config['DynamicPartitioningConfiguration'] = {'Enabled': True, 'RetryOptions': {'DurationInSeconds': 300}}
+        s3_config['Prefix'] = ''.join(field + '=!{partitionKeyFromQuery:' + field + '}/' for field in partition_fields)
+        s3_config['ErrorOutputPrefix'] = 'errors/!{firehose:error-output-type}/'
+
+    return s3_config
 
 def create_firehose_to_s3(firehose_name, s3_bucket_arn, iam_role_name,
                           firehose_src_type='DirectPut',
-                          firehose_src_stream=None):
+                          firehose_src_stream=None, **delivery_options):
     """Create a Kinesis Firehose delivery stream to S3
 
     The data source can be either a Kinesis Data Stream or puts sent directly
-    to the Firehose stream.
+    to the Firehose stream, see Firehose_Producer.
 
     :param firehose_name: Delivery stream name
     :param s3_bucket_arn: ARN of S3 bucket
@@ -274,6 +451,7 @@ def create_firehose_to_s3(firehose_name, s3_bucket_arn, iam_role_name,
     :param firehose_src_type: 'DirectPut' or 'KinesisStreamAsSource'
     :param firehose_src_stream: ARN of source Kinesis Data Stream. Required if
         firehose_src_type is 'KinesisStreamAsSource'
+    :param delivery_options: buffering, compression, conversion and partitioning options of firehose_s3_config
     :return: ARN of Firehose delivery stream. If error, returns None.
     """
 
@@ -281,18 +459,11 @@ def create_firehose_to_s3(firehose_name, s3_bucket_arn, iam_role_name,
 
     # Create the S3 configuration dictionary
     # Both BucketARN and RoleARN are required
-    # Set the buffer interval=60 seconds (Default=300 seconds)
-    s3_config = {
-        'BucketARN': s3_bucket_arn,
-        'RoleARN': iam_role,
-        'BufferingHints': {
-            'IntervalInSeconds': 60,
-        },
-    }
+    s3_config = firehose_s3_config(s3_bucket_arn, iam_role, **delivery_options)
 
     # Create the delivery stream
     # By default, the DeliveryStreamType='DirectPut'
-    firehose_client = boto3.client('firehose')
+    firehose_client = AWS_Clients.get_client('firehose')
     try:
         if firehose_src_type == 'KinesisStreamAsSource':
             # Define the Kinesis Data Stream configuration
@@ -316,36 +487,171 @@ def create_firehose_to_s3(firehose_name, s3_bucket_arn, iam_role_name,
     return result['DeliveryStreamARN']
 
 
-if __name__ == "__main__":
+def resource_exists(call, **kwargs):
+    """
+    Runs a describe/get call to see if a resource is already present
 
-    create_bucket("raw-lambdaarch")
-    create_bucket("trusted-lambdaarch")
-    create_bucket("refined-lambdaarch")
-    create_bucket("kinesis-datastream-ingress")
-    create_bucket("streamed-lambda")
-    create_bucket("shift-to-refined")
-    create_bucket("shift-to-trusted")
-    create_bucket("glue-scripts-lambdaarch")
+    :param call: bound client method, eg glue client get_crawler
+    :param kwargs: arguments of the call
+    :returns: True if the call succeeds, False if the service reports the resource as missing
+    """
 
-    roleName = "lambda-poc"
-    create_iam_role(roleName)
+    try:
+        call(**kwargs)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchBucket', 'NoSuchEntity', 'EntityNotFoundException', 'ResourceNotFoundException'):
+            return False
+        raise
 
-    glueDB = "lambdaCatalog"
-    create_glue_database(glueDB)
-    
-    create_crawler("Raw", roleName, glueDB, "raw-lambdaarch")
-    create_crawler("Trusted", roleName, glueDB, "trusted-lambdaarch")
+def stream_status(stream_name):
+    return AWS_Clients.get_client('kinesis').describe_stream_summary(StreamName=stream_name)['StreamDescriptionSummary']['StreamStatus']
+
+def firehose_status(firehose_name):
+    return AWS_Clients.get_client('firehose').describe_delivery_stream(DeliveryStreamName=firehose_name)['DeliveryStreamDescription']['DeliveryStreamStatus']
 
-    ingest_glue_script("glue-scripts-lambdaarch")
-    create_glue_job("Raw-to-Trusted", roleName, "s3://glue-scripts-lambdaarch/glue-raw-to-trusted.py","3")
-    create_glue_job("Trusted-to-Refined", roleName, "s3://glue-scripts-lambdaarch/glue-trusted-to-refined.py","3")
+def require(result, message):
+    # the create_* helpers report failure by printing and returning None or False, the plan needs an exception
+    if result is None or result is False:
+        raise Exception(message)
+    return result
 
-    kinesis_name = 'kinesis_lambda_stream'
-    create_kinesis_stream(kinesis_name)
-    kinesis_arn = get_kinesis_arn(kinesis_name)
+def build_environment_plan(buckets, roleName, glueDB, crawlers, scriptBucket, jobs, kinesis_name, firehose_name, firehose_bucket,
+                           firehose_options=None):
+    """
+    Describes the environment as a dependency graph for Provisioning.run_plan. Independent resources are
+    created concurrently, and each resource waits only on what it needs, eg the Firehose waits for the stream
+    to be ACTIVE but not for the Glue jobs
+
+    :param buckets: names of the buckets to create
+    :param roleName: IAM role used by Glue and Firehose
+    :param glueDB: Glue catalog database
+    :param crawlers: dict of crawler name to the bucket it crawls
+    :param scriptBucket: bucket holding the Glue job scripts
+    :param jobs: dict of Glue job name to its script location
+    :param kinesis_name: Kinesis data stream name
+    :param firehose_name: Firehose delivery stream name, reading from the Kinesis stream
+    :param firehose_bucket: bucket the Firehose delivers to
+    :param firehose_options: buffering, compression, conversion and partitioning options, see firehose_s3_config
+    :returns: list of Provisioning.Resource
+    """
+
+    s3 = AWS_Clients.get_client('s3', region_name = "ap-south-1")
+    iam = AWS_Clients.get_client('iam')
+    glue = AWS_Clients.get_client('glue')
+    kinesis = AWS_Clients.get_client('kinesis')
+    dynamodb = AWS_Clients.get_client('dynamodb')
+    firehose = AWS_Clients.get_client('firehose')
+
+    plan = []
+    for bucketName in buckets:
+        plan.append(Provisioning.Resource(
+            "bucket:" + bucketName,
+            exists=lambda bucketName=bucketName: resource_exists(s3.head_bucket, Bucket=bucketName),
+            create=lambda bucketName=bucketName: require(create_bucket(bucketName), "bucket " + bucketName + " was not created"),
+            wait=lambda bucketName=bucketName: Provisioning.wait_until(lambda: resource_exists(s3.head_bucket, Bucket=bucketName), timeout=120)))
+
+    # IAM is eventually consistent, the role has to be readable before Glue or Firehose will accept it
+    plan.append(Provisioning.Resource(
+        "role:" + roleName,
+        exists=lambda: resource_exists(iam.get_role, RoleName=roleName),
+        create=lambda: require(create_iam_role(roleName), "role " + roleName + " was not created"),
+        wait=lambda: Provisioning.wait_until(lambda: resource_exists(iam.get_role, RoleName=roleName), timeout=120)))
+
+    # a separate resource so that re-running the plan attaches policies to a role that already exists
+    plan.append(Provisioning.Resource(
+        "policies:" + roleName,
+        exists=lambda: not missing_role_policies(roleName, iam),
+        create=lambda: attach_role_policies(roleName, iam),
+        depends_on=("role:" + roleName,)))
+
+    plan.append(Provisioning.Resource(
+        "database:" + glueDB,
+        exists=lambda: resource_exists(glue.get_database, Name=glueDB),
+        create=lambda: require(create_glue_database(glueDB), "database " + glueDB + " was not created")))
+
+    for crawlerName, bucketName in crawlers.items():
+        plan.append(Provisioning.Resource(
+            "crawler:" + crawlerName,
+            exists=lambda crawlerName=crawlerName: resource_exists(glue.get_crawler, Name=crawlerName),
+            create=lambda crawlerName=crawlerName, bucketName=bucketName: create_crawler(crawlerName, roleName, glueDB, bucketName),
+            depends_on=("policies:" + roleName, "database:" + glueDB, "bucket:" + bucketName)))
+
+    # uploading the scripts is itself idempotent, it skips scripts whose content is already in the bucket
+    plan.append(Provisioning.Resource(
+        "scripts:" + scriptBucket,
+        exists=lambda: False,
+        create=lambda: ingest_glue_script(scriptBucket),
+        depends_on=("bucket:" + scriptBucket,)))
+
+    # a job created by an earlier setup is brought up to date, eg the scripts now import Flight_Transforms through
+    # --extra-py-files
+    jobArguments = glue_job_arguments(extraPyFiles="s3://" + scriptBucket + "/Flight_Transforms.py")
+
+    def provision_job(jobName, scriptPath):
+        if glue_job_argument_changes(jobName, jobArguments, glue) is None:
+            return create_glue_job(jobName, roleName, scriptPath, "3", extraPyFiles=jobArguments['--extra-py-files'])
+        return update_glue_job_arguments(jobName, jobArguments, glue)
+
+    for jobName, scriptPath in jobs.items():
+        plan.append(Provisioning.Resource(
+            "job:" + jobName,
+            exists=lambda jobName=jobName: glue_job_argument_changes(jobName, jobArguments, glue) == {},
+            create=lambda jobName=jobName, scriptPath=scriptPath: provision_job(jobName, scriptPath),
+            depends_on=("policies:" + roleName, "scripts:" + scriptBucket)))
+
+    # content fingerprints the check Lambdas use to find duplicates, see Fingerprint_Index
+    plan.append(Provisioning.Resource(
+        "table:" + Fingerprint_Index.TABLE_NAME,
+        exists=lambda: resource_exists(dynamodb.describe_table, TableName=Fingerprint_Index.TABLE_NAME),
+        create=lambda: require(Fingerprint_Index.create_table(dynamodb_client=dynamodb), "table " + Fingerprint_Index.TABLE_NAME + " was not created"),
+        wait=lambda: Provisioning.wait_until(lambda: dynamodb.describe_table(TableName=Fingerprint_Index.TABLE_NAME)['Table']['TableStatus'] == 'ACTIVE')))
+
+    # pending crawler and job batches, see Trigger_Coalescer
+    plan.append(Provisioning.Resource(
+        "table:" + Trigger_Coalescer.TABLE_NAME,
+        exists=lambda: resource_exists(dynamodb.describe_table, TableName=Trigger_Coalescer.TABLE_NAME),
+        create=lambda: require(Trigger_Coalescer.create_table(dynamodb_client=dynamodb), "table " + Trigger_Coalescer.TABLE_NAME + " was not created"),
+        wait=lambda: Provisioning.wait_until(lambda: dynamodb.describe_table(TableName=Trigger_Coalescer.TABLE_NAME)['Table']['TableStatus'] == 'ACTIVE')))
+
+    plan.append(Provisioning.Resource(
+        "stream:" + kinesis_name,
+        exists=lambda: resource_exists(kinesis.describe_stream_summary, StreamName=kinesis_name),
+        create=lambda: require(create_kinesis_stream(kinesis_name), "stream " + kinesis_name + " was not created"),
+        wait=lambda: Provisioning.wait_until(lambda: stream_status(kinesis_name) == 'ACTIVE')))
+
+    plan.append(Provisioning.Resource(
+        "firehose:" + firehose_name,
+        exists=lambda: resource_exists(firehose.describe_delivery_stream, DeliveryStreamName=firehose_name),
+        create=lambda: require(create_firehose_to_s3(firehose_name, 'arn:aws:s3:::' + firehose_bucket, roleName,
+                                                     'KinesisStreamAsSource', get_kinesis_arn(kinesis_name),
+                                                     **(firehose_options or {})),
+                               "firehose " + firehose_name + " was not created"),
+        wait=lambda: Provisioning.wait_until(lambda: firehose_status(firehose_name) == 'ACTIVE'),
+        depends_on=("stream:" + kinesis_name, "policies:" + roleName, "bucket:" + firehose_bucket)))
+
+    return plan
 
-    firehose_name = 'firehose_kinesis_lambda_stream'
-    bucket_arn = 'arn:aws:s3:::kinesis-datastream-ingress'
-    firehose_src_type = 'KinesisStreamAsSource'
 
-    firehose_arn = create_firehose_to_s3(firehose_name, bucket_arn, roleName, firehose_src_type, kinesis_arn)
+if __name__ == "__main__":
+
+    plan = build_environment_plan(
+        buckets = ["raw-lambdaarch", "trusted-lambdaarch", "refined-lambdaarch", "kinesis-datastream-ingress",
+                   "streamed-lambda", "shift-to-refined", "shift-to-trusted", "glue-scripts-lambdaarch"],
+        roleName = "lambda-poc",
+        glueDB = "lambdaCatalog",
+        crawlers = {"Raw": "raw-lambdaarch", "Trusted": "trusted-lambdaarch"},
+        scriptBucket = "glue-scripts-lambdaarch",
+        jobs = {"Raw-to-Trusted": "s3://glue-scripts-lambdaarch/glue-raw-to-trusted.py",
+                "Trusted-to-Refined": "s3://glue-scripts-lambdaarch/glue-trusted-to-refined.py",
+                # both steps in one job, see Stage_Orchestrator --fused
+                "Raw-to-Refined": "s3://glue-scripts-lambdaarch/glue-raw-to-refined.py"},
+        kinesis_name = 'kinesis_lambda_stream',
+        firehose_name = 'firehose_kinesis_lambda_stream',
+        firehose_bucket = 'kinesis-datastream-ingress',
+        # the stream carries KPL aggregated CSV rows, so only buffering and compression apply here
+        firehose_options = {'buffer_size_mb': 128, 'buffer_interval': 300, 'compression': 'GZIP'})
+
+    results = Provisioning.run_plan(plan)
+    if any(result.status in (Provisioning.FAILED, Provisioning.SKIPPED) for result in results.values()):
+        exit(1)
\ No newline at end of file
@@ -0,0 +1,204 @@
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+from botocore.exceptions import ClientError
+import AWS_Clients
+
+# Per shard write limits
+SHARD_BYTES_PER_SECOND = 1024 * 1024
+SHARD_RECORDS_PER_SECOND = 1000
+
+Decision = namedtuple("Decision", ["current", "desired", "reason", "records_per_second", "bytes_per_second", "throttled"])
+
+class ShardAutoscaler:
+    """ Sizes a stream from the ingress a Kinesis_Producer.KinesisProducer measures.
+    Scaling up needs scale_up_after consecutive samples over target, or throttling; scaling down needs
+    scale_down_after consecutive samples under scale_down_utilization. After a change nothing happens for
+    cooldown seconds, so the stream does not flap around a threshold
+
+    :param stream_name: Kinesis data stream name
+    :param kinesis_client: client to use. If not specified the shared client is used
+    :param target_utilization: fraction of shard capacity to size for
+    :param scale_down_utilization: utilization of the current shards below which fewer shards are recommended
+    :param min_shards: lower bound on the shard count
+    :param max_shards: upper bound on the shard count
+    :param scale_up_after: consecutive samples above target before scaling up
+    :param scale_down_after: consecutive samples below scale_down_utilization before scaling down
+    :param cooldown: seconds after a change during which no further change is made
+    """
+
+    def __init__(self, stream_name, kinesis_client=None, target_utilization=0.7, scale_down_utilization=0.3,
+                 min_shards=1, max_shards=64, scale_up_after=2, scale_down_after=10, cooldown=300):
+        self.stream_name = stream_name
+        self.kinesis_client = kinesis_client if kinesis_client is not None else AWS_Clients.get_client('kinesis')
+        self.target_utilization = target_utilization
+        self.scale_down_utilization = scale_down_utilization
+        self.min_shards = min_shards
+        self.max_shards = max_shards
+        self.scale_up_after = scale_up_after
+        self.scale_down_after = scale_down_after
+        self.cooldown = cooldown
+
+        self._previous = None
+        self._over = 0
+        self._under = 0
+        self._last_change = -math.inf
+
+    def current_shards(self):
+        result = self.kinesis_client.describe_stream_summary(StreamName=self.stream_name)
+        return result['StreamDescriptionSummary']['OpenShardCount']
+
+    def sample(self, stats, now=None):
+        """ Turns cumulative producer counters into rates since the previous sample
+
+        :param stats: dict from KinesisProducer.stats()
+        :param now: monotonic seconds, defaults to time.monotonic()
+        :return: (records per second, bytes per second, throttled records), else None on the first sample
+        """
+
+        now = time.monotonic() if now is None else now
+        current = (now, stats['records_sent'], stats['bytes_sent'], stats['throttled_records'])
+        previous, self._previous = self._previous, current
+        if previous is None or now <= previous[0]:
+            return None
+
+        elapsed = now - previous[0]
+        return ((current[1] - previous[1]) / elapsed, (current[2] - previous[2]) / elapsed, current[3] - previous[3])
+
+    def recommend(self, current, records_per_second, bytes_per_second, throttled, now=None):
+        """ Applies the hysteresis rules to one sample
+
+        :param current: open shard count
+        :param records_per_second: measured ingress in records
+        :param bytes_per_second: measured ingress in bytes
+        :param throttled: records rejected with ProvisionedThroughputExceeded since the last sample
+        :param now: monotonic seconds, defaults to time.monotonic()
+        :return: Decision
+        """
+
+        now = time.monotonic() if now is None else now
+        needed = max(records_per_second / (SHARD_RECORDS_PER_SECOND * self.target_utilization),
+                     bytes_per_second / (SHARD_BYTES_PER_SECOND * self.target_utilization))
+        utilization = max(records_per_second / (SHARD_RECORDS_PER_SECOND * current),
+                          bytes_per_second / (SHARD_BYTES_PER_SECOND * current))
+
+        desired = current
+        reason = "within target"
+        if throttled or needed > current:
+            self._over += 1
+            self._under = 0
+            reason = "ingress above target, waiting for " + str(self.scale_up_after) + " samples"
+            if throttled or self._over >= self.scale_up_after:
+                # throttled producers under-report demand, so throttling grows the stream by at least half
+                desired = max(math.ceil(needed), math.ceil(current * 1.5) if throttled else current + 1)
+                reason = "throttled" if throttled else "ingress above target"
+        elif utilization < self.scale_down_utilization:
+            self._under += 1
+            self._over = 0
+            if self._under >= self.scale_down_after:
+                desired = max(math.ceil(needed), 1)
+                reason = "ingress below scale down threshold"
+        else:
+            self._over = 0
+            self._under = 0
+
+        # UpdateShardCount accepts at most double or half the current count per call
+        desired = min(desired, current * 2, self.max_shards)
+        desired = max(desired, math.ceil(current / 2), self.min_shards)
+
+        if desired != current and now - self._last_change < self.cooldown:
+            reason = "cooling down, wanted " + str(desired)
+            desired = current
+        elif desired != current:
+            # the next change has to build up its own run of samples
+            self._over = 0
+            self._under = 0
+
+        return Decision(current, desired, reason, records_per_second, bytes_per_second, throttled)
+
+    def apply(self, decision, timeout=900):
+        """ Starts UpdateShardCount for a decision and waits until the stream reports the new shard count
+
+        :param decision: Decision from recommend
+        :param timeout: seconds to wait for resharding
+        :return: True if the stream is active with the desired shard count, else False
+        """
+
+        if decision.desired == decision.current:
+            return True
+        try:
+            self.kinesis_client.update_shard_count(StreamName=self.stream_name, TargetShardCount=decision.desired,
+                                                   ScalingType='UNIFORM_SCALING')
+        except ClientError as e:
+            logging.error(e)
+            return False
+
+        self._last_change = time.monotonic()
+        return self.wait_for_resharding(decision.desired, timeout)
+
+    def wait_for_resharding(self, desired, timeout=900):
+        """ Polls with backoff until the stream is ACTIVE with the desired open shard count.
+        Checking the status alone is not enough, the stream can still read ACTIVE right after the update call
+
+        :param desired: expected open shard count
+        :param timeout: seconds to wait
+        :return: True once resharding completed, False on timeout or error
+        """
+
+        deadline = time.monotonic() + timeout
+        delay = 2
+        while time.monotonic() < deadline:
+            try:
+                summary = self.kinesis_client.describe_stream_summary(StreamName=self.stream_name)['StreamDescriptionSummary']
+            except ClientError as e:
+                logging.error(e)
+                return False
+            if summary['StreamStatus'] == 'ACTIVE' and summary['OpenShardCount'] == desired:
+                return True
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+        logging.error(f'Resharding of {self.stream_name} to {desired} shards did not finish in {timeout} seconds')
+        return False
+
+    def step(self, stats, apply=False):
+        """ Samples the producer counters and recommends, or applies, a shard count
+
+        :param stats: dict from KinesisProducer.stats()
+        :param apply: call UpdateShardCount when the recommendation differs from the current count
+        :return: Decision, else None on the first sample
+        """
+
+        rates = self.sample(stats)
+        if rates is None:
+            return None
+        decision = self.recommend(self.current_shards(), *rates)
+        if decision.desired != decision.current:
+            logging.info(f'{self.stream_name}: {decision.reason}, {decision.current} -> {decision.desired} shards '
+                         f'({decision.records_per_second:.0f} records/s, {decision.bytes_per_second:.0f} bytes/s, '
+                         f'{decision.throttled} throttled)')
+            if apply:
+                self.apply(decision)
+        return decision
+
+    def run_in_background(self, producer, interval=60, apply=False):
+        """ Calls step on a daemon thread every interval seconds until the returned event is set
+
+        :param producer: KinesisProducer whose counters are sampled
+        :param interval: seconds between samples
+        :param apply: apply recommendations instead of only logging them
+        :return: threading.Event that stops the thread when set
+        """
+
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.step(producer.stats(), apply)
+                except ClientError as e:
+                    logging.error(e)
+
+        threading.Thread(target=run, name="shard-autoscaler", daemon=True).start()
+        return stop
@@ -0,0 +1,336 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from botocore.exceptions import ClientError
+import AWS_Clients
+import Flight_Rows
+import Kinesis_Aggregation
+
+class WindowAggregator:
+    """ Incremental windowed count, sum, mean and max of a numeric field grouped by key fields.
+    Time is cut into panes of slide seconds. A pane is folded into running totals when it opens and subtracted
+    when it leaves the window, so a query touches only the panes of the requested key.
+    slide equal to size gives tumbling windows, a smaller slide gives sliding windows
+
+    :param name: name the aggregate is queried by
+    :param key_fields: columns forming the group key, eg ("op_carrier",) or ("origin", "dest")
+    :param value_field: numeric column aggregated, eg "arr_delay". Rows with an empty value are skipped
+    :param size: window length in seconds
+    :param slide: seconds between window starts. If not specified, size is used and windows tumble
+    """
+
+    def __init__(self, name, key_fields, value_field, size, slide=None):
+        slide = size if slide is None else slide
+        if size % slide:
+            raise ValueError("size must be a multiple of slide")
+        self.name = name
+        self.key_fields = tuple(key_fields)
+        self.value_field = value_field
+        self.size = size
+        self.slide = slide
+        self.panes_per_window = size // slide
+
+        self._lock = threading.Lock()
+        self._panes = {}
+        self._totals = {}
+        self._current = None
+        self.last_window = {}
+        self.last_window_end = None
+
+    def _advance(self, pane):
+        # expire panes that fell out of the window ending at pane. Tumbling windows keep their final totals
+        if self._current is not None and pane > self._current and self.panes_per_window == 1:
+            closed = self._panes.get(self._current)
+            self.last_window = self._summaries(closed) if closed else {}
+            self.last_window_end = (self._current + 1) * self.slide
+
+        self._current = pane if self._current is None else max(self._current, pane)
+        oldest = self._current - self.panes_per_window + 1
+        for expired in [index for index in self._panes if index < oldest]:
+            for key, stats in self._panes.pop(expired).items():
+                total = self._totals[key]
+                total[0] -= stats[0]
+                total[1] -= stats[1]
+                if total[0] == 0:
+                    del self._totals[key]
+
+    def add(self, row, timestamp):
+        """ Folds one parsed row into the window
+
+        :param row: dict from Flight_Rows.parse_row
+        :param timestamp: epoch seconds the row is assigned to, eg the Kinesis arrival timestamp
+        :return: True if the row was counted
+        """
+
+        raw = row.get(self.value_field)
+        if raw in (None, ""):
+            return False
+        try:
+            value = float(raw)
+        except ValueError:
+            return False
+        key = tuple(row.get(field, "") for field in self.key_fields)
+        pane = int(timestamp // self.slide)
+
+        with self._lock:
+            self._advance(pane)
+            if pane <= self._current - self.panes_per_window:
+                return False # late row for a window that has already closed
+
+            stats = self._panes.setdefault(pane, {}).setdefault(key, [0, 0.0, -math.inf])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+            total = self._totals.setdefault(key, [0, 0.0])
+            total[0] += 1
+            total[1] += value
+        return True
+
+    def _summaries(self, stats_by_key):
+        return {key: {"count": stats[0], "sum": stats[1], "mean": stats[1] / stats[0], "max": stats[2]}
+                for key, stats in stats_by_key.items()}
+
+    def query(self, key=None, now=None):
+        """ Reads the current window
+
+        :param key: tuple of key field values. If not specified every key is returned
+        :param now: epoch seconds used to expire panes when no rows arrived recently. If not specified time.time()
+        :return: dict of key to {"count", "sum", "mean", "max"}
+        """
+
+        now = time.time() if now is None else now
+        with self._lock:
+            self._advance(int(now // self.slide))
+            keys = list(self._totals) if key is None else ([key] if key in self._totals else [])
+            result = {}
+            for current_key in keys:
+                count, total = self._totals[current_key]
+                maximum = max(pane[current_key][2] for pane in self._panes.values() if current_key in pane)
+                result[current_key] = {"count": count, "sum": total, "mean": total / count, "max": maximum}
+            return result
+
+class ShardCheckpoint:
+    """ Durable map of shard id to the last processed sequence number, rewritten atomically on save
+
+    :param path: location of the checkpoint file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                self.sequences = json.load(f)
+        except FileNotFoundError:
+            self.sequences = {}
+        self._dirty = False
+
+    def get(self, shard_id):
+        with self._lock:
+            return self.sequences.get(shard_id)
+
+    def update(self, shard_id, sequence_number):
+        with self._lock:
+            self.sequences[shard_id] = sequence_number
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.sequences)
+            self._dirty = False
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+class SpeedLayerConsumer:
+    """ Reads every shard of a stream on its own thread with GetShardIterator/GetRecords, de-aggregates and parses
+    the rows, and feeds them to the window aggregators. Sequence numbers are checkpointed so a restart resumes
+    after the last processed record. Child shards created by resharding are picked up once their parents close
+
+    :param stream_name: Kinesis data stream name
+    :param aggregators: list of WindowAggregator
+    :param checkpoint: ShardCheckpoint
+    :param kinesis_client: client to use. If not specified the shared client is used
+    :param columns: column names used by Flight_Rows.parse_row
+    :param initial_position: 'TRIM_HORIZON' or 'LATEST' for shards without a checkpoint
+    :param poll_interval: seconds to wait after an empty read. Kinesis allows 5 reads per second per shard
+    :param checkpoint_interval: seconds between checkpoint saves
+    :param shard_refresh_interval: seconds between checks for new shards
+    """
+
+    def __init__(self, stream_name, aggregators, checkpoint, kinesis_client=None, columns=Flight_Rows.FLIGHT_COLUMNS,
+                 initial_position='TRIM_HORIZON', poll_interval=1.0, checkpoint_interval=5.0, shard_refresh_interval=30.0,
+                 records_per_read=1000):
+        self.stream_name = stream_name
+        self.aggregators = {aggregator.name: aggregator for aggregator in aggregators}
+        self.checkpoint = checkpoint
+        self.kinesis_client = kinesis_client if kinesis_client is not None else AWS_Clients.get_client('kinesis')
+        self.columns = columns
+        self.initial_position = initial_position
+        self.poll_interval = poll_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.shard_refresh_interval = shard_refresh_interval
+        self.records_per_read = records_per_read
+
+        self._stop = threading.Event()
+        self._threads = {}
+        self._closed_shards = set()
+        self._lock = threading.Lock()
+        self._supervisor = None
+        self.rows_processed = 0
+
+    def _list_shards(self):
+        shards = []
+        kwargs = {'StreamName': self.stream_name}
+        while True:
+            response = self.kinesis_client.list_shards(**kwargs)
+            shards.extend(response['Shards'])
+            if not response.get('NextToken'):
+                return shards
+            kwargs = {'NextToken': response['NextToken']}
+
+    def _shard_iterator(self, shard_id):
+        sequence_number = self.checkpoint.get(shard_id)
+        if sequence_number is not None:
+            response = self.kinesis_client.get_shard_iterator(
+                StreamName=self.stream_name, ShardId=shard_id,
+                ShardIteratorType='AFTER_SEQUENCE_NUMBER', StartingSequenceNumber=sequence_number)
+        else:
+            response = self.kinesis_client.get_shard_iterator(
+                StreamName=self.stream_name, ShardId=shard_id, ShardIteratorType=self.initial_position)
+        return response['ShardIterator']
+
+    def process_records(self, shard_id, records):
+        """ De-aggregates, parses and aggregates one GetRecords batch, then advances the shard's checkpoint
+
+        :param shard_id: shard the records came from
+        :param records: Records list of a GetRecords response
+        """
+
+        rows = 0
+        for record in records:
+            arrival = record['ApproximateArrivalTimestamp']
+            timestamp = arrival.timestamp() if hasattr(arrival, 'timestamp') else float(arrival)
+            for _, data in Kinesis_Aggregation.deaggregate(record['Data'], record.get('PartitionKey')):
+                row = Flight_Rows.parse_row(data, self.columns)
+                if row is None:
+                    continue
+                rows += 1
+                for aggregator in self.aggregators.values():
+                    aggregator.add(row, timestamp)
+        if records:
+            self.checkpoint.update(shard_id, records[-1]['SequenceNumber'])
+        with self._lock:
+            self.rows_processed += rows
+
+    def _read_shard(self, shard_id):
+        backoff = self.poll_interval
+        iterator = None
+        while not self._stop.is_set():
+            try:
+                if iterator is None:
+                    iterator = self._shard_iterator(shard_id)
+                response = self.kinesis_client.get_records(ShardIterator=iterator, Limit=self.records_per_read)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code == 'ExpiredIteratorException':
+                    iterator = None
+                    continue
+                if code in ('ProvisionedThroughputExceededException', 'ThrottlingException', 'KMSThrottlingException'):
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, 10.0)
+                    continue
+                logging.error(e)
+                self._stop.wait(backoff)
+                continue
+
+            backoff = self.poll_interval
+            self.process_records(shard_id, response['Records'])
+
+            iterator = response.get('NextShardIterator')
+            if iterator is None:
+                # the shard was closed by resharding and is fully read, its children can start
+                with self._lock:
+                    self._closed_shards.add(shard_id)
+                return
+            if not response['Records'] or response.get('MillisBehindLatest', 0) == 0:
+                self._stop.wait(self.poll_interval)
+
+    def _start_ready_shards(self):
+        for shard in self._list_shards():
+            shard_id = shard['ShardId']
+            with self._lock:
+                if shard_id in self._threads:
+                    continue
+                parents = [shard.get('ParentShardId'), shard.get('AdjacentParentShardId')]
+                # children wait until parents we are still reading are finished, so per key order is kept
+                if any(parent in self._threads and parent not in self._closed_shards for parent in parents if parent):
+                    continue
+                thread = threading.Thread(target=self._read_shard, args=(shard_id,), name="shard-" + shard_id, daemon=True)
+                self._threads[shard_id] = thread
+            thread.start()
+
+    def _supervise(self):
+        last_refresh = time.monotonic()
+        while not self._stop.wait(self.checkpoint_interval):
+            self.checkpoint.save()
+            if time.monotonic() - last_refresh >= self.shard_refresh_interval:
+                last_refresh = time.monotonic()
+                try:
+                    self._start_ready_shards()
+                except ClientError as e:
+                    logging.error(e)
+        self.checkpoint.save()
+
+    def start(self):
+        self._start_ready_shards()
+        self._supervisor = threading.Thread(target=self._supervise, name="speed-layer-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in list(self._threads.values()):
+            thread.join()
+        if self._supervisor is not None:
+            self._supervisor.join()
+
+    def query(self, name, key=None, now=None):
+        """ Reads the current window of one aggregate, see WindowAggregator.query
+
+        :param name: aggregator name
+        :param key: tuple of key field values. If not specified every key is returned
+        :param now: epoch seconds, defaults to time.time()
+        :return: dict of key to {"count", "sum", "mean", "max"}
+        """
+
+        return self.aggregators[name].query(key, now)
+
+def default_aggregators():
+    return [
+        WindowAggregator("carrier_arr_delay_1m", ("op_carrier",), "arr_delay", size=60),
+        WindowAggregator("carrier_arr_delay_5m", ("op_carrier",), "arr_delay", size=300, slide=10),
+        WindowAggregator("route_dep_delay_5m", ("origin", "dest"), "dep_delay", size=300, slide=10),
+    ]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(asctime)s: %(message)s')
+
+    consumer = SpeedLayerConsumer('kinesis_lambda_stream', default_aggregators(), ShardCheckpoint('speed-layer.checkpoint'))
+    consumer.start()
+    try:
+        while True:
+            time.sleep(10)
+            for carrier, stats in sorted(consumer.query("carrier_arr_delay_5m").items()):
+                print(carrier[0], "flights:", stats["count"], "mean arrival delay:", round(stats["mean"], 1), "max:", stats["max"])
+    except KeyboardInterrupt:
+        consumer.stop()
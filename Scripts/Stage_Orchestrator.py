@@ -0,0 +1,259 @@
+import logging
+import sys
+import time
+from collections import namedtuple
+import AWS_Clients
+import Object_Promotion
+from Lambda_Events import S3Object
+import Run_Crawler
+import Run_Glue_Job
+import Trigger_Coalescer
+from botocore.exceptions import ClientError
+from Trigger_Coalescer import BUSY_ERRORS
+
+# name: stage name used in logs and latency reports
+# job: Glue job run by the stage
+# crawler: optional crawler run first, so the job reads a catalog that includes the new files
+# arguments: job arguments, eg {'--job-bookmark-option': 'job-bookmark-enable'}
+# after: optional zero argument callable run once the job succeeded, eg moving its output into the next zone
+Stage = namedtuple("Stage", ["name", "job", "crawler", "arguments", "after"], defaults=(None, None, None))
+
+# seconds covers the whole stage, crawl, job and after the time spent in each part
+StageRun = namedtuple("StageRun", ["name", "state", "job_run_id", "crawl_seconds", "job_seconds", "after_seconds",
+                                   "seconds", "error"])
+
+TERMINAL_JOB_STATES = ('SUCCEEDED', 'FAILED', 'STOPPED', 'TIMEOUT', 'ERROR')
+
+class StageFailed(Exception):
+    pass
+
+class StageOrchestrator:
+    """ Runs pipeline stages one after another, starting each as soon as the previous job run has committed
+    its output instead of waiting for S3 events to ripple through the Lambdas. Job runs are tracked by
+    JobRunId, so a failed or slow stage is reported rather than silently stalling the pipeline.
+    A crawl or job seen before is polled by halving the gap to its expected finish, judged from its previous
+    run, so a long job is checked rarely early on and often around the time it should end. Otherwise, or once
+    the expected time has passed, polling backs off from min_delay to max_delay
+
+    :param stages: list of Stage, in order
+    :param glue_client: client used to poll crawlers and job runs. If not specified the shared client is used
+    :param start_crawler: callable starting a crawler by name
+    :param start_job: callable starting a Glue job as (name, arguments), returning the StartJobRun response
+    :param min_delay: shortest poll interval in seconds
+    :param max_delay: longest poll interval in seconds while backing off
+    :param timeout: seconds a crawl or job run may take before the stage fails
+    :param sleep: callable used to wait, replaceable for local runs
+    :param clock: monotonic clock in seconds, replaceable for local runs
+    """
+
+    def __init__(self, stages, glue_client=None, start_crawler=Run_Crawler.start_a_crawler,
+                 start_job=Run_Glue_Job.run_glue_job, min_delay=2, max_delay=60, timeout=3600,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.stages = stages
+        self.glue_client = glue_client if glue_client is not None else AWS_Clients.get_client('glue', region_name="ap-south-1")
+        self.start_crawler = start_crawler
+        self.start_job = start_job
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.sleep = sleep
+        self.clock = clock
+        self.expected = {}
+        self.runs = []
+
+    def _poll(self, key, check):
+        """ Calls check until it returns a value other than None, with adaptive backoff
+
+        :param key: what is being waited for, keys the expected duration
+        :param check: zero argument callable
+        :return: (value, seconds waited)
+        """
+
+        started = self.clock()
+        delay = self.min_delay
+        while True:
+            value = check()
+            elapsed = self.clock() - started
+            if value is not None:
+                self.expected[key] = elapsed
+                return value, elapsed
+            if elapsed > self.timeout:
+                raise StageFailed(key + " did not finish in " + str(self.timeout) + " seconds")
+
+            expected = self.expected.get(key)
+            if expected is not None and elapsed < expected:
+                # close in on the expected finish, halving the remaining gap with every poll
+                wait = max(self.min_delay, (expected - elapsed) / 2)
+            else:
+                wait = delay
+                delay = min(delay * 2, self.max_delay)
+            self.sleep(wait)
+
+    def _start(self, start, *args):
+        # a run left over from an earlier trigger finishes first, then this one starts
+        delay = self.min_delay
+        deadline = self.clock() + self.timeout
+        while True:
+            try:
+                return start(*args)
+            except Exception as e:
+                if not any(code in str(e) for code in BUSY_ERRORS) or self.clock() > deadline:
+                    raise
+                logging.info(f'{args[0]} busy, retrying in {delay} seconds')
+                self.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+
+    def _crawl(self, crawler_name):
+        previous = self.glue_client.get_crawler(Name=crawler_name)['Crawler'].get('LastCrawl', {}).get('StartTime')
+        self._start(self.start_crawler, crawler_name)
+
+        def finished():
+            crawler = self.glue_client.get_crawler(Name=crawler_name)['Crawler']
+            last = crawler.get('LastCrawl', {})
+            if crawler['State'] != 'READY' or last.get('StartTime') == previous:
+                return None
+            return last.get('Status', 'SUCCEEDED')
+
+        status, seconds = self._poll("crawler:" + crawler_name, finished)
+        if status != 'SUCCEEDED':
+            raise StageFailed("crawler " + crawler_name + " finished as " + status)
+        return seconds
+
+    def _run_job(self, job_name, arguments):
+        job_run_id = self._start(self.start_job, job_name, arguments or {})['JobRunId']
+
+        def finished():
+            run = self.glue_client.get_job_run(JobName=job_name, RunId=job_run_id)['JobRun']
+            if run['JobRunState'] not in TERMINAL_JOB_STATES:
+                return None
+            return run['JobRunState'], run.get('ErrorMessage')
+
+        (state, error), seconds = self._poll("job:" + job_name, finished)
+        return job_run_id, state, error, seconds
+
+    def run_stage(self, stage):
+        """ Runs one stage: the crawler, then the job, then the after hook if the job succeeded
+
+        :param stage: Stage
+        :return: StageRun
+        """
+
+        started = self.clock()
+        crawl_seconds = job_seconds = after_seconds = 0.0
+        job_run_id = None
+        try:
+            if stage.crawler is not None:
+                crawl_seconds = self._crawl(stage.crawler)
+            job_run_id, state, error, job_seconds = self._run_job(stage.job, stage.arguments)
+            if state == 'SUCCEEDED' and stage.after is not None:
+                after_started = self.clock()
+                stage.after()
+                after_seconds = self.clock() - after_started
+        except Exception as e:
+            logging.error(e)
+            state, error = 'FAILED', str(e)
+
+        run = StageRun(stage.name, state, job_run_id, crawl_seconds, job_seconds, after_seconds,
+                       self.clock() - started, error)
+        self.runs.append(run)
+        print(stage.name, state, "in", round(run.seconds, 1), "seconds (crawl", round(crawl_seconds, 1),
+              "job", round(job_seconds, 1), ")", job_run_id or "")
+        return run
+
+    def run(self):
+        """ Runs every stage in order, stopping at the first one that does not succeed
+
+        :return: list of StageRun for the stages that ran
+        """
+
+        runs = []
+        for stage in self.stages:
+            run = self.run_stage(stage)
+            runs.append(run)
+            if run.state != 'SUCCEEDED':
+                print("Stopping at", stage.name + ":", run.error)
+                break
+        print("Pipeline took", round(sum(run.seconds for run in runs), 1), "seconds over", len(runs), "stages")
+        return runs
+
+    def latency(self):
+        """ Per stage latency of every run so far
+
+        :return: dict of stage name to list of seconds
+        """
+
+        latencies = {}
+        for run in self.runs:
+            latencies.setdefault(run.name, []).append(run.seconds)
+        return latencies
+
+def event_driven_batches(table_name=Trigger_Coalescer.TABLE_NAME, dynamodb_client=None):
+    """ Names the batches the check Lambdas have recorded. Those Lambdas transform small files themselves and send
+    large ones to the jobs by path, neither of which moves the job bookmarks, so a catalog run of the same jobs
+    would transform every one of those files a second time. The orchestrator refuses to run once any exist
+
+    :param table_name: table of Trigger_Coalescer batches
+    :param dynamodb_client: client to use. If not specified the shared client is used
+    :return: sorted list of batch names, empty if the Lambdas never ran
+    """
+
+    dynamodb_client = dynamodb_client if dynamodb_client is not None else AWS_Clients.get_client('dynamodb')
+    names = set()
+    try:
+        for page in dynamodb_client.get_paginator('scan').paginate(TableName=table_name, ProjectionExpression="batch"):
+            names.update(item['batch']['S'] for item in page.get('Items', []))
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            return []
+        raise
+    return sorted(names)
+
+def promote_all(source_bucket, dest_bucket, prefix, s3_client=None):
+    """ Moves every object of a bucket into the next zone, the way the Shift-to-* Lambdas do per event.
+    Used as a Stage after hook when the orchestrator drives the pipeline instead of S3 events
+
+    :param source_bucket: bucket holding the previous stage's output
+    :param dest_bucket: bucket of the next zone
+    :param prefix: name prefix of the moved objects, see Object_Promotion.promoted_key
+    :param s3_client: client to use. If not specified the shared client is used
+    :return: number of objects moved
+    """
+
+    s3_client = s3_client if s3_client is not None else AWS_Clients.get_client('s3')
+    moved = 0
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=source_bucket):
+        for obj in page.get('Contents', []):
+            # the listing's ETag identifies the object version, the way an event's sequencer does
+            event = S3Object("0", source_bucket, obj['Key'], obj['Size'], obj['ETag'],
+                             obj['LastModified'].strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+            key = Object_Promotion.promoted_key(prefix, event)
+            if Object_Promotion.promote_object(source_bucket, obj['Key'], dest_bucket, key, s3_client) is not None:
+                moved += 1
+    return moved
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(asctime)s: %(message)s')
+
+    # the pipeline is driven either by S3 events through the Lambdas or by this orchestrator, never both
+    batches = event_driven_batches()
+    if batches and "--allow-mixed" not in sys.argv[1:]:
+        print("The Lambdas already drive this pipeline (batches " + ", ".join(batches) + "). Catalog runs would "
+              "transform their files again, pass --allow-mixed to run anyway")
+        exit(1)
+
+    promote_refined = lambda: promote_all(Object_Promotion.SHIFT_TO_REFINED_BUCKET, Object_Promotion.REFINED_BUCKET,
+                                          Object_Promotion.REFINED_PREFIX)
+    if "--fused" in sys.argv[1:]:
+        # one job from raw to refined, skipping the trusted CSV round trip, its Lambdas and the second crawl
+        stages = [Stage("raw-to-refined", "Raw-to-Refined", crawler="Raw", after=promote_refined)]
+    else:
+        stages = [
+            Stage("raw-to-trusted", "Raw-to-Trusted", crawler="Raw",
+                  after=lambda: promote_all(Object_Promotion.SHIFT_TO_TRUSTED_BUCKET, Object_Promotion.TRUSTED_BUCKET,
+                                            Object_Promotion.TRUSTED_PREFIX)),
+            Stage("trusted-to-refined", "Trusted-to-Refined", crawler="Trusted", after=promote_refined),
+        ]
+
+    orchestrator = StageOrchestrator(stages)
+    if any(run.state != 'SUCCEEDED' for run in orchestrator.run()):
+        exit(1)
@@ -0,0 +1,173 @@
+import logging
+import time
+from botocore.exceptions import ClientError
+import AWS_Clients
+import Run_Crawler
+import Run_Glue_Job
+
+TABLE_NAME = "lambda-triggers"
+
+# start errors meaning a run is already in progress, the batch waits for the next trigger instead of failing
+BUSY_ERRORS = ('CrawlerRunningException', 'ConcurrentRunsExceededException')
+ACTIVE_JOB_STATES = ('STARTING', 'RUNNING', 'STOPPING', 'WAITING')
+
+class TriggerCoalescer:
+    """ Collects file arrivals across Lambda invocations and starts one crawler run and one job run per batch.
+    A batch fires once it holds max_files files or max_bytes bytes, or once its first file has waited window
+    seconds. While the crawler or job is still running, arrivals keep accumulating for the next batch.
+    The pending batch is one DynamoDB item updated atomically, so concurrent invocations never lose an arrival
+    and only one of them fires a batch
+
+    :param name: batch name, one per pipeline stage, eg "raw-to-trusted"
+    :param crawler_name: crawler started per batch
+    :param job_name: Glue job started per batch
+    :param window: seconds the oldest arrival waits at most, provided something invokes add or poll after it
+    :param max_files: files that fire a batch
+    :param max_bytes: bytes that fire a batch
+    :param table_name: DynamoDB table keyed on the string attribute batch
+    :param dynamodb_client: client to use. If not specified the shared client is used
+    :param glue_client: client used to check for running crawls and jobs. If not specified the shared client is used
+    :param start_crawler: callable starting a crawler by name, for batches without keys
+    :param start_job: callable starting a Glue job as (name, arguments), returning the StartJobRun response.
+        When the arrivals came with keys, arguments holds them as --input_paths, else it is empty
+    """
+
+    def __init__(self, name, crawler_name, job_name, window=300, max_files=100, max_bytes=1024 ** 3,
+                 table_name=TABLE_NAME, dynamodb_client=None, glue_client=None,
+                 start_crawler=Run_Crawler.start_a_crawler, start_job=Run_Glue_Job.run_glue_job):
+        self.name = name
+        self.crawler_name = crawler_name
+        self.job_name = job_name
+        self.window = window
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.table_name = table_name
+        self.dynamodb_client = dynamodb_client if dynamodb_client is not None else AWS_Clients.get_client('dynamodb')
+        self.glue_client = glue_client if glue_client is not None else AWS_Clients.get_client('glue')
+        self.start_crawler = start_crawler
+        self.start_job = start_job
+
+    def _add(self, files, size, first_arrival, keys=()):
+        update = "ADD files :files, bytes :bytes"
+        values = {':files': {'N': str(files)}, ':bytes': {'N': str(size)}, ':now': {'N': str(first_arrival)}}
+        # a string set cannot be empty, so keys are only added when there are some
+        if keys:
+            update += ", input_keys :keys"
+            values[':keys'] = {'SS': sorted(set(keys))}
+        result = self.dynamodb_client.update_item(
+            TableName=self.table_name,
+            Key={'batch': {'S': self.name}},
+            UpdateExpression=update + " SET first_arrival = if_not_exists(first_arrival, :now)",
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW')
+        return _batch(result['Attributes'])
+
+    def _read(self):
+        result = self.dynamodb_client.get_item(TableName=self.table_name, Key={'batch': {'S': self.name}}, ConsistentRead=True)
+        return _batch(result.get('Item', {}))
+
+    def _take(self):
+        try:
+            result = self.dynamodb_client.update_item(
+                TableName=self.table_name,
+                Key={'batch': {'S': self.name}},
+                UpdateExpression="SET files = :zero, bytes = :zero REMOVE first_arrival, input_keys",
+                ConditionExpression="files > :zero",
+                ExpressionAttributeValues={':zero': {'N': '0'}},
+                ReturnValues='ALL_OLD')
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+            raise
+        return _batch(result['Attributes'])
+
+    def _due(self, batch, now):
+        files, size, first_arrival, keys = batch
+        return files > 0 and (files >= self.max_files or size >= self.max_bytes or now - first_arrival >= self.window)
+
+    def _busy(self, crawl=True):
+        if crawl:
+            crawler = self.glue_client.get_crawler(Name=self.crawler_name)['Crawler']
+            if crawler['State'] in ('RUNNING', 'STOPPING'):
+                return True
+        runs = self.glue_client.get_job_runs(JobName=self.job_name, MaxResults=10)['JobRuns']
+        return any(run['JobRunState'] in ACTIVE_JOB_STATES for run in runs)
+
+    def add(self, files, size, now=None, keys=()):
+        """ Records arrivals and fires the batch if it is due
+
+        :param files: files that arrived
+        :param size: their total size in bytes
+        :param now: epoch seconds, defaults to time.time()
+        :param keys: s3:// paths of the files, so the job reads only them. Batches without keys leave the job to
+            its catalog and bookmark
+        :return: dict describing the fired batch, else None
+        """
+
+        now = time.time() if now is None else now
+        batch = self._add(files, size, now, keys)
+        return self._fire(batch, now) if self._due(batch, now) else None
+
+    def poll(self, now=None):
+        """ Fires the pending batch if its window has passed. Meant for a schedule, so the last files of a burst
+        do not wait for the next arrival
+
+        :param now: epoch seconds, defaults to time.time()
+        :return: dict describing the fired batch, else None
+        """
+
+        now = time.time() if now is None else now
+        batch = self._read()
+        return self._fire(batch, now) if self._due(batch, now) else None
+
+    def _fire(self, batch, now):
+        # a batch naming its files is read by path, so the job neither needs a crawl nor waits for one
+        if self._busy(crawl=not batch[3]):
+            logging.info(f'{self.name}: {batch[0]} files queued until the running crawl or job finishes')
+            return None
+
+        # only the invocation that empties the pending item starts the runs
+        taken = self._take()
+        if taken is None:
+            return None
+        files, size, first_arrival, keys = taken
+
+        try:
+            if not keys:
+                self.start_crawler(self.crawler_name)
+            job_run = self.start_job(self.job_name, {'--input_paths': ",".join(keys)} if keys else {})
+        except Exception as e:
+            self._add(files, size, first_arrival, keys)
+            if any(code in str(e) for code in BUSY_ERRORS):
+                logging.info(f'{self.name}: {files} files queued, {e}')
+                return None
+            raise
+
+        print(self.name, "started", self.job_name if keys else self.crawler_name + " and " + self.job_name,
+              "for", files, "files,", size, "bytes,",
+              "oldest waited", round(now - first_arrival, 1), "seconds")
+        return {'files': files, 'bytes': size, 'job_run_id': job_run.get('JobRunId') if job_run else None}
+
+def _batch(item):
+    return (int(item.get('files', {}).get('N', 0)), int(item.get('bytes', {}).get('N', 0)),
+            float(item.get('first_arrival', {}).get('N', 0)), sorted(item.get('input_keys', {}).get('SS', [])))
+
+def create_table(table_name=TABLE_NAME, dynamodb_client=None):
+    """ Creates the on-demand table holding pending batches
+
+    :param table_name: table to create
+    :param dynamodb_client: client to use. If not specified the shared client is used
+    :return: True if creation was started, else False
+    """
+
+    dynamodb_client = dynamodb_client if dynamodb_client is not None else AWS_Clients.get_client('dynamodb')
+    try:
+        dynamodb_client.create_table(
+            TableName=table_name,
+            AttributeDefinitions=[{'AttributeName': 'batch', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'batch', 'KeyType': 'HASH'}],
+            BillingMode='PAY_PER_REQUEST')
+    except ClientError as e:
+        logging.error(e)
+        return False
+    return True
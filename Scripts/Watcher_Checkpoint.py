@@ -0,0 +1,88 @@
+import os
+
+CHECKPOINT_NAME = ".file_watcher.checkpoint"
+
+class WatcherCheckpoint:
+    """ On-disk record of files already uploaded, keyed by name, size and mtime.
+
+    The file is an append-only log of tab separated <name> <size> <mtime> lines. Each upload appends and
+    fsyncs one line, so a crash can at most leave a torn last line, which is ignored on load. Superseded
+    lines are compacted away at startup by writing a fresh log and renaming it over the old one.
+
+    :param path: location of the checkpoint file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._load()
+        self._log = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        lines = 0
+        damaged = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    try:
+                        if len(fields) != 3 or not line.endswith("\n"):
+                            raise ValueError(line)
+                        self.entries[fields[0]] = (int(fields[1]), float(fields[2]))
+                    except ValueError:
+                        damaged = True
+                        continue
+                    lines += 1
+        except FileNotFoundError:
+            return
+
+        #a torn line must be dropped before appending again, otherwise the next entry would be glued onto it
+        if damaged or lines > len(self.entries):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for name, (size, mtime) in self.entries.items():
+                f.write(name + "\t" + str(size) + "\t" + repr(mtime) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def is_ingested(self, record):
+        """ Tests to see if this exact version of the file was uploaded before
+
+        :param record: File_Scanner.FileRecord
+        :return: True if name, size and mtime all match the checkpoint
+        """
+
+        return self.entries.get(record.name) == (record.size, record.mtime)
+
+    def pending(self, records):
+        """ Filters records down to the ones not yet uploaded
+
+        :param records: iterable of File_Scanner.FileRecord
+        :return: list of records that still need uploading
+        """
+
+        return [record for record in records if not self.is_ingested(record)]
+
+    def mark_ingested(self, record):
+        """ Durably records a successful upload
+
+        :param record: File_Scanner.FileRecord that was uploaded
+        """
+
+        self.entries[record.name] = (record.size, record.mtime)
+        self._log.write(record.name + "\t" + str(record.size) + "\t" + repr(record.mtime) + "\n")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def close(self):
+        self._log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
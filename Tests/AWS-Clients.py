@@ -0,0 +1,63 @@
+import AWS_Clients
+from AWS_Clients import TTLCache, get_client
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import unittest
+
+class TestGetClient(unittest.TestCase):
+    def test_sameKey_SameClient(self):
+        first = get_client('s3', region_name='ap-south-1')
+        self.assertIs(get_client('s3', region_name='ap-south-1'), first)
+        self.assertEqual(first.meta.config.max_pool_connections, AWS_Clients.DEFAULT_MAX_POOL_CONNECTIONS)
+
+    def test_threads_ShareOneClient(self):
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            clients = list(executor.map(lambda _: get_client('glue', region_name='ap-south-1'), range(64)))
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+    def test_poolSize_DistinctClient(self):
+        default = get_client('s3', region_name='ap-south-1')
+        large = get_client('s3', region_name='ap-south-1', max_pool_connections=64)
+        self.assertIsNot(large, default)
+        self.assertEqual(large.meta.config.max_pool_connections, 64)
+        self.assertIsNot(get_client('s3', region_name='us-east-1'), default)
+
+class TestTTLCache(unittest.TestCase):
+    def test_entry_ExpiresAfterTTL(self):
+        cache = TTLCache(300)
+        now = [1000.0]
+        loads = []
+        def loader():
+            loads.append(now[0])
+            return "arn:" + str(len(loads))
+
+        with mock.patch.object(AWS_Clients.time, "monotonic", lambda: now[0]):
+            self.assertEqual(cache.get_or_load("key", loader), "arn:1")
+            now[0] += 299
+            self.assertEqual(cache.get_or_load("key", loader), "arn:1")
+            now[0] += 1
+            self.assertEqual(cache.get_or_load("key", loader), "arn:2")
+        self.assertEqual(loads, [1000.0, 1300.0])
+
+    def test_none_NotCached(self):
+        cache = TTLCache(300)
+        results = iter([None, True])
+        self.assertIsNone(cache.get_or_load("bucket", lambda: next(results)))
+        self.assertTrue(cache.get_or_load("bucket", lambda: next(results)))
+        self.assertTrue(cache.get_or_load("bucket", lambda: self.fail("cached value not used")))
+
+    def test_invalidate_OneOrAll(self):
+        cache = TTLCache(300)
+        cache.get_or_load("a", lambda: 1)
+        cache.get_or_load("b", lambda: 2)
+
+        cache.invalidate("a")
+        self.assertEqual(cache.get_or_load("a", lambda: 10), 10)
+        self.assertEqual(cache.get_or_load("b", lambda: 20), 2)
+
+        cache.invalidate()
+        self.assertEqual(cache.get_or_load("a", lambda: 30), 30)
+        self.assertEqual(cache.get_or_load("b", lambda: 40), 40)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
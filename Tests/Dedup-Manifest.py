@@ -0,0 +1,61 @@
+from Dedup_Manifest import DedupManifest, hash_file
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+
+class TestDedupManifest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "manifest.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_hashFile_MatchesSha256(self):
+        content = os.urandom(3 * 1024 + 17)
+        file_path = os.path.join(self.dir.name, "data.csv")
+        with open(file_path, "wb") as f:
+            f.write(content)
+
+        self.assertEqual(hash_file(file_path, chunk_size=1024), hashlib.sha256(content).hexdigest())
+
+    def test_add_FirstNameWins(self):
+        with DedupManifest(self.path) as manifest:
+            self.assertIsNone(manifest.contains("abc"))
+            manifest.add("abc", 10, "first.csv")
+            manifest.add("abc", 10, "second.csv")
+            self.assertEqual(manifest.contains("abc"), "first.csv")
+            self.assertEqual(len(manifest), 1)
+
+    def test_reopen_KeepsEntries(self):
+        with DedupManifest(self.path) as manifest:
+            manifest.add("abc", 10, "first.csv")
+        with DedupManifest(self.path) as manifest:
+            self.assertEqual(manifest.contains("abc"), "first.csv")
+            self.assertEqual(len(manifest), 1)
+
+    def test_contains_FastWithMillionEntries(self):
+        entries = 1000000
+        with DedupManifest(self.path) as manifest:
+            with manifest._connection:
+                manifest._connection.executemany(
+                    "INSERT INTO content (hash, size, name, uploaded) VALUES (?, ?, ?, 0)",
+                    ((hashlib.sha256(str(i).encode()).hexdigest(), i, str(i) + ".csv") for i in range(entries)))
+            self.assertEqual(len(manifest), entries)
+
+            lookups = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(0, entries, 100)]
+            misses = [hashlib.sha256(("missing" + str(i)).encode()).hexdigest() for i in range(len(lookups))]
+            started = time.perf_counter()
+            found = [manifest.contains(digest) for digest in lookups]
+            missed = [manifest.contains(digest) for digest in misses]
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(found[-1], str(entries - 100) + ".csv")
+        self.assertEqual(missed, [None] * len(misses))
+        # 20000 index probes, a full scan per lookup would take minutes
+        self.assertLess(elapsed, 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+from Directory_Notifier import DirectoryNotifier, InotifyUnavailable, IN_CLOSE_WRITE
+from File_Watcher import eventWatcher, pollingWatcher
+from unittest import mock
+import File_Watcher
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+FILE_NAME = "aanchal_flt_ind_20220707_180150.csv"
+
+class StopWatching(Exception):
+    pass
+
+class BoundedNotifier:
+    """Stops eventWatcher once no event arrives within the timeout instead of blocking forever"""
+
+    def __init__(self, notifier, timeout=2):
+        self.notifier = notifier
+        self.timeout = timeout
+
+    def read_events(self, timeout=None):
+        events = self.notifier.read_events(self.timeout if timeout is None else timeout)
+        if timeout is None and not events:
+            raise StopWatching()
+        return events
+
+def open_notifier(test, path):
+    try:
+        return DirectoryNotifier(path)
+    except InotifyUnavailable as e:
+        test.skipTest(str(e))
+
+def write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+class TestDirectoryNotifier(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_createAndClose_OneEvent(self):
+        with open_notifier(self, self.dir.name) as notifier:
+            write(os.path.join(self.dir.name, FILE_NAME), "row\n")
+            events = notifier.read_events(timeout=2)
+            events += notifier.read_events(timeout=0.2)
+
+        self.assertEqual(events, [(IN_CLOSE_WRITE, FILE_NAME)])
+
+    def test_rewriteSeenName_IngestedAgain(self):
+        path = os.path.join(self.dir.name, FILE_NAME)
+        batches = []
+        def ingest(records):
+            records = list(records)
+            batches.append(records)
+            if len(batches) == 1:
+                write(path, "row\n")
+            elif len(batches) == 2:
+                write(path, "row\nrewritten row\n")
+
+        with open_notifier(self, self.dir.name) as notifier, contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(StopWatching):
+                eventWatcher(self.dir.name, BoundedNotifier(notifier), ingest, settleTime=0.2)
+
+        self.assertEqual([[record.name for record in batch] for batch in batches], [[], [FILE_NAME], [FILE_NAME]])
+        self.assertEqual([batch[0].size for batch in batches[1:]], [4, 18])
+
+    def test_pollingRewriteSeenName_IngestedAgain(self):
+        path = os.path.join(self.dir.name, FILE_NAME)
+        write(path, "row\n")
+        batches = []
+        rewrites = iter([lambda: write(path, "row\nrewritten row\n"), lambda: None])
+        def sleep(seconds):
+            rewrite = next(rewrites, None)
+            if rewrite is None:
+                raise StopWatching()
+            rewrite()
+
+        with mock.patch.object(File_Watcher.time, "sleep", sleep), contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(StopWatching):
+                pollingWatcher(self.dir.name, 100, lambda records: batches.append(list(records)))
+
+        # the unchanged file on the last scan is not reported again
+        self.assertEqual([[record.size for record in batch] for batch in batches], [[4], [18]])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
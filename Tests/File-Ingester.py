@@ -0,0 +1,145 @@
+from File_Ingester import ConcurrentDataIngester
+from File_Scanner import FileRecord
+from Dedup_Manifest import DedupManifest
+from Watcher_Checkpoint import WatcherCheckpoint
+from botocore.exceptions import ClientError
+from unittest import mock
+import AWS_Clients
+import Ingest_Format
+import Multipart_Upload
+import json
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+class FakeS3:
+    def __init__(self, buckets=("raw-lambda-poc",), failing=()):
+        self.buckets = buckets
+        self.failing = failing
+        self.uploads = {}
+        self.aborted = []
+        self.lock = threading.Lock()
+
+    def head_bucket(self, Bucket):
+        if Bucket not in self.buckets:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadBucket')
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        if Key in self.failing:
+            raise ClientError({'Error': {'Code': 'SlowDown', 'Message': 'Please reduce your request rate'}}, 'PutObject')
+        with open(Filename, "rb") as f, self.lock:
+            self.uploads[(Bucket, Key)] = f.read()
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self.lock:
+            self.aborted.append(UploadId)
+
+class TestConcurrentDataIngester(unittest.TestCase):
+    def setUp(self):
+        AWS_Clients.metadata_cache.invalidate()
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        AWS_Clients.metadata_cache.invalidate()
+        self.dir.cleanup()
+
+    def record(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        stat = os.stat(path)
+        return FileRecord(name, path, "flt", "ind", "20220707", "180156", stat.st_size, stat.st_mtime)
+
+    def ingest(self, files, s3, **kwargs):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            results = ConcurrentDataIngester(files, concurrency=4, s3_client=s3, **kwargs)
+        return {result.name: result for result in results}, output.getvalue()
+
+    def test_partialFailure_OthersUploadedAndOnlySuccessCheckpointed(self):
+        files = [self.record("aanchal_flt_ind_20220707_18015%d.csv" % i, "row %d\n" % i) for i in range(3)]
+        s3 = FakeS3(failing=(files[1].name,))
+        checkpoint = WatcherCheckpoint(os.path.join(self.dir.name, "checkpoint"))
+
+        results, output = self.ingest(files, s3, checkpoint=checkpoint)
+        self.assertTrue(results[files[0].name].success)
+        self.assertFalse(results[files[1].name].success)
+        self.assertIn("SlowDown", results[files[1].name].error)
+        self.assertTrue(results[files[2].name].success)
+        self.assertEqual(sorted(key for _, key in s3.uploads), [files[0].name, files[2].name])
+        self.assertEqual([checkpoint.is_ingested(record) for record in files], [True, False, True])
+        self.assertIn("Upload failed for " + files[1].name, output)
+        checkpoint.close()
+
+    def test_duplicateInBatch_UploadedOnce(self):
+        files = [self.record("aanchal_flt_ind_20220707_180150.csv", "same\n"),
+                 self.record("aanchal_flt_ind_20220707_180151.csv", "same\n")]
+        s3 = FakeS3()
+        checkpoint = WatcherCheckpoint(os.path.join(self.dir.name, "checkpoint"))
+        with DedupManifest(os.path.join(self.dir.name, "manifest")) as manifest:
+            results, _ = self.ingest(files, s3, checkpoint=checkpoint, manifest=manifest)
+            self.assertEqual(len(manifest), 1)
+
+        skipped = [result for result in results.values() if result.skipped]
+        self.assertEqual(len(skipped), 1)
+        self.assertEqual(skipped[0].error, "Duplicate of a file in this batch")
+        self.assertEqual(len(s3.uploads), 1)
+        # only the uploaded twin is checkpointed, the skipped one is retried if that upload had failed
+        self.assertEqual(sorted(checkpoint.is_ingested(record) for record in files), [False, True])
+        checkpoint.close()
+
+    def test_throughput_Reported(self):
+        files = [self.record("aanchal_flt_ind_20220707_18015%d.csv" % i, "x" * 1024) for i in range(2)]
+        _, output = self.ingest(files, FakeS3())
+        self.assertRegex(output, r"Uploaded 2 of 2 files in [\d.]+ seconds: [\d.]+ files/s, [\d.]+ MB/s")
+
+    def test_missingBucket_FailsEveryFileWithoutExiting(self):
+        files = [self.record("aanchal_flt_ind_20220707_18015%d.csv" % i, "row\n") for i in range(2)]
+        results, _ = self.ingest(files, FakeS3(buckets=()))
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(not result.success and "was not found" in result.error for result in results.values()))
+
+    def test_largeFile_ResumableMultipart(self):
+        files = [self.record("aanchal_flt_ind_20220707_180150.csv", "small\n"),
+                 self.record("aanchal_flt_ind_20220707_180151.csv", "x" * 64),
+                 self.record("aanchal_flt_ind_20220707_180152.csv", "y" * 64)]
+        s3 = FakeS3()
+        large = []
+        def upload_large_file(file_name, bucket, object_name, *args):
+            large.append(object_name)
+            return object_name != files[2].name
+
+        with mock.patch.object(Multipart_Upload, "LARGE_FILE_THRESHOLD", 32), \
+                mock.patch.object(Multipart_Upload, "upload_large_file", upload_large_file):
+            results, _ = self.ingest(files, s3)
+
+        self.assertEqual(sorted(large), [files[1].name, files[2].name])
+        self.assertEqual([key for _, key in s3.uploads], [files[0].name])
+        self.assertEqual([results[record.name].success for record in files], [True, True, False])
+        self.assertIn("interrupted", results[files[2].name].error)
+
+    def test_convertedLargeFile_UploadAbortedAndStateRemoved(self):
+        files = [self.record("aanchal_flt_ind_20220707_180150.csv", "a,b\n" + "1,2\n" * 64)]
+        s3 = FakeS3()
+        state_paths = []
+        def upload_large_file(file_name, bucket, object_name, part_size, part_concurrency, progress_callback, s3_client,
+                              state_path):
+            state_paths.append(state_path)
+            with open(state_path, "w") as f:
+                json.dump({"bucket": bucket, "key": object_name, "upload_id": "upload-0"}, f)
+            return False
+
+        with mock.patch.object(Multipart_Upload, "LARGE_FILE_THRESHOLD", 1), \
+                mock.patch.object(Multipart_Upload, "upload_large_file", upload_large_file):
+            results, _ = self.ingest(files, s3, ingest_format=Ingest_Format.CSV_GZIP)
+
+        self.assertFalse(results[files[0].name].success)
+        self.assertEqual(os.path.dirname(state_paths[0]), self.dir.name)
+        self.assertFalse(os.path.exists(state_paths[0]))
+        self.assertEqual(s3.aborted, ["upload-0"])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,43 @@
+from File_Scanner import scan_directory, parse_file_name
+import os
+import tempfile
+import unittest
+
+class TestFileScanner(unittest.TestCase):
+    def test_parse_AcceptedName(self):
+        res = parse_file_name("aanchal_flt_ind_20220707_180156.csv")
+
+        self.assertEqual(res.group("source"), "flt")
+        self.assertEqual(res.group("location"), "ind")
+        self.assertEqual(res.group("date"), "20220707")
+        self.assertEqual(res.group("time"), "180156")
+
+    def test_parse_RejectedNames(self):
+        rejected = ["aanchal_flt_ind_20220707_180156.tsv",
+                    "aanchal_flt_ind_20220707_180156.csv.bak",
+                    "aanchal_flt_ind_20220230_180156.csv",
+                    "aanchal_flt_ind_20210229_180156.csv",
+                    "aanchal_flt_ind_20220707_246000.csv",
+                    "aanchal_flight_ind_20220707_180156.csv"]
+
+        for name in rejected:
+            self.assertIsNone(parse_file_name(name), name)
+
+        self.assertIsNotNone(parse_file_name("aanchal_flt_ind_20240229_000000.txt"))
+
+    def test_scan_Directory(self):
+        with tempfile.TemporaryDirectory() as my_dir:
+            for name in ["aanchal_flt_ind_20220707_180156.csv", "notes.txt", "aanchal_flt_ind_20220707_180157.txt"]:
+                with open(os.path.join(my_dir, name), "w") as f:
+                    f.write("a,b\n")
+            os.mkdir(os.path.join(my_dir, "aanchal_flt_ind_20220707_180158.csv"))
+
+            records = sorted(scan_directory(my_dir))
+
+        self.assertEqual([record.name for record in records],
+                         ["aanchal_flt_ind_20220707_180156.csv", "aanchal_flt_ind_20220707_180157.txt"])
+        self.assertEqual(records[0].size, 4)
+        self.assertEqual(records[0].location, "ind")
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
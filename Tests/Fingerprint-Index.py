@@ -0,0 +1,83 @@
+from Fingerprint_Index import FingerprintIndex, backfill
+from botocore.exceptions import ClientError
+import unittest
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'operation')
+
+class FakeDynamoDB:
+    def __init__(self):
+        self.items = {}
+        self.requests = 0
+
+    def put_item(self, TableName, Item, ConditionExpression, ExpressionAttributeValues):
+        self.requests += 1
+        current = self.items.get(Item['fingerprint']['S'])
+        if ConditionExpression.startswith("attribute_not_exists"):
+            allowed = current is None or current['object_key'] == ExpressionAttributeValues[':key']
+        else:
+            allowed = current is not None and current['object_key'] == ExpressionAttributeValues[':owner']
+        if not allowed:
+            raise client_error('ConditionalCheckFailedException')
+        self.items[Item['fingerprint']['S']] = Item
+
+    def get_item(self, TableName, Key, ConsistentRead):
+        self.requests += 1
+        item = self.items.get(Key['fingerprint']['S'])
+        return {'Item': item} if item else {}
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise client_error('404')
+        return self.objects[Key]
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket):
+        keys = sorted(self.objects)
+        for start in range(0, len(keys), 1000):
+            yield {'Contents': [dict(self.objects[key], Key=key) for key in keys[start:start + 1000]]}
+
+class TestFingerprintIndex(unittest.TestCase):
+    def test_claim_DuplicateInOneLookup(self):
+        dynamodb = FakeDynamoDB()
+        index = FingerprintIndex("fingerprints", dynamodb, FakeS3({"a.csv": {}}))
+
+        self.assertIsNone(index.claim("raw", "a.csv", '"abc"', 10))
+        self.assertIsNone(index.claim("raw", "a.csv", 'abc', 10))
+        self.assertIsNone(index.claim("raw", "c.csv", 'abc', 11))
+        self.assertIsNone(index.claim("trusted", "c.csv", 'abc', 10))
+
+        dynamodb.requests = 0
+        self.assertEqual(index.claim("raw", "b.csv", 'abc', 10), "a.csv")
+        self.assertEqual(dynamodb.requests, 2)
+
+    def test_claim_OriginalDeleted(self):
+        s3 = FakeS3({"a.csv": {}})
+        index = FingerprintIndex("fingerprints", FakeDynamoDB(), s3)
+
+        index.claim("raw", "a.csv", 'abc', 10)
+        del s3.objects["a.csv"]
+        self.assertIsNone(index.claim("raw", "b.csv", 'abc', 10))
+        s3.objects["b.csv"] = {}
+        self.assertEqual(index.claim("raw", "a.csv", 'abc', 10), "b.csv")
+
+    def test_backfill_PaginatesAndRemovesDuplicates(self):
+        objects = {"file%05d.csv" % i: {'ETag': '"%d"' % (i % 2000), 'Size': 10} for i in range(2500)}
+        s3 = FakeS3(objects)
+        index = FingerprintIndex("fingerprints", FakeDynamoDB(), s3)
+
+        self.assertEqual(backfill("raw", index, delete_duplicates=True), (2000, 500))
+        self.assertEqual(len(s3.objects), 2000)
+        self.assertEqual(backfill("raw", index), (2000, 0))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,116 @@
+from Firehose_Producer import FirehoseProducer, row_to_json, MAX_BATCH_BYTES
+from Setup import firehose_s3_config
+import json
+import unittest
+
+class FakeFirehose:
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.requests = []
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        self.requests.append(list(Records))
+        entries = []
+        for record in Records:
+            if self.fail_first:
+                self.fail_first -= 1
+                entries.append({'ErrorCode': 'ServiceUnavailableException', 'ErrorMessage': 'slow down'})
+            else:
+                entries.append({'RecordId': '1'})
+        return {'FailedPutCount': sum('ErrorCode' in entry for entry in entries), 'RequestResponses': entries}
+
+class TestFirehoseProducer(unittest.TestCase):
+    def test_batch_Limits(self):
+        client = FakeFirehose()
+        with FirehoseProducer("firehose_test_stream", client) as producer:
+            for i in range(1200):
+                producer.put(b"row,%d" % i)
+
+        self.assertEqual([len(request) for request in client.requests], [500, 500, 200])
+        self.assertTrue(all(record['Data'].endswith(b"\n") for record in client.requests[0]))
+
+        client = FakeFirehose()
+        with FirehoseProducer("firehose_test_stream", client) as producer:
+            for i in range(10):
+                producer.put(b"x" * (900 * 1024))
+        self.assertTrue(all(sum(len(record['Data']) for record in request) <= MAX_BATCH_BYTES for request in client.requests))
+
+    def test_retry_OnlyFailedEntries(self):
+        client = FakeFirehose(fail_first=3)
+        producer = FirehoseProducer("firehose_test_stream", client, base_delay=0)
+        for i in range(10):
+            producer.put("row,%d\n" % i)
+
+        self.assertEqual(producer.flush(), 0)
+        self.assertEqual([len(request) for request in client.requests], [10, 3])
+        self.assertEqual(producer.records_sent, 10)
+        self.assertEqual(producer.throttled_records, 3)
+
+    def test_json_Rows(self):
+        client = FakeFirehose()
+        with FirehoseProducer("firehose_test_stream", client, as_json=True) as producer:
+            producer.put(b"FL_DATE,OP_CARRIER,OP_CARRIER_FL_NUM\n")
+            producer.put(b"2018-01-01,UA,2429,EWR,DEN,1517,1512.0,-5.0,,\n")
+
+        self.assertEqual(producer.skipped_rows, 1)
+        row = json.loads(client.requests[0][0]['Data'])
+        self.assertEqual(row['op_carrier'], "UA")
+        self.assertNotIn('taxi_out', row)
+        self.assertIsNone(row_to_json(b"\n"))
+
+    def test_json_StrRowsConvertedLikeBytes(self):
+        client = FakeFirehose()
+        with FirehoseProducer("firehose_test_stream", client, as_json=True) as producer:
+            producer.put(b"2018-01-01,UA,2429,EWR,DEN\n")
+            producer.put("2018-01-01,UA,2429,EWR,DEN\n")
+            producer.put({'op_carrier': "AA"})
+
+        self.assertEqual(client.requests[0][0]['Data'], client.requests[0][1]['Data'])
+        self.assertEqual(json.loads(client.requests[0][1]['Data'])['dest'], "DEN")
+        self.assertEqual(client.requests[0][2]['Data'], b'{"op_carrier":"AA"}\n')
+
+    def test_stats_CountersAndFailures(self):
+        client = FakeFirehose(fail_first=10)
+        producer = FirehoseProducer("firehose_test_stream", client, max_attempts=2, base_delay=0)
+        for i in range(6):
+            producer.put(b"row,%d" % i)
+
+        self.assertEqual(producer.flush(), 4)
+        stats = producer.stats()
+        self.assertEqual((stats['records_sent'], stats['rows_sent'], stats['failed_rows']), (2, 2, 4))
+        self.assertEqual(stats['throttled_records'], 10)
+        self.assertEqual(stats['skipped_rows'], 0)
+
+class TestFirehoseConfig(unittest.TestCase):
+    def test_config_Compression(self):
+        config = firehose_s3_config("arn:aws:s3:::bucket", "role")
+        self.assertEqual(config['CompressionFormat'], 'GZIP')
+        self.assertEqual(config['BufferingHints'], {'SizeInMBs': 128, 'IntervalInSeconds': 300})
+        self.assertRaises(ValueError, firehose_s3_config, "arn:aws:s3:::bucket", "role", compression='LZ4')
+
+    def test_config_ParquetAndPartitions(self):
+        config = firehose_s3_config("arn:aws:s3:::bucket", "role", glue_database="lambdaCatalog", glue_table="flights",
+                                    partition_fields=("fl_date", "op_carrier"))
+
+        self.assertEqual(config['CompressionFormat'], 'UNCOMPRESSED')
+        conversion = config['DataFormatConversionConfiguration']
+        self.assertEqual(conversion['OutputFormatConfiguration']['Serializer']['ParquetSerDe']['Compression'], 'SNAPPY')
+        self.assertEqual(conversion['SchemaConfiguration']['TableName'], "flights")
+        self.assertEqual(config['Prefix'], 'fl_date=!{partitionKeyFromQuery:fl_date}/op_carrier=!{partitionKeyFromQuery:op_carrier}/')
+        query = config['ProcessingConfiguration']['Processors'][0]['Parameters'][0]['ParameterValue']
+        self.assertEqual(query, '{fl_date: .fl_date, op_carrier: .op_carrier}')
+        self.assertRaises(ValueError, firehose_s3_config, "arn:aws:s3:::bucket", "role", buffer_size_mb=16, partition_fields=("fl_date",))
+
+    def test_config_Processors(self):
+        def processors(**options):
+            config = firehose_s3_config("arn:aws:s3:::bucket", "role", partition_fields=("fl_date",), **options)
+            return [(processor['Type'], processor['Parameters'][0]) for processor in config['ProcessingConfiguration']['Processors']]
+
+        extraction = ('MetadataExtraction', {'ParameterName': 'MetadataExtractionQuery', 'ParameterValue': '{fl_date: .fl_date}'})
+        self.assertEqual(processors(), [extraction])
+        self.assertEqual(processors(split_json_records=True),
+                         [('RecordDeAggregation', {'ParameterName': 'SubRecordType', 'ParameterValue': 'JSON'}), extraction])
+        self.assertNotIn('ProcessingConfiguration', firehose_s3_config("arn:aws:s3:::bucket", "role", split_json_records=True))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+import Ingest_Format
+from Ingest_Format import partition_key, prepare_upload, gzip_csv, csv_to_parquet
+import gzip
+import os
+import tempfile
+import unittest
+import pyarrow.parquet as pq
+
+NAME = "aanchal_flt_ind_20220707_180156.csv"
+
+class TestIngestFormat(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, NAME)
+        with open(self.path, "w") as f:
+            f.write("FL_DATE,CANCELLATION_CODE,AIR_TIME\n")
+            f.write("2018-01-01,,268.0\n" * 20000)
+            # the sparse column's first value, far past the first block
+            f.write("2018-01-02,A,\n")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_partitionKey_FromFileName(self):
+        self.assertEqual(partition_key(NAME), "source=flt/location=ind/date=20220707/" + NAME)
+        self.assertEqual(partition_key(NAME, ".parquet"),
+                         "source=flt/location=ind/date=20220707/aanchal_flt_ind_20220707_180156.parquet")
+        self.assertEqual(partition_key("notes.csv", ".csv.gz"), "notes.csv.gz")
+
+    def test_gzipCsv_RoundTrip(self):
+        out_path = os.path.join(self.dir.name, "out.csv.gz")
+        gzip_csv(self.path, out_path)
+        with open(self.path, "rb") as source, gzip.open(out_path, "rb") as target:
+            self.assertEqual(source.read(), target.read())
+
+    def test_csvToParquet_SparseColumnAfterFirstBlock(self):
+        out_path = os.path.join(self.dir.name, "out.parquet")
+        block_size = Ingest_Format.PARQUET_BLOCK_SIZE
+        Ingest_Format.PARQUET_BLOCK_SIZE = 64 * 1024
+        try:
+            csv_to_parquet(self.path, out_path)
+        finally:
+            Ingest_Format.PARQUET_BLOCK_SIZE = block_size
+
+        parquet = pq.ParquetFile(out_path)
+        self.assertGreater(parquet.num_row_groups, 1)
+        table = parquet.read()
+        self.assertEqual(table.num_rows, 20001)
+        self.assertEqual(str(table.schema.field("CANCELLATION_CODE").type), "string")
+        self.assertEqual(table.column("CANCELLATION_CODE").to_pylist()[-1], "A")
+
+    def test_csvToParquet_HeaderOnly(self):
+        path = os.path.join(self.dir.name, "empty.csv")
+        with open(path, "w") as f:
+            f.write("FL_DATE,AIR_TIME\n")
+        out_path = os.path.join(self.dir.name, "empty.parquet")
+        csv_to_parquet(path, out_path)
+        self.assertEqual(pq.read_table(out_path).num_rows, 0)
+
+    def test_prepareUpload_Formats(self):
+        self.assertEqual(prepare_upload(self.path, Ingest_Format.RAW), (self.path, partition_key(NAME), None))
+
+        upload_path, key, tmp_path = prepare_upload(self.path, Ingest_Format.CSV_GZIP)
+        try:
+            self.assertEqual(upload_path, tmp_path)
+            self.assertEqual(key, "source=flt/location=ind/date=20220707/" + NAME + ".gz")
+        finally:
+            os.remove(tmp_path)
+
+        upload_path, key, tmp_path = prepare_upload(self.path, Ingest_Format.PARQUET)
+        try:
+            self.assertTrue(key.endswith("_180156.parquet"))
+            self.assertEqual(pq.read_table(upload_path).num_rows, 20001)
+        finally:
+            os.remove(tmp_path)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
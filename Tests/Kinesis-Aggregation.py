@@ -0,0 +1,47 @@
+from Kinesis_Aggregation import RecordAggregator, deaggregate, iter_rows, is_aggregated
+from Kinesis_Producer import KinesisProducer
+import unittest
+
+class FakeKinesis:
+    def __init__(self):
+        self.records = []
+
+    def put_records(self, StreamName, Records):
+        self.records.extend(Records)
+        return {'FailedRecordCount': 0, 'Records': [{'SequenceNumber': '1'} for record in Records]}
+
+class TestKinesisAggregation(unittest.TestCase):
+    def test_roundtrip_TargetSize(self):
+        aggregator = RecordAggregator(target_size=4096)
+        rows = [("row,%d,AA,DEL,BOM\n" % i).encode() for i in range(1000)]
+
+        aggregates = []
+        for i, row in enumerate(rows):
+            completed = aggregator.add(row, "key-%d" % (i % 3))
+            if completed is not None:
+                aggregates.append(completed)
+        aggregates.append(aggregator.flush())
+
+        for data, partition_key, count in aggregates:
+            self.assertLessEqual(len(data), 4096)
+            self.assertTrue(is_aggregated(data))
+        self.assertEqual(sum(count for _, _, count in aggregates), 1000)
+        self.assertEqual(list(iter_rows((data, key) for data, key, _ in aggregates)), rows)
+        self.assertEqual(deaggregate(aggregates[0][0])[1], ("key-1", rows[1]))
+
+    def test_deaggregate_PlainRecord(self):
+        self.assertEqual(deaggregate(b"plain,row\n", "flt"), [("flt", b"plain,row\n")])
+
+    def test_producer_RowsPerRecord(self):
+        client = FakeKinesis()
+        with KinesisProducer("kinesis_test_stream", client, aggregate=True) as producer:
+            for i in range(5000):
+                producer.put(b"2022,7,7,AI,101,DEL,BOM,12,%d\n" % i)
+
+        self.assertEqual(producer.rows_sent, 5000)
+        self.assertLess(producer.records_sent, 50)
+        self.assertEqual(len(list(iter_rows((r['Data'], r['PartitionKey']) for r in client.records))), 5000)
+        self.assertGreater(len({r['PartitionKey'] for r in client.records}), 1)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
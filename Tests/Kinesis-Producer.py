@@ -0,0 +1,85 @@
+from Kinesis_Producer import BatchProducer, KinesisProducer, MAX_BATCH_RECORDS, MAX_BATCH_BYTES
+from botocore.exceptions import ClientError
+import unittest
+
+class FakeKinesis:
+    def __init__(self, fail_first=0, errors=()):
+        self.fail_first = fail_first
+        self.errors = list(errors)
+        self.requests = []
+
+    def put_records(self, StreamName, Records):
+        self.requests.append(list(Records))
+        if self.errors:
+            raise ClientError({'Error': {'Code': self.errors.pop(0), 'Message': ''}}, 'PutRecords')
+        entries = []
+        for record in Records:
+            if self.fail_first:
+                self.fail_first -= 1
+                entries.append({'ErrorCode': 'ProvisionedThroughputExceededException', 'ErrorMessage': 'slow down'})
+            else:
+                entries.append({'SequenceNumber': '1', 'ShardId': 'shardId-000000000000'})
+        return {'FailedRecordCount': sum('ErrorCode' in entry for entry in entries), 'Records': entries}
+
+class TestKinesisProducer(unittest.TestCase):
+    def test_batch_RecordLimit(self):
+        client = FakeKinesis()
+        with KinesisProducer("kinesis_test_stream", client) as producer:
+            for i in range(1200):
+                producer.put(b"row,%d\n" % i)
+
+        self.assertEqual([len(request) for request in client.requests], [500, 500, 200])
+        self.assertEqual(producer.records_sent, 1200)
+        self.assertGreater(len({record['PartitionKey'] for record in client.requests[0]}), 1)
+
+    def test_batch_ByteLimit(self):
+        client = FakeKinesis()
+        with KinesisProducer("kinesis_test_stream", client) as producer:
+            for i in range(12):
+                producer.put(b"x" * (1000 * 1000), "flt")
+
+        for request in client.requests:
+            self.assertLessEqual(len(request), MAX_BATCH_RECORDS)
+            self.assertLessEqual(sum(len(record['Data']) + len(record['PartitionKey']) for record in request), MAX_BATCH_BYTES)
+        self.assertEqual(producer.records_sent, 12)
+
+    def test_retry_OnlyFailedEntries(self):
+        client = FakeKinesis(fail_first=3)
+        producer = KinesisProducer("kinesis_test_stream", client, base_delay=0)
+        for i in range(10):
+            producer.put(b"row,%d\n" % i)
+
+        self.assertEqual(producer.flush(), 0)
+        self.assertEqual([len(request) for request in client.requests], [10, 3])
+        self.assertEqual(client.requests[1][0]['Data'], b"row,0\n")
+        self.assertEqual(producer.throttled_records, 3)
+
+    def test_put_ReturnsAutoFlushFailures(self):
+        client = FakeKinesis(fail_first=2)
+        producer = KinesisProducer("kinesis_test_stream", client, max_attempts=1)
+        results = [producer.put(b"row,%d\n" % i) for i in range(MAX_BATCH_RECORDS + 1)]
+
+        self.assertEqual(results[:-1], [0] * MAX_BATCH_RECORDS)
+        self.assertEqual(results[-1], 2)
+        self.assertEqual(producer.failed_rows, 2)
+        self.assertEqual(producer.flush(), 0)
+        self.assertEqual(producer.records_sent, MAX_BATCH_RECORDS - 1)
+
+    def test_retry_OnlyThrottlingCountedAsThrottled(self):
+        client = FakeKinesis(errors=['InternalFailure', 'ServiceUnavailable', 'ThrottlingException'])
+        producer = KinesisProducer("kinesis_test_stream", client, base_delay=0)
+        for i in range(10):
+            producer.put(b"row,%d\n" % i)
+
+        self.assertEqual(producer.flush(), 0)
+        self.assertEqual(len(client.requests), 4)
+        self.assertEqual(producer.throttled_records, 10)
+
+    def test_producer_PutBatchRequired(self):
+        class Incomplete(BatchProducer):
+            pass
+
+        self.assertRaises(TypeError, Incomplete)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
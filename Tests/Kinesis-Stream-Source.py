@@ -0,0 +1,80 @@
+from Kinesis_Stream_Source import prefetch, stream_to_kinesis
+import itertools
+import os
+import tempfile
+import threading
+import unittest
+
+def reader_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "stream-prefetch"]
+
+def wait_for_readers(test):
+    for thread in reader_threads():
+        thread.join(timeout=2)
+    test.assertEqual(reader_threads(), [])
+
+class FakeProducer:
+    def __init__(self):
+        self.lines = []
+        self.failed_rows = 0
+        self.flushed = False
+
+    def put(self, line):
+        self.lines.append(line)
+
+    def flush(self):
+        self.flushed = True
+
+class TestPrefetch(unittest.TestCase):
+    def test_items_KeepOrder(self):
+        self.assertEqual(list(prefetch(iter(range(1000)), max_items=4)), list(range(1000)))
+        wait_for_readers(self)
+
+    def test_error_RaisedAfterItems(self):
+        def source():
+            yield 1
+            yield 2
+            raise ValueError("unreadable file")
+
+        items = prefetch(source(), max_items=1)
+        self.assertEqual([next(items), next(items)], [1, 2])
+        with self.assertRaises(ValueError):
+            next(items)
+        wait_for_readers(self)
+
+    def test_consumerExit_StopsReader(self):
+        items = prefetch(itertools.count(), max_items=1)
+        self.assertEqual(next(items), 0)
+        items.close()
+        wait_for_readers(self)
+
+    def test_consumerExit_StopsReaderHoldingError(self):
+        failing = threading.Event()
+        def source():
+            yield 1
+            yield 2
+            failing.set()
+            raise ValueError("unreadable file")
+
+        items = prefetch(source(), max_items=1)
+        self.assertEqual(next(items), 1)
+        # the queue holds 2, so the reader is left with an error it has no room to put
+        self.assertTrue(failing.wait(timeout=2))
+        items.close()
+        wait_for_readers(self)
+
+class TestStreamToKinesis(unittest.TestCase):
+    def test_directory_LinesInFileOrder(self):
+        with tempfile.TemporaryDirectory() as my_dir:
+            for name, rows in [("aanchal_flt_ind_20220708_000000.csv", ["c", "d"]),
+                               ("aanchal_flt_ind_20220707_000000.csv", ["a", "", "b"])]:
+                with open(os.path.join(my_dir, name), "w") as f:
+                    f.write("header\n" + "\n".join(rows) + "\n")
+
+            producer = FakeProducer()
+            self.assertEqual(stream_to_kinesis(my_dir, producer, chunk_lines=1, queue_chunks=1), 0)
+        self.assertEqual(producer.lines, [b"a\n", b"b\n", b"c\n", b"d\n"])
+        self.assertTrue(producer.flushed)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+from Lambda_Events import parse_event, process_event
+import json
+import threading
+import time
+import unittest
+
+def s3_record(key, bucket="raw-lambda-poc"):
+    return {'eventSource': 'aws:s3', 's3': {'bucket': {'name': bucket}, 'object': {'key': key, 'size': 10, 'eTag': 'abc'}}}
+
+def sqs_message(message_id, *keys):
+    return {'eventSource': 'aws:sqs', 'messageId': message_id, 'body': json.dumps({'Records': [s3_record(key) for key in keys]})}
+
+class TestLambdaEvents(unittest.TestCase):
+    def test_parse_S3AndSqsEvents(self):
+        objects, from_sqs = parse_event({'Records': [s3_record("a+b.csv"), s3_record("c%3D1.csv")]})
+        self.assertFalse(from_sqs)
+        self.assertEqual([obj.key for obj in objects], ["a b.csv", "c=1.csv"])
+
+        objects, from_sqs = parse_event({'Records': [sqs_message("m1", "a.csv", "b.csv"), sqs_message("m2", "c.csv"),
+                                                     {'eventSource': 'aws:sqs', 'messageId': 'm3', 'body': json.dumps({'Event': 's3:TestEvent'})}]})
+        self.assertTrue(from_sqs)
+        self.assertEqual([(obj.item_id, obj.key) for obj in objects], [("m1", "a.csv"), ("m1", "b.csv"), ("m2", "c.csv")])
+
+    def test_process_AllRecordsConcurrently(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def process(obj):
+            with lock:
+                active.append(obj.key)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(obj.key)
+            return obj.key
+
+        response = process_event({'Records': [s3_record(str(i)) for i in range(8)]}, process)
+        self.assertEqual(sorted(response['results']), sorted(str(i) for i in range(8)))
+        self.assertEqual(response['batchItemFailures'], [])
+        self.assertGreater(max(peak), 1)
+
+    def test_process_PartialBatchFailures(self):
+        def process(obj):
+            if obj.key == "bad.csv":
+                raise Exception("cannot read " + obj.key)
+            return obj.key
+
+        event = {'Records': [sqs_message("m1", "a.csv", "bad.csv"), sqs_message("m2", "c.csv")]}
+        response = process_event(event, process)
+        self.assertEqual(response['batchItemFailures'], [{'itemIdentifier': "m1"}])
+        # a.csv comes back with the redelivered m1, so it is only reported then
+        self.assertEqual(response['results'], ["c.csv"])
+
+        processed = []
+        def record(obj):
+            processed.append(obj.key)
+            return process(obj)
+        self.assertRaises(Exception, process_event, {'Records': [s3_record("bad.csv"), s3_record("a.csv")]}, record)
+        self.assertEqual(sorted(processed), ["a.csv", "bad.csv"])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,51 @@
+from Lambda_Runtime import Lazy, handler
+import contextlib
+import glob
+import io
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts")
+
+class TestLambdaRuntime(unittest.TestCase):
+    def test_lazy_BuiltOnceAcrossThreads(self):
+        built = []
+        value = Lazy(lambda: built.append(1) or object())
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(value())) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_handler_ReportsColdStartOnce(self):
+        @handler
+        def lambda_handler(event, context):
+            return event['value']
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(lambda_handler({'value': 1}, None), 1)
+            self.assertEqual(lambda_handler({'value': 2}, None), 2)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("RUNTIME cold_start=True init_ms="))
+        self.assertTrue(lines[1].startswith("RUNTIME cold_start=False handler_ms="))
+
+    def test_handlers_ImportWithoutBoto3(self):
+        check = ("import importlib.util, sys\n"
+                 "spec = importlib.util.spec_from_file_location('handler', sys.argv[1])\n"
+                 "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+                 "sys.exit('boto3' in sys.modules)\n")
+        env = dict(os.environ, PYTHONPATH=SCRIPTS)
+        for path in glob.glob(os.path.join(SCRIPTS, "Lambda Functions", "*.py")):
+            result = subprocess.run([sys.executable, "-c", check, path], env=env, capture_output=True)
+            self.assertEqual(result.returncode, 0, path + " imports boto3 during init " + result.stderr.decode())
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,85 @@
+from Multipart_Upload import upload_large_file, abort_upload, state_path_for, MB, STATE_SUFFIX
+from botocore.exceptions import ClientError
+import os
+import tempfile
+import threading
+import unittest
+
+class FakeS3:
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.uploads = {}
+        self.objects = {}
+        self.part_calls = []
+        self.lock = threading.Lock()
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = "upload-" + str(len(self.uploads))
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.lock:
+            self.part_calls.append(PartNumber)
+        if PartNumber == self.fail_part:
+            raise ClientError({'Error': {'Code': 'RequestTimeout', 'Message': 'timed out'}}, 'UploadPart')
+        self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': '"' + str(PartNumber) + '"'}
+
+    def list_parts(self, Bucket, Key, UploadId, PartNumberMarker):
+        parts = [{'PartNumber': number, 'Size': len(body), 'ETag': '"' + str(number) + '"'}
+                 for number, body in sorted(self.uploads[UploadId].items())]
+        return {'Parts': parts, 'IsTruncated': False}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        del self.uploads[UploadId]
+
+class TestMultipartUpload(unittest.TestCase):
+    def test_resume_AfterFailedPart(self):
+        with tempfile.TemporaryDirectory() as my_dir:
+            path = os.path.join(my_dir, "aanchal_flt_ind_20220707_180156.csv")
+            data = os.urandom(12 * MB + 123)
+            with open(path, "wb") as f:
+                f.write(data)
+
+            client = FakeS3(fail_part=2)
+            self.assertFalse(upload_large_file(path, "raw-lambda-poc", part_size=5 * MB,
+                                               progress_callback=None, s3_client=client))
+            self.assertTrue(os.path.exists(path + STATE_SUFFIX))
+
+            client.fail_part = None
+            client.part_calls = []
+            self.assertTrue(upload_large_file(path, "raw-lambda-poc", part_size=5 * MB,
+                                              progress_callback=None, s3_client=client))
+
+            self.assertEqual(client.part_calls, [2])
+            self.assertEqual(client.objects["aanchal_flt_ind_20220707_180156.csv"], data)
+            self.assertFalse(os.path.exists(path + STATE_SUFFIX))
+
+    def test_abort_TemporarySourceLeavesNothing(self):
+        with tempfile.TemporaryDirectory() as source_dir, tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(source_dir, "aanchal_flt_ind_20220707_180156.csv")
+            converted = os.path.join(tmp_dir, "converted.csv.gz")
+            with open(converted, "wb") as f:
+                f.write(os.urandom(11 * MB))
+            state_path = state_path_for(source, "source=flt/aanchal_flt_ind_20220707_180156.csv.gz")
+            self.assertNotEqual(state_path, state_path_for(source, "source=flt/aanchal_flt_ind_20220707_180156.parquet"))
+
+            client = FakeS3(fail_part=2)
+            self.assertFalse(upload_large_file(converted, "raw-lambda-poc", "source=flt/aanchal_flt_ind_20220707_180156.csv.gz",
+                                               part_size=5 * MB, progress_callback=None, s3_client=client,
+                                               state_path=state_path))
+            self.assertEqual(os.listdir(tmp_dir), ["converted.csv.gz"])
+            self.assertTrue(os.path.exists(state_path))
+
+            self.assertTrue(abort_upload(state_path, client))
+            self.assertEqual(client.uploads, {})
+            self.assertFalse(os.path.exists(state_path))
+            self.assertFalse(abort_upload(state_path, client))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
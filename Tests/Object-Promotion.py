@@ -0,0 +1,89 @@
+from Object_Promotion import promote_object, promoted_key
+from Lambda_Events import S3Object
+from botocore.exceptions import ClientError
+import threading
+import unittest
+
+MB = 1024 * 1024
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _call(self, name):
+        with self.lock:
+            self.calls.append(name)
+
+    def head_object(self, Bucket, Key):
+        self._call('head_object')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        size = self.objects[(Bucket, Key)]
+        return {'ContentLength': size, 'ETag': '"%d"' % size, 'ContentType': 'text/csv', 'Metadata': {}}
+
+    def copy_object(self, CopySource, Bucket, Key, CopySourceIfMatch):
+        self._call('copy_object')
+        self.objects[(Bucket, Key)] = self.objects[(CopySource['Bucket'], CopySource['Key'])]
+
+    def create_multipart_upload(self, Bucket, Key, ContentType, Metadata):
+        self._call('create_multipart_upload')
+        self.ranges = []
+        return {'UploadId': 'upload-1'}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange, CopySourceIfMatch):
+        self._call('upload_part_copy')
+        start, end = CopySourceRange[len("bytes="):].split("-")
+        with self.lock:
+            self.ranges.append((int(start), int(end)))
+        return {'CopyPartResult': {'ETag': '"part%d"' % PartNumber}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._call('complete_multipart_upload')
+        self.parts = MultipartUpload['Parts']
+        self.objects[(Bucket, Key)] = sum(end - start + 1 for start, end in self.ranges)
+
+    def delete_object(self, Bucket, Key):
+        self._call('delete_object')
+        del self.objects[(Bucket, Key)]
+
+def event_object(key, sequencer):
+    return S3Object("0", "shift-to-trusted", key, 10, "abc", "2022-07-07T18:01:56.123Z", sequencer)
+
+class TestObjectPromotion(unittest.TestCase):
+    def test_key_DeterministicAndCollisionFree(self):
+        first = promoted_key("aanchal_flt_ind_", event_object("run-1-part-0000.csv", "0055AED6DCD90281E5"))
+        second = promoted_key("aanchal_flt_ind_", event_object("run-1-part-0001.csv", "0055AED6DCD90281E6"))
+
+        self.assertTrue(first.startswith("aanchal_flt_ind_20220707_180156_"))
+        self.assertNotEqual(first, second)
+        self.assertEqual(first, promoted_key("aanchal_flt_ind_", event_object("run-1-part-0000.csv", "0055AED6DCD90281E5")))
+
+        partitioned = promoted_key("aanchal_flt_ind_", event_object("fl_date=2018-01-01/op_carrier=UA/part-00000-1c2d.snappy.parquet", "0055AED6DCD90281E7"))
+        self.assertTrue(partitioned.startswith("fl_date=2018-01-01/op_carrier=UA/aanchal_flt_ind_20220707_180156_"))
+        self.assertTrue(partitioned.endswith(".snappy.parquet"))
+
+    def test_small_SingleServerSideCopy(self):
+        s3 = FakeS3({("shift-to-trusted", "a.csv"): 10 * MB})
+
+        self.assertEqual(promote_object("shift-to-trusted", "a.csv", "trusted-lambda-poc", "b.csv", s3), 'text/csv')
+        self.assertEqual(s3.calls, ['head_object', 'copy_object', 'delete_object'])
+        self.assertEqual(s3.objects, {("trusted-lambda-poc", "b.csv"): 10 * MB})
+
+        self.assertIsNone(promote_object("shift-to-trusted", "a.csv", "trusted-lambda-poc", "b.csv", s3))
+
+    def test_large_ParallelPartCopy(self):
+        size = 6 * 1024 * MB + 7
+        s3 = FakeS3({("shift-to-trusted", "a.csv"): size})
+
+        promote_object("shift-to-trusted", "a.csv", "trusted-lambda-poc", "b.csv", s3, part_size=512 * MB)
+        self.assertNotIn('copy_object', s3.calls)
+        self.assertEqual(s3.calls.count('upload_part_copy'), 13)
+        self.assertEqual([part['PartNumber'] for part in s3.parts], list(range(1, 14)))
+        self.assertEqual(sorted(s3.ranges)[0][0], 0)
+        self.assertEqual(max(end for _, end in s3.ranges), size - 1)
+        self.assertEqual(s3.objects, {("trusted-lambda-poc", "b.csv"): size})
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
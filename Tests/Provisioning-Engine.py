@@ -0,0 +1,200 @@
+import AWS_Clients
+import Provisioning
+import Setup
+from Provisioning import Resource, run_plan
+from botocore.exceptions import ClientError
+from unittest import mock
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+class FakeResource:
+    def __init__(self, present=False, fail=False, delay=0.0):
+        self.present = present
+        self.fail = fail
+        self.delay = delay
+        self.created = 0
+
+    def exists(self):
+        return self.present
+
+    def create(self):
+        time.sleep(self.delay)
+        if self.fail:
+            raise Exception("creation failed")
+        self.created += 1
+        self.present = True
+
+class FakeIAM:
+    def __init__(self, attached=()):
+        self.attached = list(attached)
+
+    def get_role(self, RoleName):
+        return {'Role': {'RoleName': RoleName}}
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, RoleName):
+        return iter([{'AttachedPolicies': [{'PolicyArn': policyArn} for policyArn in self.attached]}])
+
+    def attach_role_policy(self, RoleName, PolicyArn):
+        self.attached.append(PolicyArn)
+
+class FakeGlue:
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.updates = []
+
+    def get_job(self, JobName):
+        if JobName not in self.jobs:
+            raise ClientError({'Error': {'Code': 'EntityNotFoundException', 'Message': ''}}, 'GetJob')
+        return {'Job': dict(self.jobs[JobName], Name=JobName, CreatedOn=0)}
+
+    def update_job(self, JobName, JobUpdate):
+        self.updates.append(JobName)
+        self.jobs[JobName] = JobUpdate
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+        self.uploaded = []
+
+    def list_objects(self, Bucket):
+        return {'Contents': [{'Key': key, 'ETag': '"' + hashlib.md5(body).hexdigest() + '"'} for key, body in self.objects.items()]}
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, "rb") as f:
+            self.objects[Key] = f.read()
+        self.uploaded.append(Key)
+
+class TestProvisioning(unittest.TestCase):
+    def test_plan_RerunIsIdempotent(self):
+        bucket = FakeResource()
+        role = FakeResource(present=True)
+        plan = [Resource("bucket", bucket.exists, bucket.create), Resource("role", role.exists, role.create)]
+
+        results = run_plan(plan)
+        self.assertEqual(results["bucket"].status, Provisioning.CREATED)
+        self.assertEqual(results["role"].status, Provisioning.PRESENT)
+
+        results = run_plan(plan)
+        self.assertEqual(results["bucket"].status, Provisioning.PRESENT)
+        self.assertEqual(bucket.created, 1)
+        self.assertEqual(role.created, 0)
+
+    def test_plan_IndependentResourcesRunConcurrently(self):
+        resources = [FakeResource(delay=0.2) for _ in range(4)]
+        plan = [Resource("bucket" + str(index), resource.exists, resource.create) for index, resource in enumerate(resources)]
+
+        start = time.perf_counter()
+        run_plan(plan)
+        self.assertLess(time.perf_counter() - start, 0.6)
+
+    def test_plan_DependenciesWaitAndFailuresSkip(self):
+        order = []
+        lock = threading.Lock()
+
+        def create(name, fail=False):
+            def run():
+                with lock:
+                    order.append(name)
+                if fail:
+                    raise Exception(name + " failed")
+            return run
+
+        plan = [
+            Resource("stream", lambda: False, create("stream")),
+            Resource("role", lambda: False, create("role", fail=True)),
+            Resource("firehose", lambda: False, create("firehose"), depends_on=("stream", "role")),
+            Resource("crawler", lambda: False, create("crawler"), depends_on=("role",)),
+            Resource("job", lambda: False, create("job"), depends_on=("stream",)),
+        ]
+
+        results = run_plan(plan)
+        self.assertEqual(results["role"].status, Provisioning.FAILED)
+        self.assertEqual(results["firehose"].status, Provisioning.SKIPPED)
+        self.assertEqual(results["crawler"].status, Provisioning.SKIPPED)
+        self.assertEqual(results["job"].status, Provisioning.CREATED)
+        self.assertLess(order.index("stream"), order.index("job"))
+        self.assertNotIn("firehose", order)
+
+    def test_plan_RejectsCycles(self):
+        plan = [
+            Resource("a", lambda: True, lambda: None, depends_on=("b",)),
+            Resource("b", lambda: True, lambda: None, depends_on=("a",)),
+        ]
+        self.assertRaises(ValueError, run_plan, plan)
+
+    def test_wait_until_TimesOut(self):
+        self.assertTrue(Provisioning.wait_until(lambda: True, timeout=1))
+        self.assertFalse(Provisioning.wait_until(lambda: False, timeout=0.05, initial_delay=0.01, max_delay=0.01))
+
+class TestEnvironmentPlan(unittest.TestCase):
+    def plan(self, iam, glue=None, jobs=None):
+        clients = {'iam': iam, 'glue': glue}
+        with mock.patch.object(AWS_Clients, "get_client", lambda service, **kwargs: clients.get(service) or mock.Mock()):
+            return Setup.build_environment_plan(["raw"], "lambda-poc", "lambdaCatalog", {"Raw": "raw"}, "scripts", jobs or {},
+                                                "stream", "firehose", "raw")
+
+    def test_existingRole_PoliciesAttachedOnce(self):
+        iam = FakeIAM(attached=Setup.ROLE_POLICIES[:2])
+        plan = {resource.name: resource for resource in self.plan(iam)}
+        self.assertIn("policies:lambda-poc", plan["crawler:Raw"].depends_on)
+        self.assertIn("policies:lambda-poc", plan["firehose:firehose"].depends_on)
+
+        role_plan = [plan["role:lambda-poc"], plan["policies:lambda-poc"]]
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_plan(role_plan)
+            self.assertEqual(results["role:lambda-poc"].status, Provisioning.PRESENT)
+            self.assertEqual(results["policies:lambda-poc"].status, Provisioning.CREATED)
+            self.assertEqual(sorted(iam.attached), sorted(Setup.ROLE_POLICIES))
+
+            results = run_plan(role_plan)
+        self.assertEqual(results["policies:lambda-poc"].status, Provisioning.PRESENT)
+        self.assertEqual(len(iam.attached), len(Setup.ROLE_POLICIES))
+
+    def test_existingJob_ArgumentsUpdated(self):
+        old_job = {'Role': "lambda-poc", 'Command': {'Name': "glueetl", 'ScriptLocation': "s3://scripts/job.py"},
+                   'DefaultArguments': {'--TempDir': 's3://glue-source-hoc/temp_dir', '--conf': 'spark.x=1'},
+                   'WorkerType': 'Standard', 'NumberOfWorkers': 2}
+        glue = FakeGlue({"Raw-to-Trusted": old_job})
+        job = {resource.name: resource for resource in self.plan(FakeIAM(), glue, {"Raw-to-Trusted": "s3://scripts/job.py"})}["job:Raw-to-Trusted"]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(run_plan([job._replace(depends_on=())])["job:Raw-to-Trusted"].status, Provisioning.CREATED)
+            self.assertEqual(run_plan([job._replace(depends_on=())])["job:Raw-to-Trusted"].status, Provisioning.PRESENT)
+
+        self.assertEqual(glue.updates, ["Raw-to-Trusted"])
+        updated = glue.jobs["Raw-to-Trusted"]
+        self.assertEqual(updated['DefaultArguments']['--extra-py-files'], "s3://scripts/Flight_Transforms.py")
+        self.assertEqual(updated['DefaultArguments']['--conf'], 'spark.x=1')
+        self.assertEqual((updated['Role'], updated['Command'], updated['NumberOfWorkers']), ("lambda-poc", old_job['Command'], 2))
+        self.assertNotIn('CreatedOn', updated)
+
+    def test_scripts_EditedScriptUploadedAgain(self):
+        s3 = FakeS3({"glue-raw-to-trusted.py": b"print('old')\n", "Flight_Transforms.py": b"STEPS = ()\n"})
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as my_dir:
+            for name, body in [("glue-raw-to-trusted.py", b"print('new')\n"), ("Flight_Transforms.py", b"STEPS = ()\n"),
+                               ("Setup.py", b"")]:
+                with open(os.path.join(my_dir, name), "wb") as f:
+                    f.write(body)
+            os.chdir(my_dir)
+            try:
+                with mock.patch.object(AWS_Clients, "get_client", lambda service, **kwargs: s3), \
+                        contextlib.redirect_stdout(io.StringIO()):
+                    Setup.ingest_glue_script("scripts")
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(s3.uploaded, ["glue-raw-to-trusted.py"])
+        self.assertEqual(s3.objects["glue-raw-to-trusted.py"], b"print('new')\n")
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
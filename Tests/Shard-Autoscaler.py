@@ -0,0 +1,54 @@
+from Shard_Autoscaler import ShardAutoscaler
+import unittest
+
+class FakeKinesis:
+    def __init__(self, shards):
+        self.shards = shards
+        self.updates = []
+
+    def describe_stream_summary(self, StreamName):
+        return {'StreamDescriptionSummary': {'StreamStatus': 'ACTIVE', 'OpenShardCount': self.shards}}
+
+    def update_shard_count(self, StreamName, TargetShardCount, ScalingType):
+        self.updates.append(TargetShardCount)
+        self.shards = TargetShardCount
+
+class TestShardAutoscaler(unittest.TestCase):
+    def test_scale_UpWithHysteresis(self):
+        autoscaler = ShardAutoscaler("kinesis_test_stream", FakeKinesis(1), scale_up_after=2, cooldown=0)
+
+        self.assertEqual(autoscaler.recommend(1, 1500, 0, 0, now=0).desired, 1)
+        self.assertEqual(autoscaler.recommend(1, 1500, 0, 0, now=1).desired, 2)
+        self.assertEqual(autoscaler.recommend(2, 5000, 0, 0, now=2).desired, 2)
+        self.assertEqual(autoscaler.recommend(2, 5000, 0, 0, now=3).desired, 4)
+
+    def test_scale_UpOnThrottle(self):
+        autoscaler = ShardAutoscaler("kinesis_test_stream", FakeKinesis(4), cooldown=0)
+
+        self.assertEqual(autoscaler.recommend(4, 100, 0, 25, now=0).desired, 6)
+
+    def test_scale_DownAfterSustainedLowLoad(self):
+        autoscaler = ShardAutoscaler("kinesis_test_stream", FakeKinesis(8), scale_down_after=3, cooldown=0)
+
+        decisions = [autoscaler.recommend(8, 100, 0, 0, now=index).desired for index in range(3)]
+        self.assertEqual(decisions, [8, 8, 4])
+
+    def test_apply_CooldownAndWait(self):
+        client = FakeKinesis(1)
+        autoscaler = ShardAutoscaler("kinesis_test_stream", client, scale_up_after=1, cooldown=300)
+
+        decision = autoscaler.recommend(1, 1500, 0, 0)
+        self.assertTrue(autoscaler.apply(decision))
+        self.assertEqual(client.updates, [2])
+        self.assertEqual(autoscaler.recommend(2, 5000, 0, 0).desired, 2)
+
+    def test_step_ProducerRates(self):
+        autoscaler = ShardAutoscaler("kinesis_test_stream", FakeKinesis(1))
+        stats = {'records_sent': 0, 'bytes_sent': 0, 'throttled_records': 0}
+
+        self.assertIsNone(autoscaler.sample(stats, now=0))
+        stats = {'records_sent': 20000, 'bytes_sent': 1024, 'throttled_records': 3}
+        self.assertEqual(autoscaler.sample(stats, now=10), (2000, 102.4, 3))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
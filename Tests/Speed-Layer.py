@@ -0,0 +1,101 @@
+from Speed_Layer import SpeedLayerConsumer, ShardCheckpoint, WindowAggregator
+from Flight_Rows import parse_row
+from Kinesis_Aggregation import RecordAggregator
+from datetime import datetime, timezone
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+def flight(carrier, origin, dest, arr_delay):
+    values = ["2018-01-01", carrier, "101", origin, dest, "1000", "1005", "5"] + [""] * 6 + [str(arr_delay)] + [""] * 13
+    return (",".join(values) + "\n").encode()
+
+class LocalKinesis:
+    """ In-memory stand-in for the GetShardIterator/GetRecords API """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.lock = threading.Lock()
+
+    def list_shards(self, StreamName=None, NextToken=None):
+        return {'Shards': [{'ShardId': shard_id} for shard_id in self.shards]}
+
+    def get_shard_iterator(self, StreamName, ShardId, ShardIteratorType, StartingSequenceNumber=None):
+        position = 0 if ShardIteratorType == 'TRIM_HORIZON' else len(self.shards[ShardId])
+        if ShardIteratorType == 'AFTER_SEQUENCE_NUMBER':
+            position = int(StartingSequenceNumber) + 1
+        return {'ShardIterator': ShardId + ":" + str(position)}
+
+    def get_records(self, ShardIterator, Limit):
+        shard_id, position = ShardIterator.split(":")
+        position = int(position)
+        with self.lock:
+            records = self.shards[shard_id][position:position + Limit]
+        return {'Records': records, 'NextShardIterator': shard_id + ":" + str(position + len(records)),
+                'MillisBehindLatest': 0}
+
+def kinesis_records(payloads, arrival):
+    return [{'Data': data, 'PartitionKey': 'k', 'SequenceNumber': str(index), 'ApproximateArrivalTimestamp': arrival}
+            for index, data in enumerate(payloads)]
+
+class TestSpeedLayer(unittest.TestCase):
+    def test_window_TumblingAndSliding(self):
+        tumbling = WindowAggregator("tumbling", ("op_carrier",), "arr_delay", size=60)
+        sliding = WindowAggregator("sliding", ("op_carrier",), "arr_delay", size=60, slide=10)
+        for timestamp, delay in [(0, 10), (30, 20), (65, 40)]:
+            row = parse_row(flight("AA", "DEL", "BOM", delay))
+            tumbling.add(row, timestamp)
+            sliding.add(row, timestamp)
+
+        self.assertEqual(tumbling.query(now=65)[("AA",)]["count"], 1)
+        self.assertEqual(tumbling.last_window[("AA",)]["mean"], 15)
+        self.assertEqual(sliding.query(now=65)[("AA",)]["sum"], 60)
+        self.assertEqual(sliding.query(now=65)[("AA",)]["max"], 40)
+        self.assertEqual(sliding.query(now=200), {})
+
+    def test_consumer_AllShardsAndResume(self):
+        now = time.time()
+        arrival = datetime.fromtimestamp(now, timezone.utc)
+        aggregator = RecordAggregator()
+        aggregator.add(flight("AA", "DEL", "BOM", 10), "k")
+        aggregator.add(flight("AI", "DEL", "BLR", 30), "k")
+        packed = aggregator.flush()[0]
+
+        shards = {"shardId-000": kinesis_records([packed, flight("AA", "BOM", "DEL", 20)], arrival),
+                  "shardId-001": kinesis_records([flight("AI", "BLR", "DEL", 50)], arrival)}
+        client = LocalKinesis(shards)
+
+        with tempfile.TemporaryDirectory() as my_dir:
+            path = os.path.join(my_dir, "speed.checkpoint")
+            consumer = SpeedLayerConsumer("kinesis_test_stream",
+                                          [WindowAggregator("carrier", ("op_carrier",), "arr_delay", size=300, slide=10)],
+                                          ShardCheckpoint(path), client, poll_interval=0.05, checkpoint_interval=0.05)
+            consumer.start()
+            deadline = time.time() + 5
+            while consumer.rows_processed < 4 and time.time() < deadline:
+                time.sleep(0.02)
+            consumer.stop()
+
+            result = consumer.query("carrier", now=now)
+            self.assertEqual(result[("AA",)]["count"], 2)
+            self.assertEqual(result[("AI",)]["mean"], 40)
+            self.assertEqual(ShardCheckpoint(path).sequences, {"shardId-000": "1", "shardId-001": "0"})
+
+            shards["shardId-001"].append({'Data': flight("AI", "BLR", "DEL", 70), 'PartitionKey': 'k',
+                                          'SequenceNumber': "1", 'ApproximateArrivalTimestamp': arrival})
+            resumed = SpeedLayerConsumer("kinesis_test_stream",
+                                         [WindowAggregator("carrier", ("op_carrier",), "arr_delay", size=300, slide=10)],
+                                         ShardCheckpoint(path), client, poll_interval=0.05, checkpoint_interval=0.05)
+            resumed.start()
+            deadline = time.time() + 5
+            while resumed.rows_processed < 1 and time.time() < deadline:
+                time.sleep(0.02)
+            resumed.stop()
+
+            self.assertEqual(resumed.rows_processed, 1)
+            self.assertEqual(resumed.query("carrier", now=now)[("AI",)]["sum"], 70)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,122 @@
+from Stage_Orchestrator import StageOrchestrator, Stage, event_driven_batches
+from botocore.exceptions import ClientError
+import unittest
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def __call__(self):
+        return self.now
+
+class LocalGlue:
+    """ Crawlers and jobs that take a fixed simulated time """
+
+    def __init__(self, clock, durations, failing=()):
+        self.clock = clock
+        self.durations = durations
+        self.failing = failing
+        self.crawls = {}
+        self.runs = {}
+        self.busy_starts = 0
+
+    def start_crawler(self, name):
+        self.crawls[name] = self.clock.now
+
+    def get_crawler(self, Name):
+        started = self.crawls.get(Name)
+        if started is None:
+            return {'Crawler': {'State': 'READY'}}
+        state = 'READY' if self.clock.now - started >= self.durations[Name] else 'RUNNING'
+        return {'Crawler': {'State': state, 'LastCrawl': {'StartTime': started, 'Status': 'SUCCEEDED'}}}
+
+    def start_job(self, name, arguments):
+        if self.busy_starts:
+            self.busy_starts -= 1
+            raise Exception("boto3 client error in run_glue_job: ConcurrentRunsExceededException")
+        run_id = "jr_" + str(len(self.runs) + 1)
+        self.runs[run_id] = (name, self.clock.now, arguments)
+        return {'JobRunId': run_id}
+
+    def get_job_run(self, JobName, RunId):
+        name, started, _ = self.runs[RunId]
+        if self.clock.now - started < self.durations[name]:
+            return {'JobRun': {'JobRunState': 'RUNNING'}}
+        if name in self.failing:
+            return {'JobRun': {'JobRunState': 'FAILED', 'ErrorMessage': 'out of memory'}}
+        return {'JobRun': {'JobRunState': 'SUCCEEDED'}}
+
+class FakeDynamoDB:
+    def __init__(self, pages=None):
+        self.pages = pages
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, TableName, ProjectionExpression):
+        if self.pages is None:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': ''}}, 'Scan')
+        return iter(self.pages)
+
+def orchestrator(glue, clock, stages):
+    return StageOrchestrator(stages, glue_client=glue, start_crawler=glue.start_crawler, start_job=glue.start_job,
+                             min_delay=2, max_delay=60, sleep=clock.sleep, clock=clock)
+
+class TestStageOrchestrator(unittest.TestCase):
+    def test_run_StagesBackToBack(self):
+        clock = FakeClock()
+        glue = LocalGlue(clock, {"Raw": 50, "Raw-to-Trusted": 120, "Trusted-to-Refined": 90})
+        promoted = []
+        stages = [Stage("raw-to-trusted", "Raw-to-Trusted", crawler="Raw", after=lambda: promoted.append(clock.now)),
+                  Stage("trusted-to-refined", "Trusted-to-Refined", arguments={'--job-bookmark-option': 'job-bookmark-enable'})]
+
+        runs = orchestrator(glue, clock, stages).run()
+        self.assertEqual([run.state for run in runs], ['SUCCEEDED', 'SUCCEEDED'])
+        self.assertEqual(len(promoted), 1)
+        # the next stage starts as soon as the previous run is seen to finish
+        self.assertEqual(glue.runs["jr_2"][1], promoted[0])
+        self.assertEqual(glue.runs["jr_2"][2], {'--job-bookmark-option': 'job-bookmark-enable'})
+        self.assertGreaterEqual(runs[0].job_seconds, 120)
+        self.assertLess(runs[0].job_seconds, 180)
+
+    def test_poll_AdaptsToExpectedDuration(self):
+        clock = FakeClock()
+        glue = LocalGlue(clock, {"Raw-to-Trusted": 600})
+        tracker = orchestrator(glue, clock, [Stage("raw-to-trusted", "Raw-to-Trusted")])
+
+        tracker.run()
+        first_polls = len(clock.sleeps)
+        clock.sleeps = []
+        run = tracker.run()[0]
+
+        self.assertLess(len(clock.sleeps), first_polls)
+        self.assertLess(run.job_seconds - 600, 30)
+        self.assertEqual(tracker.latency()["raw-to-trusted"], [run_.seconds for run_ in tracker.runs])
+
+    def test_run_StopsAtFailedStage(self):
+        clock = FakeClock()
+        glue = LocalGlue(clock, {"Raw-to-Trusted": 30, "Trusted-to-Refined": 30}, failing=("Raw-to-Trusted",))
+        glue.busy_starts = 2
+        promoted = []
+        stages = [Stage("raw-to-trusted", "Raw-to-Trusted", after=lambda: promoted.append(1)),
+                  Stage("trusted-to-refined", "Trusted-to-Refined")]
+
+        runs = orchestrator(glue, clock, stages).run()
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs[0].state, 'FAILED')
+        self.assertEqual(runs[0].error, 'out of memory')
+        self.assertEqual(promoted, [])
+
+    def test_eventDrivenBatches_GuardsMixedModes(self):
+        self.assertEqual(event_driven_batches(dynamodb_client=FakeDynamoDB()), [])
+        self.assertEqual(event_driven_batches(dynamodb_client=FakeDynamoDB([{'Items': []}])), [])
+        pages = [{'Items': [{'batch': {'S': 'trusted-to-refined'}}]}, {'Items': [{'batch': {'S': 'raw-to-trusted'}}]}]
+        self.assertEqual(event_driven_batches(dynamodb_client=FakeDynamoDB(pages)), ['raw-to-trusted', 'trusted-to-refined'])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
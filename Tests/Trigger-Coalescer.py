@@ -0,0 +1,124 @@
+from Trigger_Coalescer import TriggerCoalescer
+from botocore.exceptions import ClientError
+import unittest
+
+class FakeDynamoDB:
+    def __init__(self):
+        self.items = {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues, ReturnValues, ConditionExpression=None):
+        name = Key['batch']['S']
+        old = dict(self.items.get(name, {}))
+        item = dict(old)
+        if UpdateExpression.startswith("ADD"):
+            item['files'] = {'N': str(int(item.get('files', {'N': '0'})['N']) + int(ExpressionAttributeValues[':files']['N']))}
+            item['bytes'] = {'N': str(int(item.get('bytes', {'N': '0'})['N']) + int(ExpressionAttributeValues[':bytes']['N']))}
+            item.setdefault('first_arrival', ExpressionAttributeValues[':now'])
+            if ':keys' in ExpressionAttributeValues:
+                item['input_keys'] = {'SS': sorted(set(item.get('input_keys', {'SS': []})['SS']) | set(ExpressionAttributeValues[':keys']['SS']))}
+        else:
+            if int(item.get('files', {'N': '0'})['N']) <= 0:
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'UpdateItem')
+            item = {'files': {'N': '0'}, 'bytes': {'N': '0'}}
+        self.items[name] = item
+        return {'Attributes': item if ReturnValues == 'ALL_NEW' else old}
+
+    def get_item(self, TableName, Key, ConsistentRead):
+        item = self.items.get(Key['batch']['S'])
+        return {'Item': item} if item else {}
+
+class FakeGlue:
+    def __init__(self):
+        self.crawler_state = 'READY'
+        self.job_states = []
+        self.crawls = 0
+        self.jobs = 0
+        self.arguments = []
+
+    def get_crawler(self, Name):
+        return {'Crawler': {'State': self.crawler_state}}
+
+    def get_job_runs(self, JobName, MaxResults):
+        return {'JobRuns': [{'JobRunState': state} for state in self.job_states]}
+
+    def start_crawler(self, name):
+        self.crawls += 1
+
+    def start_job(self, name, arguments):
+        self.jobs += 1
+        self.arguments.append(arguments)
+        return {'JobRunId': 'jr_' + str(self.jobs)}
+
+def coalescer(glue, dynamodb=None, **kwargs):
+    return TriggerCoalescer("raw-to-trusted", "Raw", "Raw-to-Trusted", dynamodb_client=dynamodb or FakeDynamoDB(),
+                            glue_client=glue, start_crawler=glue.start_crawler, start_job=glue.start_job, **kwargs)
+
+class TestTriggerCoalescer(unittest.TestCase):
+    def test_burst_FiresOncePerBatch(self):
+        glue = FakeGlue()
+        batches = coalescer(glue, max_files=50)
+
+        fired = [batches.add(1, 1000, now=index) for index in range(200)]
+        self.assertEqual(glue.crawls, 4)
+        self.assertEqual(glue.jobs, 4)
+        self.assertEqual([result['files'] for result in fired if result], [50, 50, 50, 50])
+
+    def test_window_PollFiresLateFiles(self):
+        glue = FakeGlue()
+        batches = coalescer(glue, window=300)
+
+        self.assertIsNone(batches.add(3, 3000, now=0))
+        self.assertIsNone(batches.poll(now=100))
+        self.assertEqual(batches.poll(now=300), {'files': 3, 'bytes': 3000, 'job_run_id': 'jr_1'})
+        self.assertIsNone(batches.poll(now=900))
+
+    def test_running_QueuesForNextBatch(self):
+        glue = FakeGlue()
+        glue.job_states = ['RUNNING']
+        batches = coalescer(glue, max_files=2)
+
+        self.assertIsNone(batches.add(2, 10, now=0))
+        self.assertIsNone(batches.add(1, 10, now=1))
+        self.assertEqual(glue.jobs, 0)
+
+        glue.job_states = ['SUCCEEDED']
+        self.assertEqual(batches.add(1, 10, now=2)['files'], 4)
+
+    def test_busy_StartErrorRestoresBatch(self):
+        glue = FakeGlue()
+        def busy(name):
+            raise Exception("boto3 client error in start_a_crawler: CrawlerRunningException")
+        glue.start_crawler = busy
+        batches = coalescer(glue, max_files=1)
+
+        self.assertIsNone(batches.add(1, 10, now=0))
+        self.assertEqual(batches._read()[:2], (1, 10))
+
+    def test_keys_PassedToJobOnce(self):
+        glue = FakeGlue()
+        batches = coalescer(glue, max_files=3)
+
+        self.assertIsNone(batches.add(2, 20, now=0, keys=["s3://raw/a.csv", "s3://raw/b.csv"]))
+        self.assertEqual(batches.add(1, 10, now=1, keys=["s3://raw/c.csv"])['files'], 3)
+        self.assertEqual(glue.arguments, [{'--input_paths': "s3://raw/a.csv,s3://raw/b.csv,s3://raw/c.csv"}])
+        self.assertEqual(batches._read()[3], [])
+        self.assertEqual(glue.crawls, 0)
+
+        batches.add(3, 30, now=2)
+        self.assertEqual(glue.arguments[1], {})
+        self.assertEqual(glue.crawls, 1)
+
+    def test_keys_NotBlockedByRunningCrawler(self):
+        glue = FakeGlue()
+        glue.crawler_state = 'RUNNING'
+        def busy(name):
+            raise Exception("boto3 client error in start_a_crawler: CrawlerRunningException")
+        glue.start_crawler = busy
+        batches = coalescer(glue, max_files=1)
+
+        self.assertEqual(batches.add(1, 10, now=0, keys=["s3://raw/a.csv"])['files'], 1)
+        self.assertEqual(glue.jobs, 1)
+        self.assertEqual(batches._read()[0], 0)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
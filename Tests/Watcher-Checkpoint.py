@@ -0,0 +1,44 @@
+from Watcher_Checkpoint import WatcherCheckpoint
+from File_Scanner import FileRecord
+import os
+import tempfile
+import unittest
+
+def make_record(name, size, mtime):
+    return FileRecord(name, "/tmp/" + name, "flt", "ind", "20220707", "180156", size, mtime)
+
+class TestWatcherCheckpoint(unittest.TestCase):
+    def test_restart_OnlyDelta(self):
+        with tempfile.TemporaryDirectory() as my_dir:
+            path = os.path.join(my_dir, "checkpoint")
+            first = make_record("aanchal_flt_ind_20220707_180156.csv", 10, 1657197116.25)
+            second = make_record("aanchal_flt_ind_20220707_180157.csv", 20, 1657197117.5)
+
+            with WatcherCheckpoint(path) as checkpoint:
+                checkpoint.mark_ingested(first)
+
+            with WatcherCheckpoint(path) as checkpoint:
+                self.assertEqual(checkpoint.pending([first, second]), [second])
+
+                changed = first._replace(size=11)
+                self.assertEqual(checkpoint.pending([changed]), [changed])
+
+    def test_load_TornLine(self):
+        with tempfile.TemporaryDirectory() as my_dir:
+            path = os.path.join(my_dir, "checkpoint")
+            record = make_record("aanchal_flt_ind_20220707_180156.csv", 10, 1657197116.25)
+
+            with WatcherCheckpoint(path) as checkpoint:
+                checkpoint.mark_ingested(record)
+            with open(path, "a") as f:
+                f.write("aanchal_flt_ind_2022")
+
+            with WatcherCheckpoint(path) as checkpoint:
+                checkpoint.mark_ingested(record._replace(name="aanchal_flt_ind_20220707_180157.csv"))
+
+            with WatcherCheckpoint(path) as checkpoint:
+                self.assertEqual(len(checkpoint.entries), 2)
+                self.assertTrue(checkpoint.is_ingested(record))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file